@@ -3,7 +3,7 @@
 import importlib.metadata
 
 __all__ = (
-    "app", "hy", "log", "rpc", "test", "util"
+    "app", "hy", "index", "log", "rpc", "test", "util"
 )
 
 __version__ = importlib.metadata.version("hydra-chain-py")
@@ -5,6 +5,7 @@ import importlib
 import json
 
 import os
+import sys
 from collections import namedtuple
 from attrdict import AttrDict
 
@@ -12,7 +13,7 @@ from hydra import log
 from hydra.rpc import BaseRPC, HydraRPC
 
 
-APPS = "cli", "test", "ascan", "atrace", "call", "lstx", "txvio", "peerscan", "top"
+APPS = "cli", "test", "ascan", "atrace", "call", "hrc20", "lstx", "txvio", "peerscan", "top", "exporter"
 
 __all__ = "HydraApp", "APPS"
 
@@ -61,7 +62,7 @@ class HydraApp:
                             self.args[action.dest] = action.default
 
             for dest in parser._defaults:
-                if not dest not in self.args:
+                if dest not in self.args:
                     self.args[dest] = parser._defaults[dest]
 
         self.args = AttrDict(self.args)
@@ -91,6 +92,13 @@ class HydraApp:
                 self.render(err.error, "error")
             exit(-1)
 
+        finally:
+            if self.rpc is not None and self.rpc.cache is not None:
+                log.debug(f"rpc cache: {self.rpc.cache.stats}")
+
+            if self.rpc is not None and self.rpc.stats is not None and len(self.rpc.stats):
+                print(self.rpc.stats.format(), file=sys.stderr)
+
     def __auto_setup_fail(self, *args, **kwds):
         raise RuntimeError("direct calls to setup() disallowed.")
 
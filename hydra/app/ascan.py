@@ -5,10 +5,18 @@ Search transactions for all addresses used as inputs to TXes from this address.
 import os.path
 import sys
 import argparse
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
 from hydra.app.cli import HydraApp
 from hydra.test import Test
-from hydra.hy import Hydra
+from hydra.test.stub import StubRPCServer
+from hydra.util.checkpoint import Checkpoint
+from hydra.index import AddressIndex
+from hydra import log
 
 from .txvio import TxVIOApp
 
@@ -17,13 +25,23 @@ from .txvio import TxVIOApp
 class AScanApp(HydraApp):
     out = None
 
+    THREADS = 4
+
     @staticmethod
     def parser(parser: argparse.ArgumentParser):
         parser.add_argument("-c", "--count", type=int, default=10, help="number of recent transactions to load")
         parser.add_argument("-s", "--skip", type=int, default=0, help="number of recent transactions to skip")
         parser.add_argument("-R", "--recursive", action="store_true", help="scan vin addresses recursively")
+        parser.add_argument("-d", "--depth", type=int, default=None, help="max recursion depth (default: unlimited)")
+        parser.add_argument("-w", "--width", type=int, default=None,
+                            help="max addresses to scan per recursion level (default: unlimited)")
+        parser.add_argument("-t", "--threads", type=int, default=AScanApp.THREADS,
+                            help=f"addresses scanned concurrently (default: {AScanApp.THREADS})")
         parser.add_argument("-o", "--output",  help="also output to a file (use {} for address in name)")
         parser.add_argument("-a", "--append", action="store_true", help="load addresses from and append to output file")
+        parser.add_argument("-C", "--checkpoint", help="resumable scan state file (use {} for address in name)")
+        parser.add_argument("-I", "--index", default=os.environ.get("HYPY_INDEX", None),
+                            help="address index file to sync & scan instead of the wallet (env: HYPY_INDEX)")
         parser.add_argument("address", metavar="ADDR", type=str, help="address to scan")
 
     def run(self):
@@ -43,54 +61,161 @@ class AScanApp(HydraApp):
 
             self.out = open(filename, "a")
 
-        for (addr_scan, addr_found) in AScanApp.ascan(self.rpc, address, self.args.count, self.args.skip,
-                                                      addr_found=addresses,
-                                                      recursive=self.args.recursive):
-            line = f"{addr_scan}: {addr_found}\n"
-            print(line, end="")
-            sys.stdout.flush()
+        checkpoint = Checkpoint(self.args.checkpoint.replace("{}", address)) if self.args.checkpoint else None
+        index = AddressIndex(self.args.index) if self.args.index else None
+
+        if index is not None:
+            index.sync(self.rpc)
+
+        try:
+            for (addr_scan, addr_found) in AScanApp.ascan(self.rpc, address, self.args.count, self.args.skip,
+                                                          addr_found=addresses,
+                                                          recursive=self.args.recursive,
+                                                          depth=self.args.depth, width=self.args.width,
+                                                          threads=self.args.threads, checkpoint=checkpoint,
+                                                          index=index):
+                line = f"{addr_scan}: {addr_found}\n"
+                print(line, end="")
+                sys.stdout.flush()
+
+                if self.out is not None:
+                    self.out.write(line)
+                    self.out.flush()
 
-            if self.out is not None:
-                self.out.write(line)
-                self.out.flush()
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+            if index is not None:
+                index.close()
 
     @staticmethod
-    def ascan(rpc, address, count: int, skip: int = None, addr_found: set = None, recursive=False):
+    def ascan(rpc, address, count: int, skip: int = None, addr_found: set = None, recursive=False, *,
+              depth: int = None, width: int = None, threads: int = None, checkpoint: Checkpoint = None,
+              index: AddressIndex = None):
+        """Yield `(addr_scan, addr_found)` for each new address found as an input alongside `addr_scan`.
+
+        With `recursive`, found addresses are scanned breadth-first, level by level, up to `depth`
+        levels below `address` and `width` addresses per level. Each level is scanned on up to `threads`
+        concurrent workers, with no more scans queued than are running, so stopping the scan waits for
+        none of them; results are yielded in frontier order, and each transaction is resolved only once
+        across the whole scan.
+
+        Scan state is kept in `checkpoint`, so a scan interrupted with a persistent checkpoint resumes
+        from its pending addresses without repeating results, reusing transactions already resolved.
+
+        With an `index`, address histories and transaction addresses come from the (synced) index
+        rather than from importing addresses into the wallet.
+        """
+        if checkpoint is None:
+            checkpoint = Checkpoint()
+
+        checkpoint.expect(
+            "ascan", dict(address=address, count=count, skip=skip, recursive=recursive, depth=depth, width=width)
+        )
+
         if addr_found is None:
             addr_found = set()
 
-        logs = Hydra.get().app.log
+        addr_found.update(checkpoint.addresses())
+        checkpoint.add(address)
+
+        threads = threads or AScanApp.THREADS
+        executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="hypy-ascan")
+
+        try:
+            while True:
+                level, frontier = checkpoint.pending()
+
+                if level is None:
+                    break
+
+                if width is not None and level > 0:
+                    allowed = max(0, width - checkpoint.count(level, Checkpoint.SCANNED))
+                    checkpoint.mark(frontier[allowed:], Checkpoint.SKIPPED)
+                    frontier = frontier[:allowed]
+
+                queue = recursive and (depth is None or level < depth)
+
+                addrs = iter(frontier)
+                futures = deque()
+
+                while True:
+                    while len(futures) < threads:
+                        addr = next(addrs, None)
+
+                        if addr is None:
+                            break
+
+                        futures.append((addr, executor.submit(
+                            AScanApp.__scan, rpc, addr, count, skip, checkpoint, index
+                        )))
+
+                    if not len(futures):
+                        break
+
+                    addr_scan, future = futures.popleft()
+
+                    for addr_vin in future.result():
+                        addrs_vin_diff = addr_vin.difference(addr_found)
+                        addr_found.update(addr_vin)
+
+                        for addr in addrs_vin_diff:
+                            try:
+                                yield addr_scan, addr
+                            finally:
+                                # Recorded once handed out, even if the consumer stops here.
+                                checkpoint.found(addr_scan, (addr,), level + 1, queue=queue)
+
+                    checkpoint.scanned(addr_scan)
 
+        finally:
+            # Scans not yet started are dropped: each one imports an address into the wallet.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def __scan(rpc, address: str, count: int, skip: int, checkpoint: Checkpoint, index: AddressIndex) -> list:
+        """List `address` transactions, returning the vin address sets of those it is an input to.
+        """
         if not rpc.validateaddress(address).isvalid:
             raise ValueError(f"{address}: invalid address")
 
-        logs.info(f"{address}: importing address...")
-        rpc.importaddress(address=address, label=address)
+        if index is not None:
+            txns = index.transactions(address, count, skip)
 
-        logs.info(f"{address}: getting transactions...")
-        txns = rpc.listtransactions(
-            label=address, count=count, skip=skip,
-            include_watchonly=True
-        )
+        else:
+            log.info(f"{address}: importing address...")
+            rpc.importaddress(address=address, label=address)
 
-        logs.info(f"{address}: scanning {len(txns)} TXes for vin addresses...")
-        for txn in txns:
-            logs.debug(f"{address}: txid: {txn.txid}")
-            addr_vin, addr_vout = TxVIOApp.get_vinout_addresses(rpc, txn.txid, txn.blockhash)
-            logs.debug(f"{address}: addr: vin={addr_vin} vout={addr_vout}")
+            log.info(f"{address}: getting transactions...")
+            txns = rpc.listtransactions(
+                label=address, count=count, skip=skip,
+                include_watchonly=True
+            )
 
-            if address in addr_vin:
-                addrs_vin_union = addr_found.union(addr_vin)
-                addrs_vin_diff = addrs_vin_union.difference(addr_found)
-                addr_found.update(addrs_vin_union)
+        resolved = checkpoint.txs(txn.txid for txn in txns)
+        unresolved = list({txn.txid: txn.get("blockhash") for txn in txns if txn.txid not in resolved}.items())
 
-                for addr in addrs_vin_diff:
+        log.info(f"{address}: scanning {len(txns)} TXes for vin addresses ({len(unresolved)} unresolved)...")
 
-                    yield address, addr
+        if len(unresolved):
+            if index is not None:
+                indexed = index.tx_addresses(txid for txid, _ in unresolved)
+                addrs = [indexed[txid] for txid, _ in unresolved]
+            else:
+                addrs = TxVIOApp.get_vinout_addresses_many(rpc, unresolved)
 
-                    if recursive and addr != address:
-                        for (r_addr_scan, r_addr_found) in AScanApp.ascan(rpc, addr, count, skip, addr_found, recursive):
-                            yield r_addr_scan, r_addr_found
+            for (txid, _), (addr_vin, addr_vout) in zip(unresolved, addrs):
+                log.debug(f"{address}: txid: {txid} addr: vin={addr_vin} vout={addr_vout}")
+                resolved[txid] = addr_vin, addr_vout
+
+            checkpoint.put_txs((txid, *resolved[txid]) for txid, _ in unresolved)
+
+        return [
+            resolved[txn.txid][0]
+            for txn in txns
+            if address in resolved[txn.txid][0]
+        ]
 
 
 @Test.register()
@@ -106,6 +231,93 @@ class AScanAppTest(Test):
         """
         self.assertHydraAppIsRunnable(AScanApp, "--rpc-wallet=watch", "HVknEFy1R2mfuegku1S7bMwpHLjoqVGJxF")
 
+    def test_2_ascan_breadth_first(self):
+        txns = {"A": ["t1", "t2"], "B": ["t1", "t3"], "C": ["t2"], "D": ["t4"], "E": ["t4"]}
+        vins = {"t1": {"A", "B"}, "t2": {"C"}, "t3": {"B", "D"}, "t4": {"D", "E"}}
+        resolved = []
+
+        def get_vinout_addresses_many(rpc, txes):
+            resolved.extend(txid for txid, _ in txes)
+            return [(vins[txid], set()) for txid, _ in txes]
+
+        methods = {
+            "validateaddress": lambda address: {"isvalid": True},
+            "importaddress": lambda address, label: None,
+            "listtransactions": lambda label, count, skip, watchonly: [
+                {"txid": txid, "blockhash": "b"} for txid in txns[label]
+            ],
+        }
+
+        with StubRPCServer(methods) as stub, \
+                mock.patch.object(TxVIOApp, "get_vinout_addresses_many", side_effect=get_vinout_addresses_many):
+            rpc = stub.rpc()
+
+            found = list(AScanApp.ascan(rpc, "A", 10, 0, recursive=True, threads=2))
+
+            self.assertEqual(found[:2], [("A", "A"), ("A", "B")] if found[0][1] == "A" else [("A", "B"), ("A", "A")])
+            self.assertEqual(found[2:], [("B", "D"), ("D", "E")])
+            self.assertEqual(sorted(resolved), ["t1", "t2", "t3", "t4"])
+
+            self.assertEqual(
+                set(AScanApp.ascan(rpc, "A", 10, 0, recursive=True, depth=1)),
+                {("A", "A"), ("A", "B"), ("B", "D")}
+            )
+            self.assertEqual(set(AScanApp.ascan(rpc, "A", 10, 0, recursive=True, width=0)), {("A", "A"), ("A", "B")})
+            self.assertEqual(set(AScanApp.ascan(rpc, "A", 10, 0)), {("A", "A"), ("A", "B")})
+
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "ascan.db")
+
+                with Checkpoint(path) as checkpoint:
+                    scan = AScanApp.ascan(rpc, "A", 10, 0, recursive=True, checkpoint=checkpoint)
+                    found = [next(scan), next(scan), next(scan)]
+                    scan.close()
+
+                resolved.clear()
+                posts = stub.posts
+
+                with Checkpoint(path) as checkpoint:
+                    found += list(AScanApp.ascan(rpc, "A", 10, 0, recursive=True, checkpoint=checkpoint))
+
+                    self.assertEqual(found[2:], [("B", "D"), ("D", "E")])
+                    self.assertEqual(resolved, ["t4"])
+                    self.assertEqual(stub.posts - posts, 3 * 3)  # B, D and E: validate, import, list.
+                    self.assertEqual(list(AScanApp.ascan(rpc, "A", 10, 0, recursive=True, checkpoint=checkpoint)), [])
+
+                    with self.assertRaises(ValueError):
+                        list(AScanApp.ascan(rpc, "B", 10, 0, checkpoint=checkpoint))
+
+                    with self.assertRaises(ValueError):
+                        list(AScanApp.ascan(rpc, "A", 10, 0, recursive=True, depth=1, checkpoint=checkpoint))
+
+    def test_3_ascan_stop(self):
+        level_1 = [f"B{i}" for i in range(8)]
+        txns = {"A": ["t"], **{addr: [f"t{addr}"] for addr in level_1}}
+        vins = {"t": {"A", *level_1}, **{f"t{addr}": {addr, f"C{addr}"} for addr in level_1}}
+
+        methods = {
+            "validateaddress": lambda address: {"isvalid": True},
+            "importaddress": lambda address, label: None,
+            "listtransactions": lambda label, count, skip, watchonly: [
+                {"txid": txid, "blockhash": "b"} for txid in txns[label]
+            ],
+        }
+
+        with StubRPCServer(methods, delay=.05) as stub, mock.patch.object(
+                TxVIOApp, "get_vinout_addresses_many", lambda rpc, txes: [(vins[txid], set()) for txid, _ in txes]):
+            scan = AScanApp.ascan(stub.rpc(), "A", 10, 0, recursive=True, threads=2)
+
+            while next(scan)[0] == "A":
+                pass
+
+            started = time.monotonic()
+            scan.close()
+            self.assertLess(time.monotonic() - started, .1)
+
+            time.sleep(.5)
+            imported = [params[0] for method, params in stub.calls if method == "importaddress"]
+            self.assertLessEqual(len(imported), 1 + 3)
+
 
 if __name__ == "__main__":
     AScanApp.main()
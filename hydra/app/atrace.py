@@ -11,6 +11,9 @@ from datetime import datetime
 from hydra.app.cli import HydraApp
 from hydra.rpc import HydraRPC
 from hydra.test import Test
+from hydra.util import rawtx
+from hydra.util.checkpoint import Checkpoint
+from hydra.index import AddressIndex
 
 from .txvio import TxVIOApp
 
@@ -23,22 +26,45 @@ class ATraceApp(HydraApp):
     def parser(parser: argparse.ArgumentParser):
         parser.add_argument("-c", "--count", type=int, default=1000000,
                             help="max number of recent transactions to load")
+        parser.add_argument("-C", "--checkpoint", help="resumable trace state file (use {} for address in name)")
+        parser.add_argument("-I", "--index", default=os.environ.get("HYPY_INDEX", None),
+                            help="address index file to sync & trace instead of the wallet (env: HYPY_INDEX)")
         parser.add_argument("address", metavar="ADDR", type=str, help="address to trace")
 
     def run(self):
+        checkpoint = Checkpoint(self.args.checkpoint.replace("{}", self.args.address)) \
+            if self.args.checkpoint else Checkpoint()
+
+        index = AddressIndex(self.args.index) if self.args.index else None
+
+        with checkpoint:
+            if index is None:
+                return self.trace(checkpoint)
+
+            with index:
+                index.sync(self.rpc)
+                return self.trace(checkpoint, index)
+
+    def trace(self, checkpoint: Checkpoint, index: AddressIndex = None):
         address = self.args.address
         block_time = 2**32
         amount = 0
         vins = set()
 
-        try:
-            self.rpc.getaddressesbylabel(label=address)
-        except HydraRPC.Exception as err:
-            pass  # TODO: Check that err is label not found: error(code=-11, ...)
-            self.log.info(f"{address}: importing")
-            self.rpc.importaddress(address=address, label=address, rescan=True)
+        checkpoint.expect("atrace", dict(address=address, count=self.args.count))
+
+        if index is not None:
+            txns = index.transactions(address, count=self.args.count)
+
+        else:
+            try:
+                self.rpc.getaddressesbylabel(label=address)
+            except HydraRPC.Exception as err:
+                pass  # TODO: Check that err is label not found: error(code=-11, ...)
+                self.log.info(f"{address}: importing")
+                self.rpc.importaddress(address=address, label=address, rescan=True)
 
-        txns = self.rpc.listtransactions(label=address, count=self.args.count, skip=0, include_watchonly=True)
+            txns = self.rpc.listtransactions(label=address, count=self.args.count, skip=0, include_watchonly=True)
 
         self.log.info(f"{address}: scanning {len(txns)} transactions")
 
@@ -50,7 +76,7 @@ class ATraceApp(HydraApp):
                 blocktime = 0
 
             if txn.amount > 0 and blocktime <= block_time:
-                (addr_vin, addr_vout) = TxVIOApp.get_vinout_addresses(self.rpc, txn.txid, txn.blockhash)
+                (addr_vin, addr_vout) = ATraceApp.get_vinout_addresses(self.rpc, checkpoint, txn, index)
 
                 if address in addr_vout and address not in addr_vin:
                     if len(addr_vin):
@@ -62,27 +88,57 @@ class ATraceApp(HydraApp):
                         amount = txn.amount
                     else:
                         # Get contract address from vout
-                        txd = self.rpc.decoderawtransaction(
-                            hexstring=self.rpc.getrawtransaction(txn.txid, False, txn.blockhash),
-                            iswitness=True
-                        )
-
-                        for vout in filter(lambda vout_: not hasattr(vout_.scriptPubKey, "addresses"), txd.vout):
-                            # NOTE: Only works for testnet faucet OP_CALL,
-                            #       mainnet asm[-2] == OP_RETURN (Coinbase input)
-
-                            asm = vout.scriptPubKey.asm.split()
-
+                        for op, contract_address in ATraceApp.get_contract_calls(self.rpc, checkpoint, txn):
                             self.log.info(
-                                f"{address}: tx {datetime.fromtimestamp(blocktime)} op={asm[-1]} addr={asm[-2]}"
+                                f"{address}: tx {datetime.fromtimestamp(blocktime)} "
+                                f"op={op} addr={contract_address}"
                             )
 
                             block_time = blocktime
-                            vins = {asm[-2]}
+                            vins = {contract_address}
                             amount = txn.amount
 
         print(f"{address}: {','.join(vins)} {datetime.fromtimestamp(block_time)} {amount}")
 
+    @staticmethod
+    def get_vinout_addresses(rpc, checkpoint: Checkpoint, txn, index: AddressIndex = None) -> (set, set):
+        """Resolve a transaction's addresses from the index or the node, or reuse them from the checkpoint.
+        """
+        resolved = checkpoint.txs((txn.txid,)).get(txn.txid)
+
+        if resolved is None:
+            if index is not None:
+                resolved = index.tx_addresses((txn.txid,))[txn.txid]
+            else:
+                resolved = TxVIOApp.get_vinout_addresses(rpc, txn.txid, txn.blockhash)
+
+            checkpoint.put_txs(((txn.txid, *resolved),))
+
+        return resolved
+
+    @staticmethod
+    def get_contract_calls(rpc, checkpoint: Checkpoint, txn) -> list:
+        """List `(op, contract_address)` for a transaction's contract outputs, or reuse them from the checkpoint.
+        """
+        key = f"contract:{txn.txid}"
+        calls = checkpoint.get(key)
+
+        if calls is None:
+            txd = rawtx.decode(
+                rpc.getrawtransaction(txn.txid, False, txn.blockhash),
+                rawtx.MAINNET if rpc.mainnet else rawtx.TESTNET
+            )
+
+            calls = [
+                (vout.scriptPubKey.type, vout.scriptPubKey.contract.address)
+                for vout in txd.vout
+                if "address" in vout.scriptPubKey.get("contract", ())
+            ]
+
+            checkpoint.set(key, calls)
+
+        return calls
+
 
 @Test.register()
 class ATraceAppTest(Test):
@@ -1,27 +1,102 @@
-"""Contract call to method ID converter.
+"""Contract call encoder.
 
-Will eventually also generate function calls based on params specified.
+Print the method ID or call data for a function signature and params,
+call a contract and decode its result, or look up signatures by selector or topic.
 """
+import argparse
+import os
+import tempfile
 from argparse import ArgumentParser
-from hydra.util import sha
+
+from hydra.index import SignatureIndex
+from hydra.util import abi
 
 from hydra.app.cli import HydraApp
+from hydra.rpc import HydraRPC, ContractReader
 from hydra.test import Test
+from hydra.test.stub import StubRPCServer
 
 
-@HydraApp.register(name="call", desc=__doc__, version="1.00")
+@HydraApp.register(name="call", desc=__doc__, version="1.01")
 class Call(HydraApp):
 
     @staticmethod
     def parser(parser: ArgumentParser):
-        parser.add_argument("func_sig", metavar="SIG", type=str, help="function signature.")
+        parser.add_argument("-a", "--address", type=str, default=None,
+                            help="contract to call with callcontract and decode the result of")
+        parser.add_argument("-s", "--sender", type=str, default=None, help="sender address for the call")
+        parser.add_argument("-g", "--gas-limit", type=int, default=None, help="gas limit for the call")
+        parser.add_argument("-r", "--raw", action="store_true", help="print the raw call output")
+        parser.add_argument("-L", "--lookup", action="store_true",
+                            help="look up signatures for SIG as a selector, call data or event topic")
+        parser.add_argument("-S", "--signatures", default=os.environ.get("HYPY_SIGNATURES", None),
+                            help="signature index file for lookups (env: HYPY_SIGNATURES)")
+        parser.add_argument("--build", type=argparse.FileType("r"), metavar="FILE", default=None,
+                            help="build the signature index from a file of signatures, one per line")
+        parser.add_argument("func_sig", metavar="SIG", type=str, nargs="?", default=None,
+                            help="function signature, with outputs to decode, e.g. 'balanceOf(address)(uint256)'.")
+        parser.add_argument("params", metavar="PARAM", nargs="*", help="function parameters (arrays as json).")
 
     def run(self):
-        print(Call.method_id_from_sig(self.args.func_sig))
+        if self.args.build is not None or self.args.lookup:
+            return self.signatures()
+
+        if self.args.func_sig is None:
+            raise ValueError("SIG is required")
+
+        if self.args.address is None:
+            if not len(self.args.params):
+                return print(Call.method_id_from_sig(self.args.func_sig))
+
+            return print(abi.encode_call(self.args.func_sig, *self.args.params))
+
+        output = Call.call(
+            self.rpc, self.args.address, self.args.func_sig, *self.args.params,
+            sender=self.args.sender, gas_limit=self.args.gas_limit, raw=self.args.raw
+        )
+
+        self.render(result=output, name=abi.parse_signature(self.args.func_sig).name)
+
+    def signatures(self):
+        if self.args.signatures is None:
+            raise ValueError("no signature index: pass -S or set HYPY_SIGNATURES")
+
+        if self.args.build is not None:
+            count = SignatureIndex.build(self.args.signatures, self.args.build, processes=os.cpu_count())
+            return print(f"{self.args.signatures}: indexed {count} signatures")
+
+        if self.args.func_sig is None:
+            raise ValueError("SIG is required for lookups")
+
+        with SignatureIndex(self.args.signatures) as index:
+            key = self.args.func_sig[2:] if self.args.func_sig.startswith("0x") else self.args.func_sig
+            found = index.topic(key) if len(key) == 64 else index.selector(key)
+
+        print("\n".join(found))
+        return 0 if len(found) else -1
 
     @staticmethod
     def method_id_from_sig(func_sig: str) -> str:
-        return sha.sha3(func_sig).hex()[:8]
+        return abi.selector(func_sig)
+
+    @staticmethod
+    def call(rpc: HydraRPC, address: str, func_sig: str, *params, sender: str = None, gas_limit: int = None,
+             raw: bool = False) -> [list, str]:
+        """Call `func_sig` on the contract at `address`, returning the decoded outputs.
+
+        The raw output hex is returned with `raw` or if the signature declares no outputs.
+        Raises ValueError if the call was reverted.
+        """
+        result = ContractReader.result(address, func_sig, rpc.callcontract(
+            address, abi.encode_call(func_sig, *params),
+            sender if sender is not None else "" if gas_limit is not None else ...,
+            gas_limit if gas_limit is not None else ...
+        ), raw=raw)
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
 
 
 @Test.register()
@@ -37,6 +112,49 @@ class CallTest(Test):
         """
         self.assertHydraAppIsRunnable(Call, "name()")
 
+    def test_2_call_contract(self):
+        balances = {"fedfe3fc79391cc8fe86cd78f0643875b2a8375a": 10**8}
+
+        def callcontract(address, data, *args):
+            if data[:8] != abi.selector("balanceOf(address)"):
+                return {"executionResult": {"excepted": "Revert", "output": ""}}
+
+            holder, = abi.decode(["address"], data[8:])
+            return {"executionResult": {"excepted": "None", "output": abi.encode(["uint256"], [balances[holder]])}}
+
+        self.assertEqual(Call.method_id_from_sig("balanceOf(address)"), "70a08231")
+
+        with StubRPCServer({"callcontract": callcontract}) as stub:
+            rpc = stub.rpc()
+
+            self.assertEqual(
+                Call.call(rpc, "aa" * 20, "balanceOf(address)(uint256)", "HVknEFy1R2mfuegku1S7bMwpHLjoqVGJxF"),
+                [10**8]
+            )
+            self.assertEqual(
+                Call.call(rpc, "aa" * 20, "balanceOf(address)", "fedfe3fc79391cc8fe86cd78f0643875b2a8375a"),
+                abi.encode(["uint256"], [10**8])
+            )
+            self.assertEqual(stub.calls[-1][1], (
+                "aa" * 20, abi.encode_call("balanceOf(address)", "fedfe3fc79391cc8fe86cd78f0643875b2a8375a")
+            ))
+
+            with self.assertRaises(ValueError):
+                Call.call(rpc, "aa" * 20, "totalSupply()(uint256)", gas_limit=250000)
+
+            self.assertEqual(stub.calls[-1][1][2:], ("", 250000))
+
+    def test_3_call_lookup(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "signatures.idx")
+
+            with open(os.path.join(tmp, "signatures.txt"), "w") as file:
+                file.write("transfer(address to, uint256 value)\nTransfer(address,address,uint256)\n")
+
+            self.assertHydraAppIsRunnable(Call, "-S", path, "--build", file.name)
+            self.assertHydraAppIsRunnable(Call, "-S", path, "-L", "a9059cbb" + "00" * 64)
+            self.assertHydraAppIsRunnable(Call, "-S", path, "-L", abi.event_topic("Transfer(address,address,uint256)"))
+
 
 if __name__ == "__main__":
     Call.main()
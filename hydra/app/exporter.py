@@ -0,0 +1,214 @@
+"""Prometheus metrics exporter.
+
+Serve node status from `top` as Prometheus metrics on a local HTTP endpoint.
+"""
+import argparse
+import os
+import re
+import threading
+import time
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+
+from hydra import log
+from hydra.app.cli import HydraApp
+from hydra.rpc import HydraRPC
+from hydra.test import Test
+from hydra.test.stub import StubRPCServer
+
+from .top import TopApp
+
+
+@HydraApp.register(name="exporter", desc=__doc__, version="1.00")
+class ExporterApp(TopApp):
+    """Prometheus exporter reusing `TopApp.read()`.
+
+    Results are cached for `--ttl` seconds. Only one collection runs at a time: scrapes arriving
+    while one is in flight wait for it and share its result, so any number of scrapers cost at most
+    one round of status calls per TTL.
+    """
+    PORT = 9866
+    TTL = 10.0
+    PREFIX = "hydra_"
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    __lock: threading.Lock
+    __cached: bytes = None
+    __cached_at: float = 0
+
+    @staticmethod
+    def parser(parser: argparse.ArgumentParser):
+        parser.add_argument("-b", "--bind", type=str, default="127.0.0.1", help="address to listen on.")
+        parser.add_argument("-p", "--port", type=int, default=ExporterApp.PORT,
+                            help=f"port to listen on (default: {ExporterApp.PORT}).")
+        parser.add_argument("-t", "--ttl", type=float, default=ExporterApp.TTL,
+                            help=f"seconds to serve cached results for (default: {ExporterApp.TTL:g}).")
+        parser.add_argument("-x", "--extended", action="store_true", help="also export mining info.")
+        parser.add_argument("-P", "--concurrent", action="store_true",
+                            help="send each status call concurrently instead of in one batch.")
+        parser.set_defaults(timezone="UTC", curses=False, timing=True, history=0)
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.__lock = threading.Lock()
+
+    def run(self):
+        server = self.server()
+        log.info(f"exporter: serving http://{self.args.bind}:{server.server_address[1]}/metrics")
+
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+    def server(self) -> ThreadingHTTPServer:
+        app = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                content = app.scrape()
+
+                self.send_response(200)
+                self.send_header("Content-Type", ExporterApp.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, fmt, *args):
+                log.debug(f"exporter: {self.address_string()} {fmt % args}")
+
+        return ThreadingHTTPServer((self.args.bind, self.args.port), Handler)
+
+    def scrape(self) -> bytes:
+        """The metrics page, collected at most once per TTL however many scrapes arrive.
+        """
+        with self.__lock:
+            if self.__cached is None or time.monotonic() - self.__cached_at >= self.args.ttl:
+                self.__cached = self.collect().encode()
+                self.__cached_at = time.monotonic()
+
+            return self.__cached
+
+    def collect(self) -> str:
+        start = time.perf_counter()
+
+        try:
+            result = self.read()
+
+        except (HydraRPC.Exception, Exception) as exc:
+            log.warning(f"exporter: {exc!r}")
+            result = None
+
+        return ExporterApp.exposition(result, time.perf_counter() - start)
+
+    @staticmethod
+    def exposition(result, duration: float) -> str:
+        """Render a `TopApp.read()` result (or None if it failed) in the Prometheus text format.
+        """
+        lines = []
+
+        def gauge(name: str, value: float, help_: str = None, labels: str = ""):
+            if help_ is not None:
+                lines.append(f"# HELP {name} {help_}")
+                lines.append(f"# TYPE {name} gauge")
+
+            lines.append(f"{name}{labels} {value!r}")
+
+        gauge(f"{ExporterApp.PREFIX}up", float(result is not None), "Whether the last status read succeeded.")
+        gauge(f"{ExporterApp.PREFIX}collect_duration_seconds", duration, "Time taken by the last status read.")
+
+        if result is None:
+            return "\n".join(lines) + "\n"
+
+        timing = result.pop("timing", {})
+
+        for name, value in TopApp.numeric(result, bools=True):
+            gauge(ExporterApp.PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name), value, name)
+
+        for index, (method, ms) in enumerate(timing.items()):
+            gauge(
+                f"{ExporterApp.PREFIX}rpc_duration_seconds", ms / 1000,
+                "Status call time (method=\"batch\" for all calls in one batch)." if index == 0 else None,
+                f"{{method=\"{method}\"}}"
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+@Test.register()
+class ExporterAppTest(Test):
+
+    def test_0_exporter_runnable(self):
+        """Test running the app.
+        """
+        self.assertHydraAppIsRunnable(ExporterApp, "-h")
+
+    def test_1_exporter_scrape(self):
+        methods = {
+            "getblockcount": lambda: 100,
+            "getconnectioncount": lambda: 8,
+            "getestimatedannualroi": lambda: 12.5,
+            "getstakinginfo": lambda: {
+                "enabled": True, "search-interval": 16, "expectedtime": 3600, "weight": 10**8,
+                "netstakeweight": 2 * 10**8, "errors": "",
+            },
+            "getwalletinfo": lambda: {"walletname": "", "balance": 1.5},
+        }
+
+        with StubRPCServer(methods, delay=.05) as stub, mock.patch.dict(os.environ, {"HYPY_NO_RPC_ARGS": "1"}):
+            app = ExporterApp(port=0, ttl=60, json=False)
+            app.rpc = stub.rpc()
+            server = app.server()
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+            try:
+                url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+                pages = []
+
+                def scrape():
+                    with urllib.request.urlopen(url) as rsp:
+                        self.assertEqual(rsp.headers["Content-Type"], ExporterApp.CONTENT_TYPE)
+                        pages.append(rsp.read().decode())
+
+                scrapers = [threading.Thread(target=scrape) for _ in range(8)]
+
+                for scraper in scrapers:
+                    scraper.start()
+
+                for scraper in scrapers:
+                    scraper.join()
+
+                self.assertEqual(stub.posts, 1)
+                self.assertEqual(len(set(pages)), 1)
+
+                metrics = dict(
+                    line.rsplit(" ", 1) for line in pages[0].splitlines() if not line.startswith("#")
+                )
+
+                self.assertEqual(metrics["hydra_up"], "1.0")
+                self.assertEqual(metrics["hydra_blockcount"], "100.0")
+                self.assertEqual(metrics["hydra_stakinginfo_enabled"], "1.0")
+                self.assertEqual(metrics["hydra_stakinginfo_search_interval"], "16.0")
+                self.assertGreater(float(metrics['hydra_rpc_duration_seconds{method="batch"}']), .04)
+
+                stub.methods["getblockcount"] = lambda: 101
+                self.assertIn("hydra_blockcount 100.0", app.scrape().decode())
+
+                app.args.ttl = 0
+                self.assertIn("hydra_blockcount 101.0", app.scrape().decode())
+
+                del stub.methods["getblockcount"]
+                self.assertIn("hydra_up 0.0", app.scrape().decode())
+
+            finally:
+                server.shutdown()
+                server.server_close()
+
+
+if __name__ == "__main__":
+    ExporterApp.main()
@@ -0,0 +1,140 @@
+"""HRC20 balance snapshot.
+
+Read the token balances of many holders at a single block height.
+"""
+import argparse
+import sys
+from decimal import Decimal
+
+from hydra import log
+from hydra.app.cli import HydraApp
+from hydra.rpc import HydraRPC, ContractReader
+from hydra.test import Test
+from hydra.test.stub import StubRPCServer
+from hydra.util import abi
+
+
+@HydraApp.register(name="hrc20", desc=__doc__, version="1.00")
+class HRC20App(HydraApp):
+
+    @staticmethod
+    def parser(parser: argparse.ArgumentParser):
+        parser.add_argument("-c", "--contract", action="append", required=True,
+                            help="token contract address (repeat for several tokens)")
+        parser.add_argument("-i", "--input", type=argparse.FileType("r"), default=None,
+                            help="file of holder addresses, one per line ('-' for stdin)")
+        parser.add_argument("-z", "--nonzero", action="store_true", help="only list non-zero balances")
+        parser.add_argument("-b", "--batch-size", type=int, default=HydraRPC.BATCH_SIZE,
+                            help=f"calls per batched request (default: {HydraRPC.BATCH_SIZE})")
+        parser.add_argument("-t", "--threads", type=int, default=ContractReader.THREADS,
+                            help=f"batched requests in flight (default: {ContractReader.THREADS})")
+        parser.add_argument("holders", metavar="ADDR", nargs="*", help="holder address")
+
+    def run(self):
+        holders = list(self.args.holders)
+
+        if self.args.input is not None:
+            holders.extend(line.strip() for line in self.args.input if line.strip())
+
+        if not len(holders):
+            print("No holder addresses given.", file=sys.stderr)
+            return -1
+
+        reader = ContractReader(self.rpc, batch_size=self.args.batch_size, threads=self.args.threads)
+        snapshot = HRC20App.snapshot(reader, self.args.contract, holders, nonzero=self.args.nonzero)
+
+        self.render(result=snapshot, name="hrc20")
+
+    @staticmethod
+    def snapshot(reader: ContractReader, tokens: list, holders: list, *, nonzero: bool = False) -> dict:
+        """Balances of `holders` for each of `tokens`, with token symbol and decimals, read at one height.
+
+        Balances are `Decimal`s scaled by the token's decimals. Holders for which the call fails are omitted.
+        """
+        calls = []
+
+        for token in tokens:
+            calls.append((token, "symbol()(string)"))
+            calls.append((token, "decimals()(uint8)"))
+            calls.extend((token, "balanceOf(address)(uint256)", holder) for holder in holders)
+
+        read = reader.read(calls, raise_errors=False)
+        results = iter(read.results)
+        snapshot = {"height": read.height, "hash": read.hash}
+
+        for token in tokens:
+            symbol, decimals = next(results), next(results)
+            symbol = symbol[0] if not isinstance(symbol, Exception) else None
+            decimals = decimals[0] if not isinstance(decimals, Exception) else 0
+            balances = {}
+
+            for holder, balance in zip(holders, results):
+                if isinstance(balance, Exception):
+                    log.warning(f"hrc20: {holder}: {balance}")
+                    continue
+
+                if balance[0] or not nonzero:
+                    balances[holder] = Decimal(balance[0]).scaleb(-decimals)
+
+            snapshot[token] = {"symbol": symbol, "decimals": decimals, "balances": balances}
+
+        return snapshot
+
+
+@Test.register()
+class HRC20AppTest(Test):
+
+    def test_0_hrc20_runnable(self):
+        """Test running the app.
+        """
+        self.assertHydraAppIsRunnable(HRC20App, "-h")
+
+    def test_1_hrc20_snapshot(self):
+        holders = ["%040x" % i for i in range(1, 8)]
+        state = {"height": 100, "moves": 1}
+
+        def callcontract(address, data, *args):
+            if state["moves"]:
+                state["moves"] -= 1
+                state["height"] += 1
+
+            if data == abi.selector("symbol()"):
+                output = abi.encode(["string"], ["TKN"])
+            elif data == abi.selector("decimals()"):
+                output = abi.encode(["uint8"], [8])
+            elif address == "bb" * 20:
+                return {"executionResult": {"excepted": "Revert", "output": ""}}
+            else:
+                holder, = abi.decode(["address"], data[8:])
+                output = abi.encode(["uint256"], [int(holder, 16) % 3 * 10**7])
+
+            return {"executionResult": {"excepted": "None", "output": output}}
+
+        methods = {
+            "getblockcount": lambda: state["height"],
+            "getbestblockhash": lambda: f"{state['height']:064x}",
+            "callcontract": callcontract,
+        }
+
+        with StubRPCServer(methods, delay=.01) as stub:
+            reader = ContractReader(stub.rpc(), batch_size=3, threads=2)
+            snapshot = HRC20App.snapshot(reader, ["aa" * 20, "bb" * 20], holders, nonzero=True)
+
+            self.assertEqual((snapshot["height"], snapshot["hash"]), (101, f"{101:064x}"))
+            self.assertEqual(snapshot["aa" * 20]["symbol"], "TKN")
+            self.assertEqual(snapshot["aa" * 20]["balances"], {
+                holder: Decimal("0.1") * (int(holder, 16) % 3) for holder in holders if int(holder, 16) % 3
+            })
+            self.assertEqual(snapshot["bb" * 20]["balances"], {})
+            self.assertEqual(stub.active_max, 2)
+
+            # Two reads: the tip moved during the first.
+            self.assertEqual(len([call for call in stub.calls if call[0] == "callcontract"]), 2 * 2 * 9)
+
+            with self.assertRaises(ContractReader.HeightError):
+                state["moves"] = 10
+                ContractReader(stub.rpc(), retries=1).read([("aa" * 20, "decimals()(uint8)")])
+
+
+if __name__ == "__main__":
+    HRC20App.main()
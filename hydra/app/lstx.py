@@ -4,10 +4,13 @@ Display the transactions within the given range of blocks.
 """
 import argparse
 import json
+import sys
+from typing import Iterator
 
 from hydra.app.cli import HydraApp
 from hydra.rpc import HydraRPC
 from hydra.test import Test
+from hydra.test.stub import StubRPCServer
 
 from .txvio import TxVIOApp
 
@@ -19,6 +22,12 @@ class TxListApp(HydraApp):
     def parser(parser: argparse.ArgumentParser):
         parser.add_argument("-a", "--addrs", action="store_true", default=False, required=False,
                             help="also print TX input & output addresses")
+        parser.add_argument("-i", "--inline", action="store_true", default=False, required=False,
+                            help="fetch transactions inline with blocks (getblock verbosity 2)")
+        parser.add_argument("-w", "--window", type=int, default=HydraRPC.BLOCK_WINDOW,
+                            help=f"blocks per batched request (default: {HydraRPC.BLOCK_WINDOW})")
+        parser.add_argument("-p", "--prefetch", type=int, default=HydraRPC.BLOCK_PREFETCH,
+                            help=f"batched requests in flight (default: {HydraRPC.BLOCK_PREFETCH})")
         parser.add_argument("block_from", metavar="FROM", type=int,
                             help="block index offset relative to current block height, or 0 for first")
         parser.add_argument("block_to", metavar="TO", type=int, nargs="?", default=0,
@@ -38,35 +47,59 @@ class TxListApp(HydraApp):
         if block_from > block_to:
             raise argparse.ArgumentError(self.args.block_from, "block_from must be <= block_to")
 
-        block_tx = TxListApp.get_block_range_tx(self.rpc, block_from, block_to)
+        block_tx = TxListApp.iter_block_range_tx(
+            self.rpc, block_from, block_to,
+            inline=self.args.inline, window=self.args.window, prefetch=self.args.prefetch
+        )
 
-        for height, (block_hash, txes) in block_tx.items():
+        for height, block_hash, txes in block_tx:
             print(str(height).ljust(7, " "), block_hash)
 
+            txids = [tx.txid for tx in txes] if self.args.inline else txes
+
             if not self.args.addrs:
-                print("\n".join(" " * 8 + txid for txid in txes))
+                print("\n".join(" " * 8 + txid for txid in txids))
             else:
-                for txid in txes:
+                if self.args.inline:
+                    addrs = TxVIOApp.resolve_vinout_addresses(self.rpc, txes)
+                else:
+                    addrs = TxVIOApp.get_vinout_addresses_many(self.rpc, ((txid, block_hash) for txid in txes))
+
+                for txid, (addrs_vin, addrs_vout) in zip(txids, addrs):
                     print(" " * 8 + txid)
-                    addrs_vin, addrs_vout = TxVIOApp.get_vinout_addresses(self.rpc, txid, block_hash)
                     TxVIOApp.print_addresses(addrs_vin, addrs_vout, 12)
 
+            sys.stdout.flush()
+
     @staticmethod
-    def get_block_range_tx(rpc: HydraRPC, height_from: int, height_to: int) -> dict:
-        block_tx = {}
+    def get_block_range_tx(rpc: HydraRPC, height_from: int, height_to: int, *, inline: bool = False,
+                           window: int = None, prefetch: int = None) -> dict:
+        """Map heights to `(block_hash, txes)` for blocks with transactions; see `iter_block_range_tx()`.
+        """
+        return {
+            height: (block_hash, txes)
+            for height, block_hash, txes in TxListApp.iter_block_range_tx(
+                rpc, height_from, height_to, inline=inline, window=window, prefetch=prefetch
+            )
+        }
 
-        for height in range(height_from, height_to + 1):
-            block_hash = TxListApp.get_block_hash(rpc, height)
-            txes = TxListApp.get_block_tx(rpc, block_hash)
+    @staticmethod
+    def iter_block_range_tx(rpc: HydraRPC, height_from: int, height_to: int, *, inline: bool = False,
+                            window: int = None, prefetch: int = None) -> Iterator[tuple]:
+        """Yield `(height, block_hash, txes)` in height order for blocks with transactions.
 
-            if len(txes):
-                block_tx[height] = block_hash, txes
+        `txes` are txids, or decoded transactions with `inline`. Blocks are streamed from
+        `HydraRPC.iter_blocks()`, fetching ahead while earlier blocks are consumed.
+        """
+        for height, block_hash, block in rpc.iter_blocks(
+                height_from, height_to, verbosity=2 if inline else 1, window=window, prefetch=prefetch):
 
-        return block_tx
+            if block.nTx > 0:
+                yield height, block_hash, block.tx
 
     @staticmethod
     def get_block_hash(rpc: HydraRPC, height: int) -> str:
-        return rpc.getblockstats(height).blockhash
+        return rpc.getblockhash(height)
 
     @staticmethod
     def get_block_tx(rpc: HydraRPC, block_hash: str) -> list:
@@ -88,6 +121,31 @@ class TxListAppTest(Test):
         """
         self.assertHydraAppIsRunnable(TxListApp, "--rpc-wallet=watch", "-a", "1337")
 
+    def test_2_lstx_block_range(self):
+        def getblock(block_hash, verbosity=1):
+            txids = [block_hash[-4:] + "-" + str(i) for i in range(int(block_hash, 16) % 3)]
+
+            return {
+                "hash": block_hash, "height": int(block_hash, 16), "nTx": len(txids),
+                "tx": txids if verbosity == 1 else [{"txid": txid} for txid in txids]
+            }
+
+        with StubRPCServer({"getblockhash": lambda height: f"{height:064x}", "getblock": getblock}, delay=.01) as stub:
+            rpc = stub.rpc()
+
+            block_tx = TxListApp.get_block_range_tx(rpc, 1, 5, inline=True, window=2)
+
+            self.assertEqual(list(block_tx), [1, 2, 4, 5])
+            self.assertEqual(block_tx[2], (f"{2:064x}", [{"txid": "0002-0"}, {"txid": "0002-1"}]))
+            self.assertIn(("getblock", (f"{5:064x}", 2)), stub.calls)
+            self.assertEqual(stub.posts, 6)
+
+            block_tx = TxListApp.iter_block_range_tx(rpc, 1, 1000, window=10, prefetch=2)
+
+            self.assertEqual(next(block_tx), (1, f"{1:064x}", ["0001-0"]))
+            block_tx.close()
+            self.assertLessEqual(stub.posts, 6 + 2 * 3)
+
 
 if __name__ == "__main__":
     TxListApp.main()
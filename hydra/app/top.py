@@ -1,14 +1,19 @@
+import os
 from argparse import ArgumentParser
 from datetime import datetime, timedelta
 import pytz
 import time
 import curses
+import math
+from unittest import mock
 
 from attrdict import AttrDict
 
 from hydra.app import HydraApp
 from hydra.rpc.base import BaseRPC
 from hydra.test import Test
+from hydra.test.stub import StubRPCServer
+from hydra.util.ring import RingBuffer, sparkline
 
 
 COLOR_GOOD = 2
@@ -17,10 +22,18 @@ COLOR_ERROR = 4
 COLOR_ETC = 10
 
 
-@HydraApp.register(name="top", desc="Show status periodically", version="0.1")
+@HydraApp.register(name="top", desc="Show status periodically", version="0.3")
 class TopApp(HydraApp):
     scr = None
     ljust = None
+    size = None
+    lines = ()
+    history = None
+    times = None
+
+    HISTORY = 720
+    AVERAGE = 6
+    SPARK = 24
 
     @staticmethod
     def parser(parser: ArgumentParser):
@@ -29,6 +42,12 @@ class TopApp(HydraApp):
         parser.add_argument("-z", "--timezone", type=str, default="America/Los_Angeles", help="time zone.")
         parser.add_argument("-C", "--curses", action="store_true", help="use curses display.")
         parser.add_argument("-x", "--extended", action="store_true", help="show extended info.")
+        parser.add_argument("-P", "--concurrent", action="store_true",
+                            help="send each status call concurrently instead of in one batch.")
+        parser.add_argument("-T", "--timing", action="store_true", help="show rpc call times.")
+        parser.add_argument("-H", "--history", type=int, default=None,
+                            help=f"samples of each value kept for trends, 0 for none"
+                                 f" (default: {TopApp.HISTORY}, or none with -j).")
 
     def setup(self):
         super().setup()
@@ -63,10 +82,22 @@ class TopApp(HydraApp):
 
         result.now = datetime.now(tz=pytz.timezone(self.args.timezone))
         result.utcnow = datetime.utcnow()
-        result.connectioncount = self.rpc.getconnectioncount()
-        result.apr = self.rpc.getestimatedannualroi()
 
-        stakinginfo = self.rpc.getstakinginfo()
+        calls = ["getblockcount", "getconnectioncount", "getestimatedannualroi", "getstakinginfo", "getwalletinfo"]
+
+        if self.args.extended:
+            calls.append("getmininginfo")
+
+        results, timing = (self.__read_concurrent if self.args.concurrent else self.__read_batch)(calls)
+        results = dict(zip(calls, results))
+
+        stakinginfo = results["getstakinginfo"]
+        walletinfo = results["getwalletinfo"]
+        mininginfo = results.get("getmininginfo")
+
+        result.blockcount = results["getblockcount"]
+        result.connectioncount = results["getconnectioncount"]
+        result.apr = results["getestimatedannualroi"]
 
         stakinginfo["search-interval"] = timedelta(seconds=stakinginfo["search-interval"])
         # noinspection PyTypeChecker
@@ -82,8 +113,6 @@ class TopApp(HydraApp):
             
         result.stakinginfo = stakinginfo
 
-        walletinfo = self.rpc.getwalletinfo()
-
         if "unlocked_until" in walletinfo:
             walletinfo.unlocked_until = datetime.fromtimestamp(walletinfo.unlocked_until)
 
@@ -109,8 +138,6 @@ class TopApp(HydraApp):
         result.walletinfo = walletinfo
 
         if self.args.extended:
-            mininginfo = self.rpc.getmininginfo()
-
             if "errors" in mininginfo and not mininginfo.errors:
                 del mininginfo.errors
 
@@ -119,15 +146,118 @@ class TopApp(HydraApp):
 
             result.mininginfo = mininginfo
 
+        if self.args.timing:
+            result.timing = timing
+
+        if self.__history_size() > 0:
+            self.__record(result)
+            result.trend = self.__trend()
+
         return result
 
+    def __history_size(self) -> int:
+        """Samples kept of each value: `-H` if given, else `HISTORY`, or none for JSON output.
+        """
+        if self.args.history is not None:
+            return self.args.history
+
+        return TopApp.HISTORY if not self.args.json else 0
+
+    def __record(self, result: dict):
+        """Append a sample of every numeric field to its history.
+        """
+        size = self.__history_size()
+
+        if self.history is None:
+            self.history, self.times = {}, RingBuffer(size)
+
+        sample = dict(TopApp.numeric(result))
+
+        for name in sample:
+            if name not in self.history:
+                # Fields seen for the first time are padded so samples stay aligned with `times`.
+                self.history[name] = RingBuffer(size, [None] * len(self.times))
+
+        self.times.append(time.time())
+
+        for name, buffer in self.history.items():
+            buffer.append(sample.get(name))
+
+    def __trend(self) -> dict:
+        """Per-field sparkline, moving average and rate of change per minute, nested like the result.
+        """
+        trend = {}
+
+        for name, buffer in self.history.items():
+            average = buffer.mean(TopApp.AVERAGE)
+            rate = buffer.rate(self.times) * 60
+            spark = sparkline(buffer.values(TopApp.SPARK))
+
+            *parents, key = name.split(".")
+            node = trend
+
+            for parent in parents:
+                node = node.setdefault(parent, {})
+
+            if self.args.json:
+                node[key] = {
+                    "avg": average if not math.isnan(average) else None,
+                    "rate": rate if not math.isnan(rate) else None,
+                    "spark": spark,
+                }
+            else:
+                node[key] = f"{spark.ljust(TopApp.SPARK)}  avg {average:<12.6g}  " + \
+                            (f"{rate:+.4g}/min" if not math.isnan(rate) else "-")
+
+        return trend
+
+    @staticmethod
+    def numeric(result: dict, prefix: str = "", *, bools: bool = False):
+        """Yield `(dotted.name, float)` for the numeric fields of a `read()` result; timedeltas in seconds.
+        """
+        for key, value in result.items():
+            if isinstance(value, dict):
+                yield from TopApp.numeric(value, f"{prefix}{key}.", bools=bools)
+
+            elif isinstance(value, timedelta):
+                yield f"{prefix}{key}", value.total_seconds()
+
+            elif isinstance(value, (int, float)) and (bools or not isinstance(value, bool)):
+                yield f"{prefix}{key}", float(value)
+
+    def __read_batch(self, calls: list) -> (list, dict):
+        """All calls in one batch request; timing is for the whole batch.
+        """
+        start = time.perf_counter()
+        results = self.rpc.call_batch((call,) for call in calls)
+
+        return results, AttrDict(batch=TopApp.__ms(start))
+
+    def __read_concurrent(self, calls: list) -> (list, dict):
+        """Each call as its own request, all in flight at once; timing is per call.
+        """
+        futures = [self.rpc.asyncc.executor.submit(self.__timed, call) for call in calls]
+        results = [future.result() for future in futures]
+
+        return [result for result, _ in results], AttrDict((call, ms) for call, (_, ms) in zip(calls, results))
+
+    def __timed(self, call: str) -> tuple:
+        start = time.perf_counter()
+        return self.rpc.call(call), TopApp.__ms(start)
+
+    @staticmethod
+    def __ms(start: float) -> float:
+        """Milliseconds since `start`, for the timing readout.
+        """
+        return round((time.perf_counter() - start) * 1000, 1)
+
     # noinspection PyShadowingBuiltins
     def display(self, print=print):
         result = self.read()
 
         if not self.args.json:
             for key, value in result.items():
-                if not isinstance(value, AttrDict):
+                if not isinstance(value, dict):
                     print(key.ljust(self.ljust) + str(value))
                 else:
                     print()
@@ -137,17 +267,46 @@ class TopApp(HydraApp):
             self.render(result, name="top", print_fn=print, ljust=self.ljust)
 
     def display_curses(self):
-        self.scr.clear()
-        self.display(print=self.__print_curses)
+        lines = []
+        self.display(print=lambda text="": lines.extend(str(text).split("\n")))
+
+        height, width = self.scr.getmaxyx()
+
+        if (height, width) != self.size:
+            # Resized: repaint everything once.
+            self.scr.erase()
+            self.size, self.lines = (height, width), []
+
+        for y, text in TopApp.frame_diff(self.lines, lines, width, height):
+            if text is None:
+                self.scr.move(y, 0)
+                self.scr.clrtobot()
+                break
+
+            self.scr.addstr(y, 0, text)
+            self.scr.clrtoeol()
+
+        self.lines = [line[:width - 1] for line in lines[:height]]
         self.scr.refresh()
 
-    def __print_curses(self, text=""):
-        text = str(text)
+    @staticmethod
+    def frame_diff(previous: list, lines: list, width: int, height: int) -> list:
+        """Rows to redraw as `(y, text)`, with `(y, None)` to clear from row `y` down.
+
+        Lines are clipped to the screen; only rows that differ from the `previous` (clipped) frame
+        are returned, so unchanged output costs nothing to redraw.
+        """
+        lines = [line[:width - 1] for line in lines[:height]]
 
-        if not text.endswith("\n"):
-            text += "\n"
+        changes = [
+            (y, line) for y, line in enumerate(lines)
+            if y >= len(previous) or previous[y] != line
+        ]
 
-        return self.scr.addstr(text)
+        if len(previous) > len(lines):
+            changes.append((len(lines), None))
+
+        return changes
 
     @staticmethod
     def __try_delete(dic: dict, key: str):
@@ -197,6 +356,70 @@ class TopAppTest(Test):
     def test_0_top_runnable(self):
         self.assertHydraAppIsRunnable(TopApp, "-h")
 
+    def test_1_top_read(self):
+        blocks = iter(range(100, 200))
+
+        methods = {
+            "getblockcount": lambda: next(blocks),
+            "getconnectioncount": lambda: 8,
+            "getestimatedannualroi": lambda: 12.5,
+            "getstakinginfo": lambda: {
+                "search-interval": 16, "expectedtime": 3600, "weight": 10**8, "netstakeweight": 2 * 10**8, "errors": "",
+            },
+            "getwalletinfo": lambda: {"walletname": "", "balance": 1.5},
+            "getmininginfo": lambda: {"blocks": 100, "errors": ""},
+        }
+
+        with StubRPCServer(methods, delay=.01) as stub, mock.patch.dict(os.environ, {"HYPY_NO_RPC_ARGS": "1"}):
+            app = TopApp(timing=True, json=False)
+            app.rpc = stub.rpc()
+
+            result = app.read()
+
+            self.assertEqual((result.connectioncount, result.apr), (8, 12.5))
+            self.assertEqual(result.stakinginfo.expectedtime, timedelta(hours=1))
+            self.assertNotIn("errors", result.stakinginfo)
+            self.assertEqual(list(result.timing), ["batch"])
+            self.assertEqual(stub.posts, 1)
+            self.assertEqual(result.blockcount, 100)
+            self.assertTrue(result.trend.blockcount.endswith("-"))
+
+            time.sleep(.05)
+            result = app.read()
+
+            self.assertEqual(result.blockcount, 101)
+            self.assertGreater(float(result.trend.blockcount.split()[-1].split("/")[0]), 0)
+            self.assertEqual(result.trend.connectioncount.split()[:3], ["▁▁", "avg", "8"])
+            self.assertIn("expectedtime", result.trend.stakinginfo)
+
+            app = TopApp(json=True)
+            app.rpc = stub.rpc()
+
+            self.assertNotIn("trend", app.read())
+
+            app = TopApp(timing=True, concurrent=True, extended=True, json=True, history=4)
+            app.rpc = stub.rpc()
+
+            result = app.read()
+
+            self.assertEqual(result.mininginfo, {"blocks": 100})
+            self.assertEqual(list(result.timing), list(methods))
+            self.assertGreaterEqual(min(result.timing.values()), 10)
+            self.assertEqual(result.trend.mininginfo.blocks, {"avg": 100, "rate": None, "spark": "▁"})
+            self.assertEqual(stub.posts, 3 + 6)
+            self.assertGreater(stub.active_max, 1)
+
+            for _ in range(5):
+                result = app.read()
+
+            self.assertEqual(len(result.trend.blockcount["spark"]), 4)
+            self.assertEqual(result.trend.blockcount["avg"], 106.5)
+
+    def test_2_top_frame_diff(self):
+        self.assertEqual(TopApp.frame_diff([], ["a", "b"], 80, 24), [(0, "a"), (1, "b")])
+        self.assertEqual(TopApp.frame_diff(["a", "b", "c"], ["a", "B"], 80, 24), [(1, "B"), (2, None)])
+        self.assertEqual(TopApp.frame_diff(["abc"], ["abcdef", "x", "y"], 4, 2), [(1, "x")])
+
 
 if __name__ == "__main__":
     TopApp.main()
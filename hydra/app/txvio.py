@@ -4,10 +4,13 @@ Display the input and output addresses for a given transaction.
 Requires `block_hash` when not using -txindex hydrad flag.
 """
 import argparse
+from typing import Iterable
 
 from hydra.app import HydraApp
 from hydra.rpc import HydraRPC
 from hydra.test import Test
+from hydra.test.stub import StubRPCServer
+from hydra.util import rawtx
 from hydra import log
 
 
@@ -20,10 +23,12 @@ class TxVIOApp(HydraApp):
         parser.add_argument("txid", metavar="TXID", type=str, help="TX ID string")
         parser.add_argument("block_hash", metavar="BLOCK_HASH", type=str, nargs="?", default=None,
                             help="Block hash if known (required without -txindex)")
+        parser.add_argument("-N", "--node-decode", action="store_true",
+                            help="decode transactions on the node instead of locally")
 
     def run(self):
         addresses_vin, addresses_vout = TxVIOApp.get_vinout_addresses(
-            self.rpc, self.args.txid, self.args.block_hash
+            self.rpc, self.args.txid, self.args.block_hash, local=not self.args.node_decode
         )
 
         TxVIOApp.print_addresses(addresses_vin, addresses_vout)
@@ -55,35 +60,83 @@ class TxVIOApp(HydraApp):
             print(line)
 
     @staticmethod
-    def get_vinout_addresses(rpc, txid: str, block_hash: str = None) -> (set, set):
-        rawtx = rpc.getrawtransaction(txid, False, block_hash)
+    def get_vinout_addresses(rpc, txid: str, block_hash: str = None, *, local: bool = True) -> (set, set):
+        return TxVIOApp.get_vinout_addresses_many(rpc, ((txid, block_hash),), local=local)[0]
 
-        addresses_vin = set()
-        addresses_vout = set()
+    @staticmethod
+    def get_vinout_addresses_many(rpc, txes: Iterable[tuple], *, local: bool = True, processes: int = None) -> list:
+        """Resolve input & output addresses for many `(txid, block_hash)` pairs in two batched round-trips.
+
+        Transactions are fetched with `getrawtransaction`, then all distinct parent transactions
+        of their inputs are fetched in one batch, skipping parents that are among `txes` themselves.
+        With `local`, raw hex is fetched and decoded with `hydra.util.rawtx` (on `processes` worker
+        processes if more than one); otherwise the node decodes them (verbose `getrawtransaction`).
+        Returns a `(addresses_vin, addresses_vout)` tuple per transaction.
+        """
+        decoded = TxVIOApp.get_transactions(rpc, list(txes), local=local, processes=processes)
 
-        if len(rawtx):
-            decoded = rpc.decoderawtransaction(rawtx, True)
+        return TxVIOApp.resolve_vinout_addresses(rpc, decoded, local=local, processes=processes)
 
-            for vout in filter(lambda vout_: hasattr(vout_.scriptPubKey, "addresses"), decoded.vout):
-                addresses_vout = addresses_vout.union(vout.scriptPubKey.addresses)
+    @staticmethod
+    def resolve_vinout_addresses(rpc, decoded: list, *, local: bool = True, processes: int = None) -> list:
+        """Resolve input & output addresses for already decoded transactions, e.g. from `getblock` verbosity 2.
+
+        Parent transactions of their inputs are fetched in one batch; see `get_vinout_addresses_many()`.
+        """
+        decoded_by_txid = {tx.txid: tx for tx in decoded}
 
-            for vin in filter(lambda vin_: hasattr(vin_, "txid"), decoded.vin):
+        parent_txids = list(dict.fromkeys(
+            vin.txid
+            for tx in decoded
+            for vin in tx.vin
+            if "txid" in vin and vin.txid not in decoded_by_txid
+        ))
 
-                vin_rawtx = rpc.getrawtransaction(vin.txid, False)
+        decoded_by_txid.update(zip(
+            parent_txids,
+            TxVIOApp.get_transactions(rpc, ((txid, ...) for txid in parent_txids), local=local, processes=processes)
+        ))
 
-                vin_rawtx_decoded = rpc.decoderawtransaction(vin_rawtx, True)
+        results = []
 
-                vout = vin_rawtx_decoded.vout[vin.vout]
+        for tx in decoded:
+            addresses_vin = set()
+            addresses_vout = set()
 
-                if hasattr(vout.scriptPubKey, "addresses"):
-                    addresses_vin = addresses_vin.union(vout.scriptPubKey.addresses)
+            for vout in tx.vout:
+                addresses_vout.update(TxVIOApp.vout_addresses(vout))
 
-                # print(f"{type(vin).__name__}:",
-                #       str(vout.value).ljust(16, ' '),
-                #       ", ".join(vout.scriptPubKey.addresses)
-                # )
+            for vin in filter(lambda vin_: "txid" in vin_, tx.vin):
+                addresses_vin.update(TxVIOApp.vout_addresses(decoded_by_txid[vin.txid].vout[vin.vout]))
 
-            return addresses_vin, addresses_vout
+            results.append((addresses_vin, addresses_vout))
+
+        return results
+
+    @staticmethod
+    def get_transactions(rpc, txes: Iterable[tuple], *, local: bool = True, processes: int = None) -> list:
+        """Fetch and decode transactions for `(txid, block_hash)` pairs in one batch.
+        """
+        if not local:
+            return rpc.call_batch(("getrawtransaction", txid, True, block_hash) for txid, block_hash in txes)
+
+        return rawtx.decode_many(
+            rpc.call_batch(("getrawtransaction", txid, False, block_hash) for txid, block_hash in txes),
+            rawtx.MAINNET if rpc.mainnet else rawtx.TESTNET,
+            processes=processes
+        )
+
+    @staticmethod
+    def vout_addresses(vout) -> list:
+        script_pub_key = vout.scriptPubKey
+
+        if "addresses" in script_pub_key:
+            return script_pub_key.addresses
+
+        if "address" in script_pub_key:
+            return [script_pub_key.address]
+
+        return []
 
 
 @Test.register()
@@ -108,6 +161,55 @@ class TxVIOAppTest(Test):
             "51182d9b97f6a9aabda5e5160719a6173e60b6a83e7650bfe54bc1361cac64e7"
         )
 
+    def test_2_txvio_resolve_batched(self):
+        txes = {
+            "p1": {"txid": "p1", "vin": [{"coinbase": "00"}], "vout": [
+                {"n": 0, "scriptPubKey": {"addresses": ["Ha"]}},
+                {"n": 1, "scriptPubKey": {"address": "Hb"}},
+            ]},
+            "t1": {"txid": "t1", "vin": [{"txid": "p1", "vout": 0}, {"txid": "p1", "vout": 1}], "vout": [
+                {"n": 0, "scriptPubKey": {"addresses": ["Hc"]}},
+                {"n": 1, "scriptPubKey": {"asm": "OP_RETURN"}},
+            ]},
+            "t2": {"txid": "t2", "vin": [{"txid": "t1", "vout": 0}], "vout": [
+                {"n": 0, "scriptPubKey": {"addresses": ["Hd"]}},
+            ]},
+        }
+
+        with StubRPCServer({"getrawtransaction": lambda txid, verbose, *_: txes[txid]}) as stub:
+            rpc = stub.rpc()
+
+            self.assertEqual(TxVIOApp.get_vinout_addresses(rpc, "t1", local=False), ({"Ha", "Hb"}, {"Hc"}))
+            self.assertEqual(stub.posts, 2)
+
+            self.assertEqual(
+                TxVIOApp.get_vinout_addresses_many(rpc, (("t1", "b"), ("t2", "b")), local=False),
+                [({"Ha", "Hb"}, {"Hc"}), ({"Hc"}, {"Hd"})]
+            )
+            self.assertEqual(stub.posts, 4)
+            self.assertEqual(stub.calls[-1], ("getrawtransaction", ("p1", True)))
+
+    def test_3_txvio_resolve_local(self):
+        from hydra.test.util import GENESIS_TX
+
+        parent = rawtx.decode(GENESIS_TX)
+        p2pkh = b"\x76\xa9\x14" + bytes(20) + b"\x88\xac"
+        child = (
+            b"\x01\x00\x00\x00" b"\x01" + bytes.fromhex(parent.txid)[::-1] + bytes(4) + b"\x00\xff\xff\xff\xff"
+            b"\x01" + (10**8).to_bytes(8, "little") + bytes((len(p2pkh),)) + p2pkh + bytes(4)
+        ).hex()
+        raws = {parent.txid: GENESIS_TX, rawtx.decode(child).txid: child}
+
+        with StubRPCServer({"getrawtransaction": lambda txid, verbose, *_: raws[txid]}) as stub:
+            rpc = stub.rpc()
+
+            self.assertEqual(
+                TxVIOApp.get_vinout_addresses(rpc, rawtx.decode(child).txid, "b"),
+                ({"HFY7mMZuUcohP3bgLAnQrLxuWxDqcXEydW"}, {rawtx.base58check(b"\x28" + bytes(20))})
+            )
+            self.assertEqual(stub.posts, 2)
+            self.assertEqual(stub.calls[-1], ("getrawtransaction", (parent.txid, False)))
+
 
 if __name__ == "__main__":
     TxVIOApp.main()
@@ -8,6 +8,7 @@ import argcomplete
 
 from hydra.app import HydraApp
 from hydra import log
+from hydra.util.profile import Profiler
 
 
 class Hydra:
@@ -67,7 +68,8 @@ class Hydra:
         try:
             hy = Hydra.__main = Hydra(args)
 
-            hy.run()
+            with Profiler(args.profile, memory=args.profile_memory):
+                hy.run()
 
         except KeyboardInterrupt:
             print(file=sys.stderr)
@@ -127,6 +129,14 @@ class Hydra:
 
         log.log_parser(parser)
 
+        parser.add_argument("--profile", type=str, metavar="PATH", default=os.environ.get("HYPY_PROFILE") or None,
+                            help="profile the app and write stats to PATH: collapsed stacks from a sampling profiler"
+                                 " if it ends in .folded, else cProfile pstats (env: HYPY_PROFILE).")
+
+        parser.add_argument("--profile-memory", action="store_true",
+                            default=bool(os.environ.get("HYPY_PROFILE_MEMORY")),
+                            help="trace allocations and print peak memory on exit (env: HYPY_PROFILE_MEMORY).")
+
         HydraApp.parser(parser)
 
     @staticmethod
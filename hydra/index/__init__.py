@@ -0,0 +1,9 @@
+"""Local chain indexes.
+
+Indexes are synced from a node once and then kept up to date incrementally, so queries
+that would otherwise need wallet imports and rescans are answered locally.
+"""
+from .address import AddressIndex
+from .signature import SignatureIndex
+
+__all__ = "AddressIndex", "SignatureIndex"
@@ -0,0 +1,347 @@
+"""Address history index.
+
+Maps addresses to the transactions that pay to them (receive) or spend from them (send),
+with height, block time and value, in a SQLite database synced from `getblock` verbosity 2.
+Every addressed output and every txid is kept so that inputs can be resolved to addresses
+without further calls.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from typing import Iterable
+
+from hydra import log
+from hydra.rpc import HydraRPC
+from hydra.util import jsonc, rawtx
+
+
+__all__ = "AddressIndex",
+
+
+class AddressIndex:
+    """Address → transaction history index.
+
+    `sync()` fetches blocks after the indexed tip, first rewinding any blocks that were
+    reorganized away; `transactions()` then answers like the wallet's `listtransactions`.
+    The default path comes from HYPY_INDEX.
+
+    Inputs spending transactions that were never indexed (when indexing did not start at genesis)
+    are resolved with `getrawtransaction`, which needs a node running with `-txindex`.
+    """
+    path: str
+
+    __db: sqlite3.Connection
+    __lock: threading.Lock
+
+    RECEIVE = 1
+    SEND = -1
+
+    COIN = 10**8
+
+    def __init__(self, path: str = None):
+        path = path or os.environ.get("HYPY_INDEX")
+
+        if not path:
+            raise ValueError("no address index path: pass one or set HYPY_INDEX")
+
+        self.path = os.path.expanduser(path)
+        self.__lock = threading.Lock()
+
+        self.__db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.executescript("""
+            CREATE TABLE IF NOT EXISTS block (height INTEGER PRIMARY KEY, hash TEXT NOT NULL, time INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS output (
+                txid TEXT NOT NULL, n INTEGER NOT NULL, address TEXT NOT NULL, value INTEGER NOT NULL,
+                height INTEGER NOT NULL, PRIMARY KEY (txid, n, address)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS output_height ON output (height);
+            CREATE TABLE IF NOT EXISTS tx (txid TEXT PRIMARY KEY, height INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS tx_height ON tx (height);
+            CREATE TABLE IF NOT EXISTS history (
+                address TEXT NOT NULL, txid TEXT NOT NULL, height INTEGER NOT NULL, value INTEGER NOT NULL,
+                direction INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS history_address ON history (address, height);
+            CREATE INDEX IF NOT EXISTS history_txid ON history (txid);
+            CREATE INDEX IF NOT EXISTS history_height ON history (height);
+        """)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(path=\"{self.path}\", height={self.height})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    @property
+    def height(self) -> int:
+        """Height of the last indexed block, or -1 if empty.
+        """
+        with self.__lock:
+            row = self.__db.execute("SELECT MAX(height) FROM block").fetchone()
+
+        return row[0] if row[0] is not None else -1
+
+    # == Sync ==
+
+    def sync(self, rpc: HydraRPC, height_to: int = None, *, window: int = None, prefetch: int = None) -> int:
+        """Index blocks up to `height_to` (default: the node's tip); returns the indexed height.
+
+        Blocks are committed one fetch window at a time, so an interrupted sync keeps its progress.
+        """
+        height_to = height_to if height_to is not None else rpc.getblockcount()
+        height_from = self.__rewind(rpc) + 1
+
+        if height_from > height_to:
+            return height_from - 1
+
+        log.info(f"index: syncing blocks {height_from} to {height_to}")
+
+        outputs = {}
+        rows = []
+
+        for height, block_hash, block in rpc.iter_blocks(
+                height_from, height_to, verbosity=2, window=window, prefetch=prefetch):
+
+            rows.append(self.__index_block(rpc, height, block, outputs))
+
+            if len(rows) >= (window or HydraRPC.BLOCK_WINDOW) or height == height_to:
+                self.__commit(rows)
+                log.debug(f"index: height {height}")
+                outputs.clear()
+                rows = []
+
+        return height_to
+
+    def __rewind(self, rpc: HydraRPC) -> int:
+        """Drop blocks no longer on the node's best chain; returns the height that remains indexed.
+        """
+        height = self.height
+
+        while height >= 0:
+            heights = list(range(height, max(height - HydraRPC.BLOCK_WINDOW, -1), -1))
+
+            with self.__lock:
+                stored = dict(self.__db.execute(
+                    f"SELECT height, hash FROM block WHERE height IN ({','.join('?' * len(heights))})", heights
+                ).fetchall())
+
+            # Heights past the node's tip fail, and count as reorganized away.
+            hashes = rpc.call_batch((("getblockhash", h) for h in heights), raise_errors=False)
+
+            for h, block_hash in zip(heights, hashes):
+                if stored.get(h) == block_hash:
+                    if h != self.height:
+                        log.warning(f"index: reorg, rewinding to height {h}")
+                        self.rewind(h)
+
+                    return h
+
+            height = heights[-1] - 1
+
+        if self.height >= 0:
+            self.rewind(-1)
+
+        return -1
+
+    def rewind(self, height: int):
+        """Remove everything indexed above `height`.
+        """
+        with self.__lock:
+            self.__db.execute("BEGIN")
+
+            try:
+                for table in ("history", "output", "tx", "block"):
+                    self.__db.execute(f"DELETE FROM {table} WHERE height > ?", (height,))
+
+                self.__db.execute("COMMIT")
+
+            except BaseException:
+                self.__db.execute("ROLLBACK")
+                raise
+
+    def __index_block(self, rpc: HydraRPC, height: int, block, outputs: dict) -> tuple:
+        block_outputs = []
+        block_history = []
+        block_txes = []
+        txes = block.tx
+
+        prevouts = self.__prevouts(rpc, txes, outputs)
+
+        for tx in txes:
+            received = {}
+            sent = {}
+
+            for vin in tx.vin:
+                if "txid" in vin:
+                    if vin.txid in outputs:
+                        spent = [(address, value) for n, address, value in outputs[vin.txid] if n == vin.vout]
+                    else:
+                        spent = prevouts.get((vin.txid, vin.vout), ())
+
+                    for address, value in spent:
+                        sent[address] = sent.get(address, 0) + value
+
+            tx_outputs = AddressIndex.__outputs(tx)
+            outputs[tx.txid] = tx_outputs
+            block_txes.append((tx.txid, height))
+
+            for n, address, value in tx_outputs:
+                received[address] = received.get(address, 0) + value
+                block_outputs.append((tx.txid, n, address, value, height))
+
+            block_history.extend(
+                (address, tx.txid, height, value, AddressIndex.SEND) for address, value in sent.items()
+            )
+            block_history.extend(
+                (address, tx.txid, height, value, AddressIndex.RECEIVE) for address, value in received.items()
+            )
+
+        return (height, block.hash, block.time), block_txes, block_outputs, block_history
+
+    @staticmethod
+    def __outputs(tx) -> list:
+        return [
+            (vout.n, address, round(vout.value * AddressIndex.COIN))
+            for vout in tx.vout
+            for address in AddressIndex.__vout_addresses(vout)
+        ]
+
+    @staticmethod
+    def __vout_addresses(vout) -> list:
+        script_pub_key = vout.scriptPubKey
+
+        if "addresses" in script_pub_key:
+            return script_pub_key.addresses
+
+        if "address" in script_pub_key:
+            return [script_pub_key.address]
+
+        return []
+
+    def __prevouts(self, rpc: HydraRPC, txes: list, outputs: dict) -> dict:
+        """Map `(txid, n)` to `[(address, value)]` for inputs of `txes` spending earlier, committed blocks.
+
+        Outputs come from the index; an output of an indexed transaction that is not in it has no address
+        (e.g. a contract output) and maps to `[]`. Only transactions never indexed (when indexing did not
+        start at genesis) are fetched from the node, which needs `-txindex` as their block is unknown.
+        Inputs spending outputs of the same block or the uncommitted window are resolved from `outputs`.
+        """
+        block_txids = {tx.txid for tx in txes}
+        spent = {
+            (vin.txid, vin.vout)
+            for tx in txes
+            for vin in tx.vin
+            if "txid" in vin and vin.txid not in outputs and vin.txid not in block_txids
+        }
+        txids = list({txid for txid, _ in spent})
+        prevouts = {}
+
+        known = set()
+
+        with self.__lock:
+            for offset in range(0, len(txids), 500):
+                chunk = txids[offset:offset + 500]
+
+                known.update(txid for txid, in self.__db.execute(
+                    f"SELECT txid FROM tx WHERE txid IN ({','.join('?' * len(chunk))})", chunk
+                ))
+
+                for txid, n, address, value in self.__db.execute(
+                        f"SELECT txid, n, address, value FROM output WHERE txid IN ({','.join('?' * len(chunk))})",
+                        chunk):
+                    if (txid, n) in spent:
+                        prevouts.setdefault((txid, n), []).append((address, value))
+
+        missing = list(dict.fromkeys(txid for txid, n in spent if (txid, n) not in prevouts and txid not in known))
+
+        if len(missing):
+            for tx in rawtx.decode_many(
+                    rpc.call_batch(("getrawtransaction", txid, False) for txid in missing),
+                    rawtx.MAINNET if rpc.mainnet else rawtx.TESTNET):
+                for n, address, value in AddressIndex.__outputs(tx):
+                    if (tx.txid, n) in spent:
+                        prevouts.setdefault((tx.txid, n), []).append((address, value))
+
+        return prevouts
+
+    def __commit(self, rows: list):
+        with self.__lock:
+            self.__db.execute("BEGIN")
+
+            try:
+                for block_row, block_txes, block_outputs, block_history in rows:
+                    self.__db.execute("INSERT OR REPLACE INTO block (height, hash, time) VALUES (?, ?, ?)", block_row)
+                    self.__db.executemany("INSERT OR IGNORE INTO tx (txid, height) VALUES (?, ?)", block_txes)
+                    self.__db.executemany(
+                        "INSERT OR IGNORE INTO output (txid, n, address, value, height) VALUES (?, ?, ?, ?, ?)",
+                        block_outputs
+                    )
+                    self.__db.executemany(
+                        "INSERT INTO history (address, txid, height, value, direction) VALUES (?, ?, ?, ?, ?)",
+                        block_history
+                    )
+
+                self.__db.execute("COMMIT")
+
+            except BaseException:
+                self.__db.execute("ROLLBACK")
+                raise
+
+    # == Queries ==
+
+    def transactions(self, address: str, count: int = None, skip: int = 0) -> list:
+        """List history entries for `address`, oldest first, like the wallet's `listtransactions`.
+
+        Entries have `address`, `category` ("receive" or "send"), `amount` (negative when sending),
+        `txid`, `blockhash`, `blockheight` and `blocktime`. `count` and `skip` select the most
+        recent entries, as with `listtransactions`.
+        """
+        with self.__lock:
+            rows = self.__db.execute(
+                "SELECT history.txid, history.height, history.value, history.direction, block.hash, block.time "
+                "FROM history JOIN block ON block.height = history.height WHERE history.address = ? "
+                "ORDER BY history.height DESC, history.rowid DESC LIMIT ? OFFSET ?",
+                (address, count if count is not None else -1, skip)
+            ).fetchall()
+
+        return [
+            jsonc.view({
+                "address": address,
+                "category": "receive" if direction == AddressIndex.RECEIVE else "send",
+                "amount": value * direction / AddressIndex.COIN,
+                "txid": txid,
+                "blockhash": block_hash,
+                "blockheight": height,
+                "blocktime": time,
+            })
+            for txid, height, value, direction, block_hash, time in reversed(rows)
+        ]
+
+    def tx_addresses(self, txids: Iterable[str]) -> dict:
+        """Map each indexed txid to its `(addresses_vin, addresses_vout)`, as `TxVIOApp` resolves them.
+        """
+        txids = list(txids)
+        results = {}
+
+        with self.__lock:
+            for offset in range(0, len(txids), 500):
+                chunk = txids[offset:offset + 500]
+
+                for txid, address, direction in self.__db.execute(
+                        f"SELECT txid, address, direction FROM history WHERE txid IN ({','.join('?' * len(chunk))})",
+                        chunk):
+                    vin, vout = results.setdefault(txid, (set(), set()))
+                    (vout if direction == AddressIndex.RECEIVE else vin).add(address)
+
+        return results
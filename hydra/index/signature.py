@@ -0,0 +1,220 @@
+"""Function selector & event topic reverse lookup.
+
+A read-only file mapping 4-byte selectors and 32-byte event topics back to the signatures
+that hash to them, built once from signature lists. The file holds two sorted fixed-width
+record tables and a string blob, and is memory-mapped, so lookups binary-search the tables
+in place without loading or hashing anything.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable
+
+from hydra.util import abi, sha
+
+
+__all__ = "SignatureIndex",
+
+
+def _hash_signatures(signatures: list) -> list:
+    """Canonicalize and hash `signatures`, returning `(canonical, hash)` for each valid one.
+    """
+    results = []
+
+    for signature in signatures:
+        try:
+            # Unmemoized: signature lists are far larger than anything worth caching.
+            canonical = abi.parse_signature.__wrapped__(signature).canonical
+        except ValueError:
+            continue
+
+        results.append((canonical, sha.sha3(canonical)))
+
+    return results
+
+
+class SignatureIndex:
+    """Selector/topic → signature lookup over a file built with `SignatureIndex.build()`.
+
+    Lookups take selectors and topics as hex (as the node returns them) or bytes, and return every
+    canonical signature that hashes to them; selector collisions give more than one.
+
+        SignatureIndex.build("~/.hypy/signatures.idx", open("signatures.txt"))
+
+        with SignatureIndex("~/.hypy/signatures.idx") as signatures:
+            signatures.selector("a9059cbb")  # ['transfer(address,uint256)']
+
+    The default path comes from HYPY_SIGNATURES.
+    """
+    path: str
+
+    __file = None
+    __map: mmap.mmap = None
+    __count: int
+
+    MAGIC = b"HYSIGIX1"
+    HEADER = struct.Struct("<8sI")
+    SELECTOR = struct.Struct("<4sI")
+    TOPIC = struct.Struct("<32sI")
+
+    CHUNK = 4096
+
+    def __init__(self, path: str = None):
+        self.path = SignatureIndex.__path(path)
+        self.__file = open(self.path, "rb")
+
+        if os.fstat(self.__file.fileno()).st_size < SignatureIndex.HEADER.size:
+            self.close()
+            raise ValueError(f"{self.path}: not a signature index")
+
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.__count = SignatureIndex.HEADER.unpack_from(self.__map, 0)
+
+        if magic != SignatureIndex.MAGIC:
+            self.close()
+            raise ValueError(f"{self.path}: not a signature index")
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(path=\"{self.path}\", count={self.__count})"
+
+    def __len__(self):
+        return self.__count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.__file is not None:
+            if self.__map is not None:
+                self.__map.close()
+
+            self.__file.close()
+            self.__file = None
+
+    @staticmethod
+    def __path(path: str = None) -> str:
+        path = path or os.environ.get("HYPY_SIGNATURES")
+
+        if not path:
+            raise ValueError("no signature index path: pass one or set HYPY_SIGNATURES")
+
+        return os.path.expanduser(path)
+
+    # == Lookup ==
+
+    def selector(self, selector: [str, bytes]) -> list:
+        """Signatures with the 4-byte `selector` (extra bytes, e.g. full call data, are ignored).
+        """
+        key = bytes.fromhex(selector[:8]) if isinstance(selector, str) else bytes(selector[:4])
+        return self.__lookup(SignatureIndex.HEADER.size, SignatureIndex.SELECTOR, key)
+
+    def topic(self, topic: [str, bytes]) -> list:
+        """Signatures whose full 32-byte hash is `topic`, i.e. the event signatures emitting it.
+
+        Every indexed signature is in the topic table, so a function signature matches its own hash too.
+        """
+        key = bytes.fromhex(topic) if isinstance(topic, str) else bytes(topic)
+        offset = SignatureIndex.HEADER.size + self.__count * SignatureIndex.SELECTOR.size
+        return self.__lookup(offset, SignatureIndex.TOPIC, key)
+
+    def label_logs(self, receipts: Iterable) -> list:
+        """Add an `event` list of candidate signatures to each log of `searchlogs`-style receipts.
+        """
+        receipts = list(receipts)
+
+        for receipt in receipts:
+            for entry in receipt.get("log", ()):
+                topics = entry.get("topics", ())
+                entry["event"] = self.topic(topics[0]) if len(topics) else []
+
+        return receipts
+
+    def label_tx(self, tx) -> dict:
+        """Add a `function` list of candidate signatures to the contract outputs of a decoded transaction.
+        """
+        for vout in tx.get("vout", ()):
+            contract = vout.get("scriptPubKey", {}).get("contract")
+
+            if contract is not None and len(contract.get("data", "")) >= 8:
+                contract["function"] = self.selector(contract["data"])
+
+        return tx
+
+    def __lookup(self, offset: int, record: struct.Struct, key: bytes) -> list:
+        size = len(key)
+        lo, hi = 0, self.__count
+
+        if size != record.size - 4:
+            raise ValueError(f"expected {record.size - 4} bytes, got {size}")
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = offset + mid * record.size
+
+            if self.__map[position:position + size] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        results = []
+
+        while lo < self.__count:
+            found, string = record.unpack_from(self.__map, offset + lo * record.size)
+
+            if found != key:
+                break
+
+            results.append(self.__string(string))
+            lo += 1
+
+        return results
+
+    def __string(self, offset: int) -> str:
+        start = SignatureIndex.HEADER.size + self.__count * (SignatureIndex.SELECTOR.size + SignatureIndex.TOPIC.size)
+        start += offset
+        return self.__map[start:self.__map.find(b"\0", start)].decode()
+
+    # == Build ==
+
+    @staticmethod
+    def build(path: str, signatures: Iterable[str], *, processes: int = None) -> int:
+        """Write an index of `signatures` (one per item, blank lines and `#` comments skipped) to `path`.
+
+        Signatures are canonicalized and deduplicated; invalid ones are skipped. Hashing runs on
+        a pool of `processes` worker processes if more than one. Returns the number indexed.
+        """
+        path = SignatureIndex.__path(path)
+        signatures = [signature for signature in (line.strip() for line in signatures)
+                      if signature and not signature.startswith("#")]
+        chunks = [signatures[i:i + SignatureIndex.CHUNK] for i in range(0, len(signatures), SignatureIndex.CHUNK)]
+
+        if processes is None or processes <= 1:
+            unique = dict(result for chunk in chunks for result in _hash_signatures(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                unique = dict(result for results in executor.map(_hash_signatures, chunks) for result in results)
+
+        blob, offsets = bytearray(), {}
+
+        for canonical in unique:
+            offsets[canonical] = len(blob)
+            blob += canonical.encode() + b"\0"
+
+        records = sorted((digest, offsets[canonical]) for canonical, digest in unique.items())
+        temp = path + ".tmp"
+
+        with open(temp, "wb") as file:
+            file.write(SignatureIndex.HEADER.pack(SignatureIndex.MAGIC, len(records)))
+            file.writelines(SignatureIndex.SELECTOR.pack(digest[:4], offset) for digest, offset in records)
+            file.writelines(SignatureIndex.TOPIC.pack(digest, offset) for digest, offset in records)
+            file.write(blob)
+
+        os.replace(temp, path)
+        return len(records)
@@ -1,3 +1,8 @@
 from .base import BaseRPC
+from .stats import RPCStats
 from .hydra import HydraRPC
 from .explorer import ExplorerRPC
+from .aio import AsyncBaseRPC, AsyncHydraRPC
+from .follow import ChainFollower
+from .logs import LogSubscription
+from .contract import ContractReader
@@ -0,0 +1,438 @@
+"""Native asyncio RPC transport.
+
+HTTP/1.1 over asyncio streams with pooled keep-alive connections, so many requests
+can be in flight from a single thread without going through an executor.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import io
+import itertools
+import ssl
+import time
+from collections import deque
+from typing import Optional, Callable, Any, Iterable, AsyncIterator
+from urllib.parse import urlsplit, unquote
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from hydra import log
+from hydra.util import jsonc
+
+from .base import BaseRPC
+from .cache import RPCCache
+from .hydra import HydraRPC
+
+
+__all__ = "AsyncHTTPPool", "AsyncBaseRPC", "AsyncHydraRPC"
+
+
+class AsyncHTTPPool:
+    """Keep-alive HTTP/1.1 connection pool for a single host.
+
+    At most `size` connections are open at once; further requests wait for a free connection.
+    The pool binds to the running event loop and drops connections left over from a previous loop.
+    """
+    host: str
+    port: int
+    size: int
+    timeout: Optional[float]
+
+    __ssl: Optional[ssl.SSLContext]
+    __idle: deque
+    __slots: Optional[asyncio.Semaphore] = None
+    __loop: Optional[asyncio.AbstractEventLoop] = None
+
+    DEFAULT_SIZE = 16
+
+    def __init__(self, host: str, port: int, *, use_ssl: bool = False, size: int = None, timeout: float = None):
+        self.host = host
+        self.port = port
+        self.size = size or AsyncHTTPPool.DEFAULT_SIZE
+        self.timeout = timeout
+        self.__ssl = ssl.create_default_context() if use_ssl else None
+        self.__idle = deque()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(host=\"{self.host}\", port={self.port}, size={self.size})"
+
+    async def request(self, method: str, target: str, headers: dict, body: bytes = b"", *,
+                      timeout: float = None) -> Response:
+        """Send one request and return a fully read `requests.Response`, within `timeout` (default: the pool's).
+        """
+        self.__bind_loop()
+        timeout = timeout if timeout is not None else self.timeout
+
+        async with self.__slots:
+            if timeout is not None:
+                return await asyncio.wait_for(self.__request(method, target, headers, body), timeout)
+
+            return await self.__request(method, target, headers, body)
+
+    async def close(self):
+        while len(self.__idle):
+            _, writer = self.__idle.popleft()
+            writer.close()
+
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def __request(self, method: str, target: str, headers: dict, body: bytes) -> Response:
+        reused, (reader, writer) = await self.__acquire()
+
+        try:
+            rsp, keep_alive = await self.__exchange(reader, writer, method, target, headers, body)
+
+        except (ConnectionError, asyncio.IncompleteReadError) as exc:
+            writer.close()
+
+            # A pooled connection may have been closed by the server while idle; only then retry once.
+            if not reused or (isinstance(exc, asyncio.IncompleteReadError) and len(exc.partial)):
+                raise
+
+            log.debug(f"async rpc: stale connection to {self.host}:{self.port}, reconnecting")
+            reader, writer = await self.__connect()
+            rsp, keep_alive = await self.__exchange(reader, writer, method, target, headers, body)
+
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive:
+            self.__idle.append((reader, writer))
+        else:
+            writer.close()
+
+        return rsp
+
+    async def __exchange(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         method: str, target: str, headers: dict, body: bytes) -> (Response, bool):
+        head = [f"{method} {target} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        head.extend(f"{key}: {value}" for key, value in headers.items())
+
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status_line, *header_lines = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        version, status, *reason = status_line.split(" ", 2)
+
+        rsp_headers = CaseInsensitiveDict()
+
+        for line in filter(None, header_lines):
+            key, value = line.split(":", 1)
+            rsp_headers[key.strip()] = value.strip()
+
+        keep_alive = (
+            version == "HTTP/1.1"
+            and rsp_headers.get("Connection", "").lower() != "close"
+            and headers.get("Connection", "").lower() != "close"
+        )
+
+        if rsp_headers.get("Transfer-Encoding", "").lower() == "chunked":
+            content = await AsyncHTTPPool.__read_chunked(reader)
+        elif "Content-Length" in rsp_headers:
+            content = await reader.readexactly(int(rsp_headers["Content-Length"]))
+        else:
+            content = await reader.read()
+            keep_alive = False
+
+        rsp = Response()
+        rsp.status_code = int(status)
+        rsp.reason = reason[0] if len(reason) else ""
+        rsp.headers = rsp_headers
+        rsp.encoding = get_encoding_from_headers(rsp_headers)
+        rsp.raw = io.BytesIO(content)
+        rsp.url = f"{'https' if self.__ssl else 'http'}://{self.host}:{self.port}{target}"
+
+        return rsp, keep_alive
+
+    @staticmethod
+    async def __read_chunked(reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+
+            if size == 0:
+                # Skip trailers.
+                while (await reader.readuntil(b"\r\n")) != b"\r\n":
+                    pass
+
+                return b"".join(chunks)
+
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    async def __acquire(self) -> (bool, tuple):
+        while len(self.__idle):
+            reader, writer = self.__idle.pop()
+
+            if not reader.at_eof() and not writer.is_closing():
+                return True, (reader, writer)
+
+            writer.close()
+
+        return False, await self.__connect()
+
+    async def __connect(self) -> tuple:
+        return await asyncio.open_connection(self.host, self.port, ssl=self.__ssl)
+
+    def __bind_loop(self):
+        loop = asyncio.get_running_loop()
+
+        if loop is not self.__loop:
+            # Streams cannot move between loops: forget any connections from the old one.
+            self.__loop = loop
+            self.__slots = asyncio.Semaphore(self.size)
+            self.__idle.clear()
+
+
+class AsyncBaseRPC(BaseRPC):
+    """BaseRPC with a native asyncio transport: `request()`, `get()` and `post()` return coroutines.
+
+    Responses are passed to the same response factories as the synchronous transport.
+    """
+    timeout: Optional[float]
+
+    __pool: Optional[AsyncHTTPPool] = None
+    __pool_url: Optional[str] = None
+
+    def __init__(self, *args, timeout: float = None, **kwds):
+        self.timeout = timeout
+        super().__init__(*args, **kwds)
+        self.asyncc = self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def pool(self) -> AsyncHTTPPool:
+        if self.__pool is None or self.__pool_url != self.url:
+            url = urlsplit(self.url)
+
+            self.__pool_url = self.url
+            self.__pool = AsyncHTTPPool(
+                url.hostname,
+                url.port or (443 if url.scheme == "https" else 80),
+                use_ssl=url.scheme == "https",
+                size=self.pool_size,
+                timeout=self.timeout,
+            )
+
+        return self.__pool
+
+    async def close(self):
+        if self.__pool is not None:
+            await self.__pool.close()
+
+        super().close()
+
+    async def request(self, *, request_type: str, path: Optional[str], response_factory: Callable[[Response], Any] = None,
+                      headers: Optional[dict] = None, json: Any = None, timeout: float = None, **kwds) -> [Response, Any]:
+        if request_type not in ("get", "post"):
+            raise ValueError(f"Unknown request_type '{request_type}'")
+
+        if len(kwds):
+            raise TypeError(f"unsupported request arguments for async transport: {', '.join(kwds)}")
+
+        request_url = self.request_url(path)
+        url = urlsplit(request_url)
+
+        log.debug(f"{request_type} [{request_url}] (async)")
+
+        request_headers = {"Connection": "keep-alive" if self.keep_alive else "close", "Accept": "*/*"}
+        request_headers.update(headers or {})
+
+        if url.username is not None or url.password is not None:
+            userpass = f"{unquote(url.username or '')}:{unquote(url.password or '')}"
+            request_headers["Authorization"] = "Basic " + base64.b64encode(userpass.encode()).decode()
+
+        body = b""
+
+        if json is not None:
+            body = jsonc.dumps(json)
+            request_headers["Content-Type"] = "application/json"
+
+        target = (url.path or "/") + (f"?{url.query}" if url.query else "")
+
+        started = time.perf_counter()
+
+        try:
+            rsp = await self.pool.request(request_type.upper(), target, request_headers, body, timeout=timeout)
+
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            self._stats_record(request_type, json, started, sent=len(body))
+            raise
+
+        network = time.perf_counter() - started
+
+        if not rsp.ok:
+            self._stats_record(request_type, json, started, network, sent=len(body), rsp=rsp)
+            raise BaseRPC.Exception(rsp)
+
+        result = (
+            response_factory(rsp)
+            if response_factory is not None else
+            self.response_factory(rsp)
+        )
+
+        self._stats_record(request_type, json, started, network, sent=len(body), rsp=rsp, result=result)
+
+        return result
+
+
+class AsyncHydraRPC(AsyncBaseRPC, HydraRPC):
+    """HydraRPC on the native asyncio transport.
+
+    Every `HydraRPC` method returns an awaitable, e.g. `await rpc.getblockcount()`, and batches
+    are sent with `await rpc.call_batch(...)` or `async with rpc.batch() as batch: ...`.
+    """
+
+    async def call(self, name: str, *args, raw_result: bool = False, timeout: float = None):
+        cached = self._cache_get(name, args, raw_result)
+
+        if cached is not RPCCache.MISS:
+            return cached
+
+        result = await self._post_call(name, args, raw_result, timeout)
+
+        self._cache_put(name, args, raw_result, result)
+
+        return result
+
+    async def call_batch(self, calls: Iterable[tuple], *, raw_result: bool = False, raise_errors: bool = True,
+                         batch_size: int = None) -> list:
+        """Send many calls as JSON-RPC 2.0 batches, with all batch POSTs in flight concurrently.
+
+        See `HydraRPC.call_batch`.
+        """
+        calls = list(calls)
+        results = [self._cache_get(call[0], call[1:], raw_result) for call in calls]
+        chunks = HydraRPC._batch_chunks(
+            (index for index, result in enumerate(results) if result is RPCCache.MISS), batch_size
+        )
+
+        chunk_results = await asyncio.gather(*(
+            self.__call_batch([calls[index] for index in chunk], raw_result=raw_result)
+            for chunk in chunks
+        ))
+
+        for index, result in zip(itertools.chain.from_iterable(chunks), itertools.chain.from_iterable(chunk_results)):
+            results[index] = result
+            self._cache_put(calls[index][0], calls[index][1:], raw_result, result)
+
+        return HydraRPC._batch_raise(results) if raise_errors else results
+
+    async def __call_batch(self, calls: list, *, raw_result: bool) -> list:
+        requests_ = self._batch_requests(calls)
+
+        return await self.request(
+            request_type="post",
+            path=self._request_path(),
+            response_factory=lambda rsp: HydraRPC._batch_results(rsp, requests_, raw_result=raw_result),
+            headers=dict(self.DEFAULT_POST_HEADERS),
+            json=requests_,
+        )
+
+    async def iter_blocks(self, height_from: int, height_to: int, *, verbosity: int = 1, window: int = None,
+                          prefetch: int = None) -> AsyncIterator[tuple]:
+        """Async iterator over `(height, block_hash, block)`; see `HydraRPC.iter_blocks`.
+
+        Windows in flight are tasks on the running loop rather than threads.
+        """
+        windows = HydraRPC._block_windows(height_from, height_to, window)
+        prefetch = prefetch or HydraRPC.BLOCK_PREFETCH
+
+        pending = deque(
+            asyncio.ensure_future(self.__block_window(heights, verbosity))
+            for heights in itertools.islice(windows, prefetch)
+        )
+
+        try:
+            while len(pending):
+                heights, block_hashes, blocks = await pending.popleft()
+
+                for heights_next in itertools.islice(windows, 1):
+                    pending.append(asyncio.ensure_future(self.__block_window(heights_next, verbosity)))
+
+                for item in zip(heights, block_hashes, blocks):
+                    yield item
+
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_transactions(self, height_from: int, height_to: int, *, verbosity: int = 1, window: int = None,
+                                prefetch: int = None) -> AsyncIterator[tuple]:
+        """Async iterator over `(height, block_hash, tx)`; see `HydraRPC.iter_transactions`.
+        """
+        async for height, block_hash, block in self.iter_blocks(
+                height_from, height_to, verbosity=verbosity, window=window, prefetch=prefetch):
+            for tx in block.tx:
+                yield height, block_hash, tx
+
+    async def __block_window(self, heights: range, verbosity: int) -> tuple:
+        block_hashes = await self.call_batch(("getblockhash", height) for height in heights)
+        blocks = await self.call_batch(HydraRPC._block_window_calls(block_hashes, verbosity))
+
+        return heights, block_hashes, blocks
+
+    async def iter_logs(self, from_block: int, to_block: int, address: [str, list, dict] = ...,
+                        topics: [list, dict] = ..., minconf: int = ..., *, chunk: int = None,
+                        concurrency: int = None, timeout: float = None) -> AsyncIterator:
+        """Async iterator over `searchlogs` receipts; see `HydraRPC.iter_logs`.
+        """
+        to_block = to_block if to_block >= 0 else await self.getblockcount()
+        address, topics = HydraRPC._log_filter(address, topics)
+        chunk = chunk or HydraRPC.LOG_CHUNK
+        concurrency = concurrency or HydraRPC.BLOCK_PREFETCH
+        timeout = timeout or HydraRPC.LOG_TIMEOUT
+        segments = deque()
+        start = from_block
+
+        def search(from_, to_):
+            return [from_, to_, asyncio.ensure_future(
+                self.call("searchlogs", from_, to_, address, topics, minconf, timeout=timeout)
+            )]
+
+        try:
+            while True:
+                while len(segments) < concurrency and start <= to_block:
+                    segments.append(search(start, min(to_block, start + chunk - 1)))
+                    start = segments[-1][1] + 1
+
+                if not len(segments):
+                    break
+
+                from_, to_, task = segments.popleft()
+
+                try:
+                    receipts = await task
+
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, BaseRPC.Exception) as exc:
+                    if from_ == to_ or not HydraRPC._log_split(exc):
+                        raise
+
+                    log.debug(f"searchlogs {from_}-{to_}: {exc!r}, splitting")
+                    middle = (from_ + to_) // 2
+                    chunk = max(1, middle - from_ + 1)
+                    segments.appendleft(search(middle + 1, to_))
+                    segments.appendleft(search(from_, middle))
+                    continue
+
+                chunk = HydraRPC._log_chunk(chunk, to_ - from_ + 1, len(receipts))
+
+                for receipt in receipts:
+                    yield receipt
+
+        finally:
+            for _, _, task in segments:
+                task.cancel()
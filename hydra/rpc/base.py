@@ -2,22 +2,34 @@ from __future__ import annotations
 
 import json
 import os
+import threading
+import time
 from typing import Optional, Callable, Any
 from urllib.parse import urlsplit, urlunsplit
 
+import requests
 from requests import Response, Session
-from attrdict import AttrDict
-
+from requests.adapters import HTTPAdapter
 from hydra import log
 
+from ..util import jsonc
 from ..util.asyncc import AsyncMethods
+from ..util.jsonc import AttrView
+from .stats import RPCStats
 
 
 class BaseRPC:
     __url: str
-    __session: Session = None
+    __local: threading.local
+    __adapter: Optional[HTTPAdapter] = None
+    __adapter_lock: threading.Lock
     __response_factory: Callable[[Response], Any]
 
+    pool_size: int
+    pool_block: bool
+    keep_alive: bool
+    stats: Optional[RPCStats]
+
     asyncc: AsyncMethods
 
     DEFAULT_GET_HEADERS = {
@@ -26,22 +38,30 @@ class BaseRPC:
 
     DEFAULT_POST_HEADERS = {}
 
+    POOL_SIZE = 10
+    POOL_BLOCK = False
+    KEEP_ALIVE = True
+
     RESPONSE_FACTORY_RESP = lambda response: response
 
     @staticmethod
-    def RESPONSE_FACTORY_JSON(rsp: Response) -> [AttrDict, str]:
+    def RESPONSE_FACTORY_JSON(rsp: Response) -> [AttrView, str]:
         try:
-            return rsp.json(object_hook=AttrDict)
-        except json.JSONDecodeError:
+            return jsonc.view(jsonc.loads(rsp.content))
+        except jsonc.JSONDecodeError:
             return str(rsp.content, encoding="utf-8")
 
     class Exception(BaseException):
         response: Response
-        error: Optional[AttrDict, str]
+        error: Optional[AttrView, str]
 
-        def __init__(self, response: Response):
+        def __init__(self, response: Response, error: Optional[AttrView, str] = ...):
             self.response = response
 
+            if error is not ...:
+                self.error = error
+                return
+
             try:
                 if len(response.content):
                     rslt = BaseRPC.RESPONSE_FACTORY_JSON(response)
@@ -61,10 +81,42 @@ class BaseRPC:
         def __repr__(self) -> str:
             return repr(self.error) if self.error is not None else repr(self.response)
 
-    def __init__(self, url: str, *, response_factory: Callable[[Response], Any] = None):
-        self.asyncc = AsyncMethods(self)
+    def __init__(self, url: str, *, response_factory: Callable[[Response], Any] = None,
+                 pool_size: int = None, pool_block: bool = None, keep_alive: bool = None,
+                 async_workers: int = None, async_limit: int = None, stats: [RPCStats, bool] = None):
+        """Create an RPC interface for `url`.
+
+        Connection pooling can be tuned here or with environment variables:
+          - `pool_size` (env: HY_RPC_POOL_SIZE): connections kept open per host.
+          - `pool_block` (env: HY_RPC_POOL_BLOCK): limit connections per host to `pool_size`,
+            waiting for a free one instead of opening extra connections that are discarded after use.
+          - `keep_alive` (env: HY_RPC_KEEP_ALIVE): reuse connections between requests.
 
+        Calls through `asyncc` run on a dedicated thread pool:
+          - `async_workers` (env: HY_RPC_ASYNC_WORKERS): executor threads, default `pool_size`.
+          - `async_limit` (env: HY_RPC_ASYNC_LIMIT): max calls in flight, default `async_workers`.
+            Keep this within hydrad's `rpcthreads` + `rpcworkqueue` to avoid "Work queue depth exceeded".
+
+        Requests are recorded per method in `stats` if given an `RPCStats` or True (env: HY_RPC_STATS).
+        """
         self.__url = url
+        self.__local = threading.local()
+        self.__adapter_lock = threading.Lock()
+
+        self.pool_size = pool_size if pool_size is not None else BaseRPC.__env_int("HY_RPC_POOL_SIZE", BaseRPC.POOL_SIZE)
+        self.pool_block = pool_block if pool_block is not None else BaseRPC.__env_bool("HY_RPC_POOL_BLOCK", BaseRPC.POOL_BLOCK)
+        self.keep_alive = keep_alive if keep_alive is not None else BaseRPC.__env_bool("HY_RPC_KEEP_ALIVE", BaseRPC.KEEP_ALIVE)
+
+        if stats is None:
+            stats = BaseRPC.__env_bool("HY_RPC_STATS", False)
+
+        self.stats = RPCStats() if stats is True else stats or None
+
+        self.asyncc = AsyncMethods(
+            self,
+            workers=async_workers if async_workers is not None else BaseRPC.__env_int("HY_RPC_ASYNC_WORKERS", self.pool_size),
+            limit=async_limit if async_limit is not None else BaseRPC.__env_int("HY_RPC_ASYNC_LIMIT", 0),
+        )
 
         self.__response_factory = (
             response_factory
@@ -84,11 +136,41 @@ class BaseRPC:
         self.__url = url
 
     @property
-    def session(self):
-        if self.__session is None:
-            self.__session = Session()
+    def adapter(self) -> HTTPAdapter:
+        """Connection pool adapter shared by the sessions of all threads.
+        """
+        if self.__adapter is None:
+            with self.__adapter_lock:
+                if self.__adapter is None:
+                    self.__adapter = HTTPAdapter(pool_maxsize=self.pool_size, pool_block=self.pool_block)
+
+        return self.__adapter
+
+    @property
+    def session(self) -> Session:
+        """Session for the calling thread, connected through the shared pool `adapter`.
+        """
+        session = getattr(self.__local, "session", None)
+
+        if session is None:
+            session = self.__local.session = Session()
+
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+
+            if not self.keep_alive:
+                session.headers["Connection"] = "close"
+
+        return session
 
-        return self.__session
+    def close(self):
+        """Close all pooled connections.
+        """
+        if self.__adapter is not None:
+            self.__adapter.close()
+
+        if isinstance(self.asyncc, AsyncMethods):
+            self.asyncc.shutdown(wait=False)
 
     @property
     def response_factory(self):
@@ -101,24 +183,70 @@ class BaseRPC:
         if not callable(request_fn):
             raise ValueError(f"Unknown request_type '{request_type}'")
 
-        request_url = self.__build_request_url(path)
+        request_url = self.request_url(path)
 
         log.debug(f"{request_type} [{request_url}]")
 
-        rsp: Response = request_fn(
-            url=request_url,
-            **kwds
-        )
+        started = time.perf_counter()
+
+        try:
+            rsp: Response = request_fn(
+                url=request_url,
+                **kwds
+            )
+
+        except requests.RequestException:
+            self._stats_record(request_type, kwds.get("json"), started)
+            raise
+
+        network = time.perf_counter() - started
 
         if not rsp.ok:
+            self._stats_record(request_type, kwds.get("json"), started, network, rsp=rsp)
             raise BaseRPC.Exception(rsp)
 
-        return (
+        result = (
             response_factory(rsp)
             if response_factory is not None else
             self.__response_factory(rsp)
         )
 
+        self._stats_record(request_type, kwds.get("json"), started, network, rsp=rsp, result=result)
+
+        return result
+
+    def _stats_record(self, request_type: str, request: Any, started: float, network: float = None, *,
+                      sent: int = None, rsp: Response = None, result: Any = ...):
+        """Record a request in `stats`, if enabled.
+
+        Time after the first `network` seconds is counted as decoding; a request without a `result` failed.
+        """
+        if self.stats is None:
+            return
+
+        elapsed = time.perf_counter() - started
+        method, calls = RPCStats.method(request, request_type)
+
+        if result is ...:
+            errors = calls
+        elif isinstance(result, list):
+            errors = sum(1 for item in result if isinstance(item, BaseRPC.Exception))
+        else:
+            errors = 0
+
+        if sent is None:
+            sent = len(rsp.request.body or b"") if rsp is not None and rsp.request is not None else 0
+
+        self.stats.record(
+            method,
+            calls=calls,
+            network=network if network is not None else elapsed,
+            decode=elapsed - network if network is not None and result is not ... else 0.,
+            sent=sent,
+            received=len(rsp.content) if rsp is not None else 0,
+            errors=errors,
+        )
+
     def get(self, path: str, *, headers: Optional[dict] = None, response_factory: Callable[[Response], Any] = None) -> [Response, Any]:
         request_headers = dict(self.DEFAULT_GET_HEADERS)
 
@@ -136,7 +264,8 @@ class BaseRPC:
             headers=request_headers,
         )
 
-    def post(self, path: str, *, request_type: str = "post", headers: Optional[dict] = None, response_factory: Callable[[Response], Any] = None, **request) -> [Response, Any]:
+    def post(self, path: str, *, request_type: str = "post", headers: Optional[dict] = None, response_factory: Callable[[Response], Any] = None,
+             timeout: float = None, **request) -> [Response, Any]:
         request_headers = dict(self.DEFAULT_POST_HEADERS)
 
         if headers is not None:
@@ -147,10 +276,11 @@ class BaseRPC:
             path=path,
             response_factory=response_factory,
             headers=request_headers,
+            timeout=timeout,
             json=request,
         )
 
-    def __build_request_url(self, request_path: Optional[str]) -> str:
+    def request_url(self, request_path: Optional[str]) -> str:
         if request_path is None or not len(request_path):
             return self.url
 
@@ -160,3 +290,12 @@ class BaseRPC:
 
         return urlunsplit((scheme, netloc, path, query, fragment))
 
+    @staticmethod
+    def __env_int(key: str, default: int) -> int:
+        value = os.environ.get(key)
+        return int(value) if value else default
+
+    @staticmethod
+    def __env_bool(key: str, default: bool) -> bool:
+        value = os.environ.get(key)
+        return value.lower() not in ("0", "false", "no", "off") if value else default
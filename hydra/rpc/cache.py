@@ -0,0 +1,330 @@
+"""Caches for immutable RPC results.
+
+Only calls whose results cannot change are cached: `decoderawtransaction`, and hash-keyed
+`getblock`, `getblockheader` and `getrawtransaction` results once buried at least `depth`
+confirmations deep, plus `getblockhash` for heights at least `depth` below the tip, as last seen in results such as
+`getblockcount`.
+
+Note that the `confirmations` field of a cached result reflects the time it was fetched.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional, Any
+
+from hydra.util import jsonc
+
+
+__all__ = "RPCCache", "MemoryCache", "DiskCache"
+
+
+class RPCCache:
+    """Base cache tier: decides what may be cached and stores JSON-encoded results by key.
+
+    Tiers chain through `backing`: misses fall through to it and its hits are copied up.
+    The confirmation depth defaults to HY_RPC_CACHE_DEPTH.
+    """
+    MISS = object()
+
+    DEPTH = 100
+
+    METHODS = frozenset((
+        "decoderawtransaction",
+        "getblock",
+        "getblockhash",
+        "getblockheader",
+        "getrawtransaction",
+    ))
+
+    depth: int
+    tip: Optional[int]
+    backing: Optional[RPCCache]
+    hits: int
+    misses: int
+
+    def __init__(self, *, depth: int = None, backing: RPCCache = None):
+        self.depth = depth if depth is not None else int(os.environ.get("HY_RPC_CACHE_DEPTH", RPCCache.DEPTH))
+        self.tip = None
+        self.backing = backing
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> dict:
+        """Hit/miss statistics for this tier and its backing tiers.
+        """
+        stats = {type(self).__name__: dict(hits=self.hits, misses=self.misses, **self._stats())}
+
+        if self.backing is not None:
+            stats.update(self.backing.stats)
+
+        return stats
+
+    def get(self, name: str, params: list) -> Any:
+        """Return the cached result, or `RPCCache.MISS`.
+        """
+        if name not in RPCCache.METHODS:
+            return RPCCache.MISS
+
+        value = self._get_chain(RPCCache.key(name, params))
+
+        return jsonc.view(jsonc.loads(value)) if value is not None else RPCCache.MISS
+
+    def put(self, name: str, params: list, result: Any) -> bool:
+        """Cache `result` if it is immutable; returns True if it was stored.
+        """
+        self.observe(name, result)
+
+        if name not in RPCCache.METHODS or not self.settled(name, params, result):
+            return False
+
+        key = RPCCache.key(name, params)
+        value = jsonc.dumps(result)
+
+        tier = self
+
+        while tier is not None:
+            tier._put(key, value)
+            tier = tier.backing
+
+        return True
+
+    def observe(self, name: str, result: Any):
+        """Track the chain tip from results that reveal it.
+        """
+        tip = None
+
+        if name == "getblockcount" and isinstance(result, int):
+            tip = result
+
+        elif isinstance(result, dict):
+            if name == "getblockchaininfo":
+                tip = result.get("blocks")
+
+            elif "height" in result and result.get("confirmations", 0) > 0:
+                tip = result["height"] + result["confirmations"] - 1
+
+        if tip is not None:
+            tier = self
+
+            while tier is not None:
+                tier.tip = max(tip, tier.tip or 0)
+                tier = tier.backing
+
+    def settled(self, name: str, params: list, result: Any) -> bool:
+        """True if `result` can no longer change.
+        """
+        if name == "decoderawtransaction":
+            return True
+
+        if name == "getblockhash":
+            return self.tip is not None and len(params) > 0 and params[0] <= self.tip - self.depth
+
+        if isinstance(result, str):
+            # Raw hex keyed by block or transaction hash.
+            return True
+
+        return isinstance(result, dict) and result.get("confirmations", 0) >= self.depth
+
+    @staticmethod
+    def key(name: str, params: list) -> bytes:
+        return hashlib.blake2b(jsonc.dumps([name, params]), digest_size=16).digest()
+
+    def _get_chain(self, key: bytes) -> Optional[bytes]:
+        value = self._get(key)
+
+        if value is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        if value is None and self.backing is not None:
+            value = self.backing._get_chain(key)
+
+            if value is not None:
+                self._put(key, value)
+
+        return value
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def _put(self, key: bytes, value: bytes):
+        raise NotImplementedError
+
+    def _stats(self) -> dict:
+        return {}
+
+    def close(self):
+        if self.backing is not None:
+            self.backing.close()
+
+
+class MemoryCache(RPCCache):
+    """In-process LRU cache tier holding encoded results within a byte budget.
+
+    Results are kept JSON-encoded, so the budget is exact and cached values cannot be mutated
+    through results handed to callers. The budget defaults to HY_RPC_MEMCACHE (MiB, default 64).
+    """
+    max_bytes: int
+
+    __data: OrderedDict
+    __lock: threading.Lock
+    __size: int
+
+    MAX_MB = 64
+
+    def __init__(self, *, max_bytes: int = None, depth: int = None, backing: RPCCache = None):
+        super().__init__(depth=depth, backing=backing)
+
+        self.max_bytes = max_bytes or int(os.environ.get("HY_RPC_MEMCACHE", MemoryCache.MAX_MB)) * 2**20
+        self.__data = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__size = 0
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(max_bytes={self.max_bytes}, backing={self.backing!r})"
+
+    def __len__(self):
+        return len(self.__data)
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        with self.__lock:
+            value = self.__data.get(key)
+
+            if value is not None:
+                self.__data.move_to_end(key)
+
+            return value
+
+    def _put(self, key: bytes, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+
+        with self.__lock:
+            previous = self.__data.pop(key, None)
+
+            if previous is not None:
+                self.__size -= len(previous)
+
+            self.__data[key] = value
+            self.__size += len(value)
+
+            while self.__size > self.max_bytes:
+                _, evicted = self.__data.popitem(last=False)
+                self.__size -= len(evicted)
+
+    def _stats(self) -> dict:
+        return dict(entries=len(self.__data), bytes=self.__size)
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+            self.__size = 0
+
+
+class DiskCache(RPCCache):
+    """Persistent SQLite cache tier with zlib-compressed values.
+
+    When the stored (compressed) size exceeds `max_bytes`, the oldest entries are evicted.
+    Defaults come from HY_RPC_CACHE_SIZE (MiB, default 1024) and HY_RPC_CACHE_DEPTH.
+    """
+    path: str
+    max_bytes: int
+
+    __db: sqlite3.Connection
+    __lock: threading.Lock
+    __size: int
+
+    MAX_MB = 1024
+    COMPRESSION = 6
+
+    def __init__(self, path: str, *, max_bytes: int = None, depth: int = None, backing: RPCCache = None):
+        super().__init__(depth=depth, backing=backing)
+
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes or int(os.environ.get("HY_RPC_CACHE_SIZE", DiskCache.MAX_MB)) * 2**20
+        self.__lock = threading.Lock()
+
+        self.__db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.execute("CREATE TABLE IF NOT EXISTS cache (key BLOB PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL)")
+
+        self.__size = self.__db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(path=\"{self.path}\", max_bytes={self.max_bytes})"
+
+    @property
+    def size(self) -> int:
+        """Stored size in bytes (compressed).
+        """
+        return self.__size
+
+    def __len__(self):
+        with self.__lock:
+            return self.__db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        with self.__lock:
+            row = self.__db.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+
+        return zlib.decompress(row[0]) if row is not None else None
+
+    def _put(self, key: bytes, value: bytes):
+        value = zlib.compress(value, DiskCache.COMPRESSION)
+
+        with self.__lock:
+            row = self.__db.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+
+            if row is not None:
+                return
+
+            self.__db.execute("INSERT INTO cache (key, value, size) VALUES (?, ?, ?)", (key, value, len(value)))
+            self.__size += len(value)
+
+            if self.__size > self.max_bytes:
+                self.__evict(self.max_bytes * 9 // 10)
+
+    def _stats(self) -> dict:
+        return dict(bytes=self.__size)
+
+    def __evict(self, target: int):
+        self.__db.execute("BEGIN")
+
+        try:
+            while self.__size > target:
+                rows = self.__db.execute("SELECT rowid, size FROM cache ORDER BY rowid LIMIT 256").fetchall()
+
+                if not len(rows):
+                    self.__size = 0
+                    break
+
+                for rowid, size in rows:
+                    self.__db.execute("DELETE FROM cache WHERE rowid = ?", (rowid,))
+                    self.__size -= size
+
+                    if self.__size <= target:
+                        break
+
+            self.__db.execute("COMMIT")
+
+        except BaseException:
+            self.__db.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+        super().close()
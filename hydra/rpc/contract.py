@@ -0,0 +1,139 @@
+"""Bulk contract reads.
+
+Runs many `callcontract` reads as concurrent JSON-RPC batches and decodes their results
+with `hydra.util.abi`, checking that the chain tip did not move while they ran.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Iterable
+
+from hydra import log
+from hydra.util import abi
+
+from .hydra import HydraRPC
+
+
+__all__ = "ContractReader",
+
+
+class ContractReader:
+    """Read many contracts at once.
+
+    Calls are `(address, signature, *args)` tuples, with outputs in the signature to decode the
+    results, e.g. `("6b22...3712", "balanceOf(address)(uint256)", holder)`. They are sent in batches
+    of `batch_size` with up to `threads` batches in flight.
+
+    `callcontract` always runs against the node's tip, so the tip is read before and after the calls
+    and they are repeated (up to `retries` times) if a block arrived in between; results therefore all
+    come from the same block. `ContractReader.HeightError` is raised if the tip never held still.
+
+        snapshot = ContractReader(rpc).read((token, "balanceOf(address)(uint256)", holder) for holder in holders)
+        print(snapshot.height, snapshot.results)
+    """
+    THREADS = 4
+    RETRIES = 3
+
+    rpc: HydraRPC
+    batch_size: int
+    threads: int
+    retries: int
+    sender: str
+    gas_limit: int
+
+    class Snapshot(NamedTuple):
+        height: int
+        hash: str
+        results: list
+
+    class HeightError(Exception):
+        pass
+
+    def __init__(self, rpc: HydraRPC, *, batch_size: int = None, threads: int = None, retries: int = None,
+                 sender: str = None, gas_limit: int = None):
+        self.rpc = rpc
+        self.batch_size = batch_size or HydraRPC.BATCH_SIZE
+        self.threads = threads or ContractReader.THREADS
+        self.retries = retries if retries is not None else ContractReader.RETRIES
+        self.sender = sender
+        self.gas_limit = gas_limit
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(batch_size={self.batch_size}, threads={self.threads})"
+
+    def read(self, calls: Iterable[tuple], *, raise_errors: bool = True) -> ContractReader.Snapshot:
+        """Run `calls` and return the decoded results in call order, with the block they were read at.
+
+        When `raise_errors` is False, failed or reverted calls are returned as exceptions in place of
+        their results; otherwise the first one raises.
+        """
+        calls = list(calls)
+        rpc_calls = [self.__rpc_call(address, signature, *args) for address, signature, *args in calls]
+
+        for _ in range(self.retries + 1):
+            height, block_hash = self.__tip()
+            results = self.__run(rpc_calls)
+            height_after, block_hash_after = self.__tip()
+
+            if block_hash_after == block_hash:
+                break
+
+            log.info(f"contract: tip moved from {height} to {height_after} during {len(calls)} calls, retrying")
+
+        else:
+            raise ContractReader.HeightError(f"tip moved during each of {self.retries + 1} attempts")
+
+        results = [
+            ContractReader.result(address, signature, result) if not isinstance(result, Exception) else result
+            for (address, signature, *_), result in zip(calls, results)
+        ]
+
+        if raise_errors:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+
+        return ContractReader.Snapshot(height, block_hash, results)
+
+    @staticmethod
+    def result(address: str, signature: str, result, raw: bool = False) -> [list, str, Exception]:
+        """Decode a `callcontract` result with the outputs of `signature`.
+
+        The raw output hex is returned with `raw` or if the signature declares no outputs;
+        a reverted call or undecodable output is returned as a ValueError.
+        """
+        execution = result.executionResult
+
+        if execution.excepted != "None":
+            return ValueError(f"{address}: {signature}: {execution.excepted}")
+
+        if raw or not len(abi.parse_signature(signature).outputs):
+            return execution.output
+
+        try:
+            return abi.decode_output(signature, execution.output)
+
+        except ValueError as exc:
+            return ValueError(f"{address}: {signature}: {exc}")
+
+    def __rpc_call(self, address: str, signature: str, *args) -> tuple:
+        return (
+            "callcontract", address, abi.encode_call(signature, *args),
+            self.sender if self.sender is not None else "" if self.gas_limit is not None else ...,
+            self.gas_limit if self.gas_limit is not None else ...
+        )
+
+    def __tip(self) -> tuple:
+        return tuple(self.rpc.call_batch((("getblockcount",), ("getbestblockhash",))))
+
+    def __run(self, rpc_calls: list) -> list:
+        chunks = [rpc_calls[offset:offset + self.batch_size] for offset in range(0, len(rpc_calls), self.batch_size)]
+
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="hypy-contract") as executor:
+            return [
+                result
+                for results in executor.map(
+                    lambda chunk: self.rpc.call_batch(chunk, raise_errors=False, batch_size=len(chunk)), chunks
+                )
+                for result in results
+            ]
@@ -9,14 +9,15 @@ class ExplorerRPC(BaseRPC):
     URL_TEST: str = "https://testexplorer.hydrachain.org/api"
     URL_MAIN: str = "https://explorer.hydrachain.org/api"
 
-    def __init__(self, mainnet: bool = True, *, response_factory=None):
+    def __init__(self, mainnet: bool = True, *, response_factory=None, **kwds):
         super().__init__(
             ExplorerRPC.URL_MAIN if mainnet else ExplorerRPC.URL_TEST,
             response_factory=(
                 response_factory
                 if response_factory is not None else
                 BaseRPC.RESPONSE_FACTORY_JSON
-            )
+            ),
+            **kwds
         )
 
     @property
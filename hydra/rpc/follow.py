@@ -0,0 +1,210 @@
+"""Chain tip follower.
+
+Polls the node for its best block and turns tip changes into an ordered stream of
+connect/disconnect events, detecting reorgs by comparing recent block hashes and
+parent hashes. Works over both `HydraRPC` and `AsyncHydraRPC`.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Any, Iterator, AsyncIterator
+
+from hydra import log
+
+from .hydra import HydraRPC
+
+
+__all__ = "ChainFollower",
+
+
+class ChainFollower:
+    """Follow the best chain, yielding `ChainFollower.Event`s in order.
+
+    Starting at `height`, every block up to the tip is connected first (in batched windows of
+    `window` blocks); by default only blocks after the current tip are reported. On a reorg, blocks
+    no longer on the best chain are disconnected from the top down before the new ones are connected.
+
+    Connected blocks carry the `getblockheader` result, or `getblock` with `verbosity` (1 or 2) if given;
+    verbosity 0 returns hex, which has no parent hash to check the chain against.
+    Reorgs deeper than the `depth` recent blocks tracked raise `ChainFollower.ReorgError`.
+
+        for event in ChainFollower(rpc):
+            print(event.kind, event.height, event.hash)
+
+        async for event in ChainFollower(async_rpc):
+            ...
+    """
+    CONNECT = "connect"
+    DISCONNECT = "disconnect"
+
+    INTERVAL = 5
+    DEPTH = 100
+
+    rpc: HydraRPC
+    interval: float
+    verbosity: Optional[int]
+    window: int
+    depth: int
+    behind: bool
+
+    __chain: OrderedDict
+    __next: Optional[int]
+
+    class Event(NamedTuple):
+        kind: str
+        height: int
+        hash: str
+        block: Any = None
+
+    class ReorgError(Exception):
+        pass
+
+    def __init__(self, rpc: HydraRPC, height: int = None, *, interval: float = None, verbosity: int = None,
+                 window: int = None, depth: int = None):
+        if verbosity is not None and verbosity < 1:
+            raise ValueError("verbosity must be 1 or 2: blocks are linked by their previousblockhash")
+
+        self.rpc = rpc
+        self.interval = interval if interval is not None else ChainFollower.INTERVAL
+        self.verbosity = verbosity
+        self.window = window or HydraRPC.BLOCK_WINDOW
+        self.depth = depth or ChainFollower.DEPTH
+        self.behind = height is not None
+
+        self.__chain = OrderedDict()
+        self.__next = height
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(height={self.height}, hash={self.hash})"
+
+    @property
+    def height(self) -> Optional[int]:
+        """Height of the last connected block.
+        """
+        return next(reversed(self.__chain)) if len(self.__chain) else None
+
+    @property
+    def hash(self) -> Optional[str]:
+        """Hash of the last connected block.
+        """
+        return self.__chain[self.height] if len(self.__chain) else None
+
+    def poll(self) -> list:
+        """Check the tip once and return the resulting events.
+
+        At most one window of blocks is connected per poll; `behind` is True while there are more.
+        """
+        coro = self.__poll()
+
+        try:
+            coro.send(None)
+        except StopIteration as stop:
+            return stop.value
+
+        coro.close()
+        raise TypeError("ChainFollower.poll() needs a synchronous rpc; use apoll()")
+
+    async def apoll(self) -> list:
+        """Async `poll()`: awaits an `AsyncHydraRPC`, or runs a synchronous rpc on its executor.
+        """
+        if inspect.iscoroutinefunction(self.rpc.call):
+            return await self.__poll()
+
+        return await asyncio.get_running_loop().run_in_executor(self.rpc.asyncc.executor, self.poll)
+
+    def __iter__(self) -> Iterator[ChainFollower.Event]:
+        while True:
+            yield from self.poll()
+
+            if not self.behind:
+                time.sleep(self.interval)
+
+    async def __aiter__(self) -> AsyncIterator[ChainFollower.Event]:
+        while True:
+            for event in await self.apoll():
+                yield event
+
+            if not self.behind:
+                await asyncio.sleep(self.interval)
+
+    async def __call(self, name: str, *args):
+        result = self.rpc.call(name, *args)
+        return await result if inspect.isawaitable(result) else result
+
+    async def __call_batch(self, calls, **kwds) -> list:
+        result = self.rpc.call_batch(calls, **kwds)
+        return await result if inspect.isawaitable(result) else result
+
+    async def __poll(self) -> list:
+        best_hash = await self.__call("getbestblockhash")
+
+        if best_hash == self.hash:
+            self.behind = False
+            return []
+
+        best_height = (await self.__call("getblockheader", best_hash)).height
+
+        if self.__next is None:
+            # Start following from the current tip.
+            self.__chain[best_height] = best_hash
+            self.__next = best_height + 1
+            return []
+
+        events = await self.__disconnect(best_height)
+
+        heights = range(self.__next, min(best_height, self.__next + self.window - 1) + 1)
+        block_hashes = await self.__call_batch(("getblockhash", height) for height in heights)
+        blocks = await self.__call_batch(
+            ("getblockheader", block_hash) if self.verbosity is None else ("getblock", block_hash, self.verbosity)
+            for block_hash in block_hashes
+        )
+
+        for height, block_hash, block in zip(heights, block_hashes, blocks):
+            parent_hash = self.__chain.get(height - 1)
+
+            if parent_hash is not None and block.get("previousblockhash") != parent_hash:
+                # The chain changed while catching up; the next poll disconnects back to the fork.
+                log.debug(f"follow: parent mismatch at height {height}")
+                break
+
+            self.__chain[height] = block_hash
+            self.__next = height + 1
+            events.append(ChainFollower.Event(ChainFollower.CONNECT, height, block_hash, block))
+
+            while len(self.__chain) > self.depth:
+                self.__chain.popitem(last=False)
+
+        self.behind = self.__next <= best_height
+        return events
+
+    async def __disconnect(self, best_height: int) -> list:
+        """Disconnect tracked blocks that are no longer on the best chain.
+        """
+        if not len(self.__chain):
+            return []
+
+        tip_height = self.height
+
+        if tip_height <= best_height and await self.__call("getblockhash", tip_height) == self.__chain[tip_height]:
+            return []
+
+        heights = [height for height in self.__chain if height <= best_height]
+        block_hashes = await self.__call_batch((("getblockhash", height) for height in heights), raise_errors=False)
+        fork = max((h for h, block_hash in zip(heights, block_hashes) if block_hash == self.__chain[h]), default=None)
+
+        if fork is None:
+            raise ChainFollower.ReorgError(f"reorg deeper than the {len(self.__chain)} blocks followed")
+
+        log.info(f"follow: reorg from height {tip_height} to fork at {fork}")
+
+        events = []
+
+        while self.height > fork:
+            height, block_hash = self.__chain.popitem()
+            events.append(ChainFollower.Event(ChainFollower.DISCONNECT, height, block_hash))
+
+        self.__next = fork + 1
+        return events
@@ -1,10 +1,19 @@
+from __future__ import annotations
+
 import os
 import argparse
+import itertools
 import json
-from typing import Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Iterable, Iterator
 from urllib.parse import urlsplit, urlunsplit
 
+import requests
+
+from hydra import log
 from hydra.rpc.base import BaseRPC
+from hydra.rpc.cache import RPCCache, MemoryCache, DiskCache
 
 
 class HydraRPC(BaseRPC):
@@ -13,13 +22,30 @@ class HydraRPC(BaseRPC):
     MAINNET_PORT = 3389
     TESTNET_PORT = 13389
 
+    BATCH_SIZE = 500
+    BLOCK_WINDOW = 100
+    BLOCK_PREFETCH = 4
+    LOG_CHUNK = 1000
+    LOG_CHUNK_MAX = 100000
+    LOG_DENSITY = 200
+    LOG_TIMEOUT = 60
+
     __mainnet: bool
+    __ids: itertools.count
     wallet: Optional[str]
+    cache: Optional[RPCCache]
 
     RESPONSE_FACTORY_HYDR = lambda rsp: BaseRPC.RESPONSE_FACTORY_JSON(rsp).result
 
-    def __init__(self, url: [str, tuple] = URL_DEFAULT, wallet: Optional[str] = None, *, response_factory=None):
+    def __init__(self, url: [str, tuple] = URL_DEFAULT, wallet: Optional[str] = None, *, response_factory=None,
+                 cache: [RPCCache, str] = None, **kwds):
+        """Create a Hydra node RPC interface.
+
+        `cache` is an `RPCCache` or the path of a `DiskCache` file for immutable chain data.
+        """
         self.wallet = wallet
+        self.cache = DiskCache(cache) if isinstance(cache, str) else cache
+        self.__ids = itertools.count(1)
         self.__mainnet, _url = HydraRPC.__parse_url__(url) if not isinstance(url, tuple) else url
         super().__init__(
             url=_url,
@@ -27,7 +53,8 @@ class HydraRPC(BaseRPC):
                 response_factory
                 if response_factory is not None else
                 HydraRPC.RESPONSE_FACTORY_HYDR
-            )
+            ),
+            **kwds
         )
 
     def __repr__(self):
@@ -107,24 +134,67 @@ class HydraRPC(BaseRPC):
                             action="store_true",
                             help="rpc testnet override (env: HY_RPC_WALLET)", required=False)
 
-    @staticmethod
-    def __from_parsed__(args):
+        parser.add_argument("--rpc-cache", default=os.environ.get("HY_RPC_CACHE", None), type=str,
+                            metavar="PATH", help="rpc cache file for immutable chain data (env: HY_RPC_CACHE)",
+                            required=False)
+
+        parser.add_argument("--rpc-memcache", default=int(os.environ.get("HY_RPC_MEMCACHE", MemoryCache.MAX_MB)),
+                            type=int, metavar="MB",
+                            help="rpc in-memory cache size for immutable chain data, 0 to disable (env: HY_RPC_MEMCACHE)",
+                            required=False)
+
+        parser.add_argument("--rpc-stats", default=False, action="store_true",
+                            help="print per-method rpc latency and size statistics on exit (env: HY_RPC_STATS)",
+                            required=False)
+
+    @classmethod
+    def __from_parsed__(cls, args):
         # Leave environ overrides in param defaults.
         rpc = args.rpc
         wallet = args.rpc_wallet
         testnet = args.rpc_testnet
+        cache = getattr(args, "rpc_cache", None)
+        memcache = getattr(args, "rpc_memcache", 0)
+        stats = True if getattr(args, "rpc_stats", False) else None
+
+        if cache:
+            cache = DiskCache(cache)
+
+        if memcache:
+            cache = MemoryCache(max_bytes=memcache * 2**20, backing=cache or None)
 
         # noinspection PyTypeChecker
-        return HydraRPC(url=HydraRPC.__parse_url__(rpc, testnet=testnet), wallet=wallet)
+        return cls(url=HydraRPC.__parse_url__(rpc, testnet=testnet), wallet=wallet, cache=cache, stats=stats)
 
     @property
     def mainnet(self):
         return self.__mainnet
 
-    def call(self, name: str, *args, raw_result: bool = False):
+    def close(self):
+        super().close()
+
+        if self.cache is not None:
+            self.cache.close()
+
+    def call(self, name: str, *args, raw_result: bool = False, timeout: float = None):
+        """Call RPC method `name`, waiting at most `timeout` seconds for the response if given.
+        """
+        cached = self._cache_get(name, args, raw_result)
+
+        if cached is not RPCCache.MISS:
+            return cached
+
+        result = self._post_call(name, args, raw_result, timeout)
+
+        self._cache_put(name, args, raw_result, result)
+
+        return result
+
+    def _post_call(self, name: str, args: tuple, raw_result: bool, timeout: float = None):
         return super().post(
-            f"/wallet/{self.wallet}" if self.wallet is not None else "/",
-            **HydraRPC.__build_request_dict(name, *filter(lambda a: a is not ..., args)),
+            self._request_path(),
+            timeout=timeout,
+            **HydraRPC.__build_request_dict(name, *args, id_=next(self.__ids)),
             response_factory=(
                 BaseRPC.RESPONSE_FACTORY_JSON
                 if raw_result is True else
@@ -132,13 +202,379 @@ class HydraRPC(BaseRPC):
             )
         )
 
+    def call_batch(self, calls: Iterable[tuple], *, raw_result: bool = False, raise_errors: bool = True,
+                   batch_size: int = None) -> list:
+        """Send many calls as JSON-RPC 2.0 batches, one POST per `batch_size` calls.
+
+        Each call is a tuple of `(name, *args)`. Results are returned in call order.
+        When `raise_errors` is False, failed calls are returned as `HydraRPC.Exception` instances
+        in place of their results; otherwise the first failed call raises once all results are in.
+        """
+        calls = list(calls)
+        results = [self._cache_get(call[0], call[1:], raw_result) for call in calls]
+        pending = [index for index, result in enumerate(results) if result is RPCCache.MISS]
+
+        for chunk in HydraRPC._batch_chunks(pending, batch_size):
+            requests_ = self._batch_requests([calls[index] for index in chunk])
+
+            # Decoded by the response factory, so decode time is measured apart from network time.
+            chunk_results = super().request(
+                request_type="post",
+                path=self._request_path(),
+                response_factory=lambda rsp: HydraRPC._batch_results(rsp, requests_, raw_result=raw_result),
+                headers=dict(self.DEFAULT_POST_HEADERS),
+                json=requests_,
+            )
+
+            for index, result in zip(chunk, chunk_results):
+                results[index] = result
+                self._cache_put(calls[index][0], calls[index][1:], raw_result, result)
+
+        return HydraRPC._batch_raise(results) if raise_errors else results
+
+    def batch(self, *, raw_result: bool = False, batch_size: int = None) -> HydraRPC.Batch:
+        """Create a batch context; see `HydraRPC.Batch`.
+        """
+        return HydraRPC.Batch(self, raw_result=raw_result, batch_size=batch_size)
+
+    class Batch:
+        """Queue calls (including typed wrappers) and send them as JSON-RPC batches.
+
+        Every queued call returns a `concurrent.futures.Future` that is resolved when the batch is sent,
+        either explicitly via `send()` or on leaving the context:
+
+            with rpc.batch() as batch:
+                hashes = [batch.getblockhash(height) for height in range(1000, 1100)]
+
+            blocks = rpc.call_batch(("getblock", h.result()) for h in hashes)
+        """
+        __rpc: HydraRPC
+        __calls: list
+        __futures: list
+
+        def __init__(self, rpc: HydraRPC, *, raw_result: bool = False, batch_size: int = None):
+            self.__rpc = rpc
+            self.__calls = []
+            self.__futures = []
+            self.raw_result = raw_result
+            self.batch_size = batch_size
+
+        def __len__(self):
+            return len(self.__calls)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_val, exc_tb):
+            if exc_type is None:
+                self.send()
+            else:
+                self.cancel()
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, exc_type, exc_val, exc_tb):
+            if exc_type is None:
+                await self.send_async()
+            else:
+                self.cancel()
+
+        def __getattr__(self, attr: str):
+            fn = getattr(type(self.__rpc), attr, None)
+
+            if not callable(fn) or attr.startswith("_"):
+                raise AttributeError(f"'{type(self).__name__}' object has no attribute '{attr}'")
+
+            # Typed wrappers only use self.call(), so bind them to the batch.
+            return fn.__get__(self)
+
+        def call(self, name: str, *args) -> Future:
+            future = Future()
+            self.__calls.append((name,) + args)
+            self.__futures.append(future)
+            return future
+
+        def send(self) -> list:
+            calls, futures = self.__take()
+
+            if not len(calls):
+                return []
+
+            try:
+                results = self.__rpc.call_batch(
+                    calls, raw_result=self.raw_result, raise_errors=False, batch_size=self.batch_size
+                )
+            except BaseException as exc:
+                return HydraRPC.Batch.__fail(futures, exc)
+
+            return HydraRPC.Batch.__resolve(futures, results)
+
+        async def send_async(self) -> list:
+            """Send the batch through an `AsyncHydraRPC`.
+            """
+            calls, futures = self.__take()
+
+            if not len(calls):
+                return []
+
+            try:
+                results = await self.__rpc.call_batch(
+                    calls, raw_result=self.raw_result, raise_errors=False, batch_size=self.batch_size
+                )
+            except BaseException as exc:
+                return HydraRPC.Batch.__fail(futures, exc)
+
+            return HydraRPC.Batch.__resolve(futures, results)
+
+        def cancel(self):
+            for future in self.__futures:
+                future.cancel()
+
+            self.__calls, self.__futures = [], []
+
+        def __take(self) -> (list, list):
+            calls, futures = self.__calls, self.__futures
+            self.__calls, self.__futures = [], []
+            return calls, futures
+
+        @staticmethod
+        def __fail(futures: list, exc: BaseException):
+            for future in futures:
+                future.set_exception(exc)
+            raise exc
+
+        @staticmethod
+        def __resolve(futures: list, results: list) -> list:
+            for future, result in zip(futures, results):
+                if isinstance(result, HydraRPC.Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            return results
+
+    def iter_blocks(self, height_from: int, height_to: int, *, verbosity: int = 1, window: int = None,
+                    prefetch: int = None) -> Iterator[tuple]:
+        """Yield `(height, block_hash, block)` for a height range, in height order, as blocks arrive.
+
+        Heights are fetched in windows of `window` blocks, each costing one batch of `getblockhash`
+        and one batch of `getblock`, with up to `prefetch` windows in flight on worker threads.
+        At most `window * prefetch` blocks are held at a time, however long the range.
+        """
+        windows = HydraRPC._block_windows(height_from, height_to, window)
+        prefetch = prefetch or HydraRPC.BLOCK_PREFETCH
+        executor = ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="hypy-blocks")
+
+        try:
+            pending = deque(
+                executor.submit(self._block_window, heights, verbosity)
+                for heights in itertools.islice(windows, prefetch)
+            )
+
+            while len(pending):
+                heights, block_hashes, blocks = pending.popleft().result()
+
+                for heights_next in itertools.islice(windows, 1):
+                    pending.append(executor.submit(self._block_window, heights_next, verbosity))
+
+                yield from zip(heights, block_hashes, blocks)
+
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def iter_transactions(self, height_from: int, height_to: int, *, verbosity: int = 1, window: int = None,
+                          prefetch: int = None) -> Iterator[tuple]:
+        """Yield `(height, block_hash, tx)` for every transaction in a height range; see `iter_blocks()`.
+
+        `tx` is the txid, or the decoded transaction with `verbosity=2`.
+        """
+        for height, block_hash, block in self.iter_blocks(
+                height_from, height_to, verbosity=verbosity, window=window, prefetch=prefetch):
+            for tx in block.tx:
+                yield height, block_hash, tx
+
+    def iter_logs(self, from_block: int, to_block: int, address: [str, list, dict] = ..., topics: [list, dict] = ...,
+                  minconf: int = ..., *, chunk: int = None, concurrency: int = None, timeout: float = None) -> Iterator:
+        """Yield `searchlogs` receipts for a block range in block order, with bounded memory.
+
+        The range is split into chunks searched by up to `concurrency` calls in flight, holding at most
+        that many chunks of results. Chunk sizes adapt: a chunk whose call takes longer than `timeout` seconds
+        (default `LOG_TIMEOUT`), drops the connection or finds the node overloaded (HTTP 503, "Work queue depth
+        exceeded") is split in half and retried; other RPC errors, such as a bad filter, raise at once, and the size of the next chunks shrinks when results are
+        dense and grows when they are sparse. `to_block=-1` searches up to the current tip.
+        `address` and `topics` may be given as lists, or in the node's `{"addresses": ...}`/`{"topics": ...}` form.
+        """
+        to_block = to_block if to_block >= 0 else self.getblockcount()
+        address, topics = HydraRPC._log_filter(address, topics)
+        chunk = chunk or HydraRPC.LOG_CHUNK
+        concurrency = concurrency or HydraRPC.BLOCK_PREFETCH
+        timeout = timeout or HydraRPC.LOG_TIMEOUT
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="hypy-logs")
+        segments = deque()
+        start = from_block
+
+        def search(from_, to_):
+            return [from_, to_, executor.submit(
+                self.call, "searchlogs", from_, to_, address, topics, minconf, timeout=timeout
+            )]
+
+        try:
+            while True:
+                while len(segments) < concurrency and start <= to_block:
+                    segments.append(search(start, min(to_block, start + chunk - 1)))
+                    start = segments[-1][1] + 1
+
+                if not len(segments):
+                    break
+
+                from_, to_, future = segments.popleft()
+
+                try:
+                    receipts = future.result()
+
+                except (requests.RequestException, BaseRPC.Exception) as exc:
+                    if from_ == to_ or not HydraRPC._log_split(exc):
+                        raise
+
+                    log.debug(f"searchlogs {from_}-{to_}: {exc!r}, splitting")
+                    middle = (from_ + to_) // 2
+                    chunk = max(1, middle - from_ + 1)
+                    segments.appendleft(search(middle + 1, to_))
+                    segments.appendleft(search(from_, middle))
+                    continue
+
+                chunk = HydraRPC._log_chunk(chunk, to_ - from_ + 1, len(receipts))
+                yield from receipts
+
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _log_filter(address, topics) -> tuple:
+        if address is ... and topics is not ...:
+            address = {"addresses": []}
+
+        if isinstance(address, str):
+            address = [address]
+
+        if isinstance(address, (list, tuple)):
+            address = {"addresses": list(address)}
+
+        if isinstance(topics, (list, tuple)):
+            topics = {"topics": list(topics)}
+
+        return address, topics
+
+    @staticmethod
+    def _log_split(exc: BaseException) -> bool:
+        """Whether a failed `searchlogs` chunk may succeed when split: on timeouts, drops and an overloaded node.
+
+        hydrad answers every RPC error with HTTP 500, so other errors (e.g. an invalid filter) are permanent.
+        """
+        if isinstance(exc, BaseRPC.Exception):
+            return (
+                exc.response is not None and exc.response.status_code == 503
+                or "work queue" in str(exc).lower()
+            )
+
+        return True
+
+    @staticmethod
+    def _log_chunk(chunk: int, span: int, count: int) -> int:
+        """Next chunk size after `count` receipts were found in `span` blocks.
+        """
+        if count > HydraRPC.LOG_DENSITY * 2:
+            return max(1, min(chunk, span // 2))
+
+        if count < HydraRPC.LOG_DENSITY // 2:
+            return min(HydraRPC.LOG_CHUNK_MAX, max(chunk, span * 2))
+
+        return chunk
+
+    @staticmethod
+    def _block_windows(height_from: int, height_to: int, window: int = None) -> Iterator[range]:
+        heights = range(height_from, height_to + 1)
+        window = window or HydraRPC.BLOCK_WINDOW
+        return (heights[offset:offset + window] for offset in range(0, len(heights), window))
+
+    @staticmethod
+    def _block_window_calls(block_hashes: list, verbosity: int) -> Iterator[tuple]:
+        return (("getblock", block_hash, verbosity if verbosity != 1 else ...) for block_hash in block_hashes)
+
+    def _block_window(self, heights: range, verbosity: int) -> tuple:
+        block_hashes = self.call_batch(("getblockhash", height) for height in heights)
+        blocks = self.call_batch(HydraRPC._block_window_calls(block_hashes, verbosity))
+
+        return heights, block_hashes, blocks
+
+    @staticmethod
+    def _batch_chunks(items: Iterable, batch_size: int = None) -> list:
+        items = list(items)
+        batch_size = batch_size or HydraRPC.BATCH_SIZE
+        return [items[offset:offset + batch_size] for offset in range(0, len(items), batch_size)]
+
+    def _batch_requests(self, calls: list) -> list:
+        return [
+            HydraRPC.__build_request_dict(call[0], *call[1:], id_=next(self.__ids))
+            for call in calls
+        ]
+
+    @staticmethod
+    def _batch_raise(results: list) -> list:
+        for result in results:
+            if isinstance(result, HydraRPC.Exception):
+                raise result
+
+        return results
+
+    @staticmethod
+    def _batch_results(rsp, requests_: list, *, raw_result: bool) -> list:
+        items = BaseRPC.RESPONSE_FACTORY_JSON(rsp)
+
+        if not isinstance(items, list):
+            raise BaseRPC.Exception(rsp)
+
+        by_id = {item.get("id"): item for item in items}
+        results = []
+
+        for request in requests_:
+            item = by_id.get(request["id"])
+
+            if item is None:
+                results.append(BaseRPC.Exception(rsp, error=f"no response for batched call {request['method']}"))
+
+            elif item.get("error") is not None:
+                results.append(BaseRPC.Exception(rsp, error=item.error))
+
+            else:
+                results.append(item if raw_result else item.result)
+
+        return results
+
+    def _cache_get(self, name: str, args: tuple, raw_result: bool):
+        if self.cache is None or raw_result or self.response_factory is not HydraRPC.RESPONSE_FACTORY_HYDR:
+            return RPCCache.MISS
+
+        return self.cache.get(name, [arg for arg in args if arg is not ...])
+
+    def _cache_put(self, name: str, args: tuple, raw_result: bool, result):
+        if self.cache is None or raw_result or self.response_factory is not HydraRPC.RESPONSE_FACTORY_HYDR:
+            return
+
+        if not isinstance(result, BaseRPC.Exception):
+            self.cache.put(name, [arg for arg in args if arg is not ...], result)
+
+    def _request_path(self) -> str:
+        return f"/wallet/{self.wallet}" if self.wallet is not None else "/"
+
     @staticmethod
     def __build_request_dict(name: str, *args, id_: int = 1) -> dict:
         return {
             "id": id_,
             "jsonrpc": "2.0",
             "method": name,
-            "params": list(args)
+            "params": [arg for arg in args if arg is not ...]
         }
 
     # == Blockchain ==
@@ -0,0 +1,179 @@
+"""Contract log subscription.
+
+Keeps a `waitforlogs` long-poll open against the node, advancing the start block after
+each response and reconnecting on transport and server errors, so event consumers get logs as soon
+as they are mined without polling `searchlogs`. Works over both `HydraRPC` and `AsyncHydraRPC`.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+from collections import OrderedDict
+from typing import Optional, Iterator, AsyncIterator
+
+import requests
+
+from hydra import log
+
+from .base import BaseRPC
+from .hydra import HydraRPC
+
+
+__all__ = "LogSubscription",
+
+
+class LogSubscription:
+    """Subscribe to logs matching `address` and `topics`, yielding each matching entry once.
+
+    Starts after the current tip unless `from_block` is given. Entries seen in the last `depth`
+    blocks are remembered, so a reconnect or a resumed `from_block` does not deliver them twice
+    (entries re-mined in a different block after a reorg are delivered again).
+    Transport errors and server-side failures (HTTP 5xx other than an invalid request, e.g. a bad filter)
+    are logged and retried every `interval` seconds while iterating.
+
+        for entry in LogSubscription(rpc, address="6b22910b1e302cf74803ffd1691c2ecb858d3712"):
+            print(entry.blockNumber, entry.transactionHash)
+
+        async for entry in LogSubscription(async_rpc, topics=[TRANSFER_TOPIC]):
+            ...
+    """
+    INTERVAL = 5
+    DEPTH = 100
+
+    # JSON-RPC errors about the request itself: parse error, invalid request/method/params, type error,
+    # invalid address or key, invalid parameter. hydrad sends these with HTTP 500 like any other error.
+    INVALID = frozenset((-32700, -32600, -32601, -32602, -3, -5, -8))
+
+    rpc: HydraRPC
+    filter: dict
+    minconf: int
+    interval: float
+    depth: int
+
+    __next: Optional[int]
+    __seen: OrderedDict
+
+    def __init__(self, rpc: HydraRPC, from_block: int = None, *, address: [str, list, dict] = ...,
+                 topics: [list, dict] = ..., minconf: int = ..., interval: float = None, depth: int = None):
+        self.rpc = rpc
+        self.filter = LogSubscription.__filter(address, topics)
+        self.minconf = minconf
+        self.interval = interval if interval is not None else LogSubscription.INTERVAL
+        self.depth = depth or LogSubscription.DEPTH
+
+        self.__next = from_block
+        self.__seen = OrderedDict()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(next_block={self.next_block}, filter={self.filter})"
+
+    @property
+    def next_block(self) -> Optional[int]:
+        """Block the next long-poll starts from; pass it as `from_block` to resume a subscription.
+        """
+        return self.__next
+
+    def poll(self) -> list:
+        """Wait for the next logs and return the entries not delivered before.
+        """
+        coro = self.__poll()
+
+        try:
+            coro.send(None)
+        except StopIteration as stop:
+            return stop.value
+
+        coro.close()
+        raise TypeError("LogSubscription.poll() needs a synchronous rpc; use apoll()")
+
+    async def apoll(self) -> list:
+        """Async `poll()`: awaits an `AsyncHydraRPC`, or runs a synchronous rpc on its executor.
+        """
+        if inspect.iscoroutinefunction(self.rpc.call):
+            return await self.__poll()
+
+        return await asyncio.get_running_loop().run_in_executor(self.rpc.asyncc.executor, self.poll)
+
+    def __iter__(self) -> Iterator:
+        while True:
+            try:
+                entries = self.poll()
+
+            except (requests.RequestException, BaseRPC.Exception) as exc:
+                if not LogSubscription.__retry(exc):
+                    raise
+
+                log.warning(f"logs: {exc!r}, reconnecting from block {self.__next}")
+                time.sleep(self.interval)
+                continue
+
+            yield from entries
+
+    async def __aiter__(self) -> AsyncIterator:
+        while True:
+            try:
+                entries = await self.apoll()
+
+            except (requests.RequestException, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                    BaseRPC.Exception) as exc:
+                if not LogSubscription.__retry(exc):
+                    raise
+
+                log.warning(f"logs: {exc!r}, reconnecting from block {self.__next}")
+                await asyncio.sleep(self.interval)
+                continue
+
+            for entry in entries:
+                yield entry
+
+    async def __call(self, name: str, *args):
+        result = self.rpc.call(name, *args)
+        return await result if inspect.isawaitable(result) else result
+
+    async def __poll(self) -> list:
+        if self.__next is None:
+            self.__next = await self.__call("getblockcount") + 1
+
+        # toBlock is null to wait with no upper bound.
+        result = await self.__call("waitforlogs", self.__next, None, self.filter, self.minconf)
+        entries = []
+        positions = {}
+
+        for entry in result.entries:
+            # A receipt emitting several events gives one entry per log, differing only in topics and data;
+            # the entry's position among its receipt's entries in the response tells them apart.
+            receipt = entry.get("blockHash"), entry.get("transactionHash"), entry.get("outputIndex"), \
+                entry.get("transactionIndex")
+            positions[receipt] = position = positions.get(receipt, -1) + 1
+            key = receipt + (position,)
+
+            if key not in self.__seen:
+                self.__seen[key] = entry.get("blockNumber", self.__next)
+                entries.append(entry)
+
+        self.__next = max(self.__next, result.nextblock)
+
+        while len(self.__seen) and next(iter(self.__seen.values())) < self.__next - self.depth:
+            self.__seen.popitem(last=False)
+
+        return entries
+
+    @staticmethod
+    def __retry(exc: BaseException) -> bool:
+        if not isinstance(exc, BaseRPC.Exception):
+            return True
+
+        if exc.response is None or exc.response.status_code < 500:
+            return False
+
+        return getattr(exc.error, "code", None) not in LogSubscription.INVALID
+
+    @staticmethod
+    def __filter(address, topics) -> dict:
+        address, topics = HydraRPC._log_filter(address, topics)
+
+        return {
+            **(address if address is not ... else {}),
+            **(topics if topics is not ... else {}),
+        }
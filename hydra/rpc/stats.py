@@ -0,0 +1,199 @@
+"""RPC instrumentation.
+
+Per-method request counts, latency histograms, byte sizes and error counts, with network
+time (sending the request and reading the response) kept apart from decode time (parsing it).
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import NamedTuple, Any
+
+from hydra import log
+
+
+__all__ = "RPCStats",
+
+
+class RPCStats:
+    """Statistics of the requests made through an RPC interface, keyed by method.
+
+    Single calls are keyed by their method name; batches by `batch:<method>`, or just `batch` if
+    they mix methods. Latencies are counted in a fixed histogram of `BUCKETS` (upper bounds in
+    seconds), so memory stays fixed however many requests are recorded.
+
+    Each request is also passed to every callable in `hooks` as an `RPCStats.Sample`, to feed
+    external metrics:
+
+        rpc = HydraRPC(stats=True)
+        rpc.stats.hooks.append(lambda sample: histogram.labels(sample.method).observe(sample.latency))
+        ...
+        print(rpc.stats.format())
+    """
+    BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+    hooks: list
+
+    __methods: dict
+    __lock: threading.Lock
+
+    class Sample(NamedTuple):
+        method: str
+        calls: int
+        network: float
+        decode: float
+        sent: int
+        received: int
+        errors: int
+
+        @property
+        def latency(self) -> float:
+            return self.network + self.decode
+
+    class Method:
+        """Totals for one method.
+        """
+        requests: int
+        calls: int
+        errors: int
+        sent: int
+        received: int
+        network: float
+        decode: float
+        max: float
+        buckets: list
+
+        def __init__(self):
+            self.requests = self.calls = self.errors = self.sent = self.received = 0
+            self.network = self.decode = self.max = 0.
+            self.buckets = [0] * (len(RPCStats.BUCKETS) + 1)
+
+        def add(self, sample: RPCStats.Sample):
+            self.requests += 1
+            self.calls += sample.calls
+            self.errors += sample.errors
+            self.sent += sample.sent
+            self.received += sample.received
+            self.network += sample.network
+            self.decode += sample.decode
+            self.max = max(self.max, sample.latency)
+            self.buckets[bisect.bisect_left(RPCStats.BUCKETS, sample.latency)] += 1
+
+        def quantile(self, q: float) -> float:
+            """Upper bound of the histogram bucket holding the `q` quantile of latency (the max if past the last).
+            """
+            rank, count = q * self.requests, 0
+
+            for bound, bucket in zip(RPCStats.BUCKETS, self.buckets):
+                count += bucket
+
+                if count >= rank:
+                    return min(bound, self.max)
+
+            return self.max
+
+        def summary(self) -> dict:
+            time = self.network + self.decode
+
+            return {
+                "requests": self.requests,
+                "calls": self.calls,
+                "errors": self.errors,
+                "sent": self.sent,
+                "received": self.received,
+                "time": time,
+                "network": self.network,
+                "decode": self.decode,
+                "mean": time / self.requests if self.requests else 0.,
+                "p50": self.quantile(.5),
+                "p95": self.quantile(.95),
+                "max": self.max,
+            }
+
+    def __init__(self):
+        self.hooks = []
+        self.__methods = {}
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(methods={len(self.__methods)})"
+
+    def __len__(self):
+        return len(self.__methods)
+
+    def record(self, method: str, *, calls: int = 1, network: float = 0., decode: float = 0.,
+               sent: int = 0, received: int = 0, errors: int = 0):
+        """Record one request of `calls` calls to `method`, and pass it to the hooks.
+        """
+        sample = RPCStats.Sample(method, calls, network, decode, sent, received, errors)
+
+        with self.__lock:
+            stats = self.__methods.get(method)
+
+            if stats is None:
+                stats = self.__methods[method] = RPCStats.Method()
+
+            stats.add(sample)
+
+        for hook in self.hooks:
+            try:
+                hook(sample)
+            except Exception as exc:
+                log.warning(f"rpc stats hook {hook!r}: {exc!r}")
+
+    def reset(self):
+        with self.__lock:
+            self.__methods.clear()
+
+    def get(self, method: str) -> RPCStats.Method:
+        """Totals for `method`, or None if it was never requested.
+        """
+        return self.__methods.get(method)
+
+    def summary(self) -> dict:
+        """Per-method totals and latency quantiles (seconds and bytes), by total time spent, slowest first.
+        """
+        with self.__lock:
+            summary = {method: stats.summary() for method, stats in self.__methods.items()}
+
+        return dict(sorted(summary.items(), key=lambda item: item[1]["time"], reverse=True))
+
+    def format(self) -> str:
+        """The summary as a table.
+        """
+        lines = [
+            f"{'method':<28} {'reqs':>7} {'calls':>7} {'errs':>5} {'sent':>9} {'recv':>9}"
+            f" {'time':>8} {'decode':>7} {'mean':>7} {'p50':>7} {'p95':>7} {'max':>7}"
+        ]
+
+        for method, stats in self.summary().items():
+            lines.append(
+                f"{method:<28} {stats['requests']:>7} {stats['calls']:>7} {stats['errors']:>5}"
+                f" {RPCStats.__size(stats['sent']):>9} {RPCStats.__size(stats['received']):>9}"
+                f" {stats['time']:>7.2f}s {stats['decode'] / stats['time'] if stats['time'] else 0:>7.1%}"
+                + "".join(f" {stats[key] * 1000:>5.0f}ms" for key in ("mean", "p50", "p95", "max"))
+            )
+
+        return "\n".join(lines)
+
+    @staticmethod
+    def method(request: Any, request_type: str = "post") -> (str, int):
+        """The stats key and number of calls of a request with JSON body `request`.
+        """
+        if isinstance(request, dict) and "method" in request:
+            return request["method"], 1
+
+        if isinstance(request, list) and len(request):
+            methods = {item.get("method") for item in request}
+            return f"batch:{methods.pop()}" if len(methods) == 1 else "batch", len(request)
+
+        return request_type, 1
+
+    @staticmethod
+    def __size(size: int) -> str:
+        for unit in ("B", "KB", "MB"):
+            if size < 1024:
+                return f"{size:.0f}{unit}"
+            size /= 1024
+
+        return f"{size:.1f}GB"
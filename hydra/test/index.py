@@ -0,0 +1,159 @@
+import os
+import tempfile
+from unittest import mock
+
+from hydra.index import AddressIndex, SignatureIndex
+from hydra.test import Test
+from hydra.test.stub import StubRPCServer
+from hydra.util import abi
+
+
+def tx(txid: str, vin: list, vout: list) -> dict:
+    return {
+        "txid": txid,
+        "vin": [{"txid": prev_txid, "vout": n} for prev_txid, n in vin] if len(vin) else [{"coinbase": "00"}],
+        "vout": [
+            {
+                "n": n, "value": value,
+                "scriptPubKey": {"addresses": [address]} if address is not None else {"type": "call"},
+            }
+            for n, (address, value) in enumerate(vout)
+        ],
+    }
+
+
+def chain(*blocks: list, fork: str = "0", fork_height: int = 0) -> list:
+    return [
+        {"hash": f"{fork if height >= fork_height else '0'}{height:063x}", "height": height, "time": 1000 + height,
+         "tx": txes}
+        for height, txes in enumerate(blocks)
+    ]
+
+
+@Test.register()
+class HydraIndexTest(Test):
+
+    def test_index_address(self):
+        blocks = chain(
+            [tx("c0", [], [("A", 50)])],
+            [tx("t1", [("c0", 0)], [("B", 30), ("A", 19.9)]), tx("t2", [("t1", 0)], [("C", 30)])],
+            [tx("t3", [("t1", 1)], [("D", 19.9)])],
+        )
+
+        def methods(chain_: list) -> dict:
+            return {
+                "getblockcount": lambda: len(chain_) - 1,
+                "getblockhash": lambda height: chain_[height]["hash"],
+                "getblock": lambda block_hash, verbosity=1: next(b for b in chain_ if b["hash"] == block_hash),
+            }
+
+        with tempfile.TemporaryDirectory() as tmp, StubRPCServer(methods(blocks)) as stub:
+            index = AddressIndex(os.path.join(tmp, "index.db"))
+            rpc = stub.rpc()
+
+            self.assertEqual(index.sync(rpc, window=2), 2)
+            self.assertEqual(index.height, 2)
+
+            self.assertEqual(
+                [(entry.txid, entry.category, entry.amount, entry.blockheight) for entry in index.transactions("A")],
+                [("c0", "receive", 50, 0), ("t1", "send", -50, 1), ("t1", "receive", 19.9, 1), ("t3", "send", -19.9, 2)]
+            )
+            self.assertEqual([entry.txid for entry in index.transactions("A", count=2, skip=1)], ["t1", "t1"])
+            self.assertEqual(index.transactions("B")[0].blockhash, blocks[1]["hash"])
+            self.assertEqual(index.transactions("B")[0].blocktime, 1001)
+
+            self.assertEqual(index.tx_addresses(("t1", "t2", "c0", "x")), {
+                "t1": ({"A"}, {"A", "B"}),
+                "t2": ({"B"}, {"C"}),
+                "c0": (set(), {"A"}),
+            })
+
+            posts = stub.posts
+            self.assertEqual(index.sync(rpc), 2)
+            self.assertEqual(stub.posts - posts, 2)
+
+        # Block 2 is replaced by a block spending the same output elsewhere.
+        reorged = blocks[:2] + chain([], [], [tx("t4", [("t1", 1)], [("E", 19.9)])], [], fork="f", fork_height=2)[2:]
+
+        with StubRPCServer(methods(reorged)) as stub:
+            self.assertEqual(index.sync(stub.rpc()), 3)
+
+            self.assertEqual(index.transactions("D"), [])
+            self.assertEqual([entry.txid for entry in index.transactions("E")], ["t4"])
+            self.assertEqual(index.tx_addresses(("t4",)), {"t4": ({"A"}, {"E"})})
+
+        index.close()
+
+        # A contract output (no address) spent in a later, separately committed block.
+        blocks = chain(
+            [tx("c0", [], [("A", 50)])],
+            [tx("t1", [("c0", 0)], [(None, 10), ("A", 40)])],
+            [tx("t2", [("t1", 0)], [("B", 10)])],
+        )
+
+        with tempfile.TemporaryDirectory() as tmp, StubRPCServer(methods(blocks)) as stub:
+            with AddressIndex(os.path.join(tmp, "index.db")) as index:
+                self.assertEqual(index.sync(stub.rpc(), window=1), 2)
+
+                self.assertEqual(index.tx_addresses(("t1", "t2")), {"t1": ({"A"}, {"A"}), "t2": (set(), {"B"})})
+                self.assertNotIn("getrawtransaction", {call[0] for call in stub.calls})
+
+                index.rewind(1)
+                self.assertEqual(index.sync(stub.rpc(), window=1), 2)
+                self.assertEqual(index.transactions("B")[0].txid, "t2")
+
+        with mock.patch.dict(os.environ), self.assertRaises(ValueError):
+            os.environ.pop("HYPY_INDEX", None)
+            AddressIndex()
+
+    def test_index_signature(self):
+        signatures = [f"f{i}(uint256)" for i in range(2000)] + [
+            "# ERC20", "", "transfer(address to, uint amount)", "transfer(address,uint256)",
+            "Transfer(address indexed from, address indexed to, uint256 value)", "approve(address", "bad(foo)",
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "signatures.idx")
+
+            self.assertEqual(SignatureIndex.build(path, signatures), 2002)
+            self.assertEqual(SignatureIndex.build(path, signatures, processes=2), 2002)
+
+            with SignatureIndex(path) as index:
+                self.assertEqual(len(index), 2002)
+                self.assertEqual(index.selector("a9059cbb"), ["transfer(address,uint256)"])
+                self.assertEqual(index.selector(bytes.fromhex(abi.encode_call("transfer(address,uint256)", "00" * 20, 1))),
+                                 ["transfer(address,uint256)"])
+                self.assertEqual(index.topic(abi.event_topic("Transfer(address,address,uint256)")),
+                                 ["Transfer(address,address,uint256)"])
+                self.assertEqual(index.selector("00000000"), [])
+
+                for i in range(0, 2000, 97):
+                    self.assertEqual(index.selector(abi.selector(f"f{i}(uint256)")), [f"f{i}(uint256)"])
+                    self.assertEqual(index.topic(abi.event_topic(f"f{i}(uint256)")), [f"f{i}(uint256)"])
+
+                receipts = index.label_logs([{"log": [{"topics": [abi.event_topic("f5(uint256)")]}, {"topics": []}]}])
+                self.assertEqual([entry["event"] for entry in receipts[0]["log"]], [["f5(uint256)"], []])
+
+                tx = index.label_tx({"vout": [{"scriptPubKey": {"contract": {"data": abi.encode_call("f7(uint256)", 1)}}}]})
+                self.assertEqual(tx["vout"][0]["scriptPubKey"]["contract"]["function"], ["f7(uint256)"])
+
+            with open(path, "wb") as file:
+                file.write(b"\0" * 64)
+
+            with self.assertRaises(ValueError):
+                SignatureIndex(path)
+
+            for content in (b"", b"HYSIG"):
+                with open(path, "wb") as file:
+                    file.write(content)
+
+                with self.assertRaises(ValueError):
+                    SignatureIndex(path)
+
+        with mock.patch.dict(os.environ), self.assertRaises(ValueError):
+            os.environ.pop("HYPY_SIGNATURES", None)
+            SignatureIndex()
+
+
+if __name__ == "__main__":
+    Test.main()
@@ -1,4 +1,29 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import requests
+
+from hydra.rpc import HydraRPC, AsyncHydraRPC, ChainFollower, LogSubscription
+from hydra.rpc.cache import DiskCache, MemoryCache
 from hydra.test import Test
+from hydra.test.stub import StubRPCServer
+
+
+def stub_methods():
+    def getblock(blockhash, verbosity=1):
+        if blockhash == "bad":
+            raise StubRPCServer.Error(-5, "Block not found")
+        return {"hash": blockhash, "height": 1, "confirmations": 100, "nTx": 1, "tx": [f"tx{blockhash}"]}
+
+    return {
+        "getblockcount": lambda: 100,
+        "getblockhash": lambda height: f"{height:064x}",
+        "getblock": getblock,
+    }
 
 
 @Test.register()
@@ -7,6 +32,424 @@ class HydraRPCTest(Test):
     def test_rpc_stub(self):
         self.assertTrue(True, "test stub")
 
+    def test_rpc_call_batch(self):
+        with StubRPCServer(stub_methods()) as stub:
+            rpc = stub.rpc()
+
+            hashes = rpc.call_batch(("getblockhash", height) for height in range(10))
+
+            self.assertEqual(hashes, [f"{height:064x}" for height in range(10)])
+            self.assertEqual(stub.posts, 1)
+
+            results = rpc.call_batch([("getblock", "good"), ("getblock", "bad")], raise_errors=False)
+
+            self.assertEqual(results[0].hash, "good")
+            self.assertIsInstance(results[1], HydraRPC.Exception)
+            self.assertEqual(results[1].error.code, -5)
+
+            with self.assertRaises(HydraRPC.Exception):
+                rpc.call_batch([("getblock", "good"), ("getblock", "bad")])
+
+            rpc.call_batch((("getblockhash", height) for height in range(10)), batch_size=4)
+            self.assertEqual(stub.posts, 1 + 2 + 3)
+
+    def test_rpc_batch_typed(self):
+        with StubRPCServer(stub_methods()) as stub:
+            rpc = stub.rpc()
+
+            with rpc.batch() as batch:
+                count = batch.getblockcount()
+                block = batch.getblock("good", ...)
+                missing = batch.getblock("bad")
+
+            self.assertEqual(stub.posts, 1)
+            self.assertEqual(count.result(), 100)
+            self.assertEqual(list(block.result().tx), ["txgood"])
+            self.assertEqual(stub.calls[1], ("getblock", ("good",)))
+            self.assertIsInstance(missing.exception(), HydraRPC.Exception)
+
+    def test_rpc_async(self):
+        async def run(rpc: AsyncHydraRPC):
+            async with rpc:
+                hashes = await asyncio.gather(*(rpc.getblockhash(height) for height in range(50)))
+                self.assertEqual(hashes, [f"{height:064x}" for height in range(50)])
+
+                with self.assertRaises(HydraRPC.Exception):
+                    await rpc.getblock("bad")
+
+                async with rpc.batch() as batch:
+                    count = batch.getblockcount()
+                    block = batch.getblock("good")
+
+                self.assertEqual(count.result(), 100)
+                self.assertEqual(block.result().hash, "good")
+
+                blocks = await rpc.call_batch((("getblock", h) for h in hashes), batch_size=10)
+                self.assertEqual([block.hash for block in blocks], hashes)
+
+        with StubRPCServer(stub_methods()) as stub:
+            asyncio.run(run(stub.async_rpc(pool_size=4)))
+            self.assertEqual(stub.posts, 50 + 1 + 1 + 5)
+
+    def test_rpc_iter_blocks(self):
+        async def run(rpc: AsyncHydraRPC):
+            async with rpc:
+                return [tx async for tx in rpc.iter_transactions(0, 24, window=5, prefetch=3)]
+
+        with StubRPCServer(stub_methods(), delay=0.01) as stub:
+            txes = list(stub.rpc().iter_transactions(0, 24, window=5, prefetch=3))
+
+            self.assertEqual(txes, [(height, f"{height:064x}", f"tx{height:064x}") for height in range(25)])
+            self.assertEqual(stub.posts, 10)
+            self.assertEqual(stub.active_max, 3)
+
+            self.assertEqual(asyncio.run(run(stub.async_rpc(pool_size=8))), txes)
+            self.assertEqual(stub.posts, 20)
+
+    def test_rpc_iter_logs(self):
+        def searchlogs(from_block, to_block, address, topics=None, minconf=None):
+            if to_block - from_block >= 250 or from_block == 5000:
+                raise StubRPCServer.Drop()
+
+            return [
+                {"blockNumber": height, "contractAddress": address["addresses"][0]}
+                for height in range(from_block, to_block + 1) if height % 10 == 0
+            ]
+
+        async def run(rpc: AsyncHydraRPC):
+            async with rpc:
+                return [receipt.blockNumber async for receipt in rpc.iter_logs(0, 999, "ab", chunk=400)]
+
+        with StubRPCServer({"searchlogs": searchlogs}) as stub:
+            rpc = stub.rpc()
+
+            heights = [receipt.blockNumber for receipt in rpc.iter_logs(0, 999, "ab", chunk=400, concurrency=2)]
+
+            self.assertEqual(heights, list(range(0, 1000, 10)))
+            self.assertIn(("searchlogs", (0, 199, {"addresses": ["ab"]})), stub.calls)
+            self.assertEqual(asyncio.run(run(stub.async_rpc())), heights)
+
+            with self.assertRaises(requests.RequestException):
+                list(rpc.iter_logs(5000, 5000, topics=["00"]))
+
+            self.assertEqual(stub.calls[-1], ("searchlogs", (5000, 5000, {"addresses": []}, {"topics": ["00"]})))
+
+            # Slow and overloaded chunks: calls over the timeout or failing with HTTP 5xx are split too.
+            def slow_searchlogs(from_block, to_block, address, topics=None, minconf=None):
+                if to_block - from_block >= 100:
+                    time.sleep(.5)
+                elif to_block - from_block >= 50:
+                    raise StubRPCServer.Error(-32603, "Work queue depth exceeded")
+
+                return searchlogs(from_block, to_block, address)
+
+            async def run_slow(rpc: AsyncHydraRPC):
+                async with rpc:
+                    return [receipt.blockNumber async for receipt in rpc.iter_logs(0, 399, "ab", chunk=200, timeout=.2)]
+
+            stub.methods["searchlogs"] = slow_searchlogs
+            heights = [receipt.blockNumber for receipt in rpc.iter_logs(0, 399, "ab", chunk=200, timeout=.2)]
+
+            self.assertEqual(heights, list(range(0, 400, 10)))
+            self.assertIn(("searchlogs", (0, 49, {"addresses": ["ab"]})), stub.calls)
+            self.assertEqual(asyncio.run(run_slow(stub.async_rpc())), heights)
+
+            # A bad filter is not worth splitting.
+            def bad_searchlogs(*args):
+                raise StubRPCServer.Error(-5, "Invalid address")
+
+            async def run_bad(rpc: AsyncHydraRPC):
+                async with rpc:
+                    return [receipt async for receipt in rpc.iter_logs(0, 399, "zz", chunk=400)]
+
+            stub.methods["searchlogs"] = bad_searchlogs
+            posts = stub.posts
+
+            with self.assertRaises(HydraRPC.Exception):
+                list(rpc.iter_logs(0, 399, "zz", chunk=400))
+
+            with self.assertRaises(HydraRPC.Exception):
+                asyncio.run(run_bad(stub.async_rpc()))
+
+            self.assertEqual(stub.posts - posts, 2)
+
+        self.assertEqual(HydraRPC._log_chunk(1000, 1000, 1000), 500)
+        self.assertEqual(HydraRPC._log_chunk(1000, 1000, 0), 2000)
+        self.assertEqual(HydraRPC._log_chunk(1000, 1000, HydraRPC.LOG_DENSITY), 1000)
+
+    def test_rpc_follow(self):
+        chain = [f"{height:064x}" for height in range(10)]
+
+        def header(block_hash):
+            height = chain.index(block_hash)
+            return {"hash": block_hash, "height": height, "previousblockhash": chain[height - 1] if height else None}
+
+        methods = {
+            "getbestblockhash": lambda: chain[-1],
+            "getblockhash": lambda height: chain[height],
+            "getblockheader": header,
+            "getblock": lambda block_hash, verbosity: header(block_hash),
+        }
+
+        def events(follower_):
+            return [(event.kind, event.height, event.hash[-2:]) for event in follower_.poll()]
+
+        with StubRPCServer(methods) as stub:
+            follower = ChainFollower(stub.rpc(), window=3)
+
+            self.assertEqual(events(follower), [])
+            self.assertEqual((follower.height, follower.hash), (9, chain[9]))
+
+            chain.extend(f"{height:064x}" for height in range(10, 12))
+            self.assertEqual(events(follower), [("connect", 10, "0a"), ("connect", 11, "0b")])
+            self.assertEqual(events(follower), [])
+
+            # Reorg: replace blocks 10 and 11 with 10', 11', 12', 13'.
+            chain[10:] = [f"f{height:063x}" for height in range(10, 14)]
+            self.assertEqual(events(follower), [
+                ("disconnect", 11, "0b"), ("disconnect", 10, "0a"),
+                ("connect", 10, "0a"), ("connect", 11, "0b"), ("connect", 12, "0c"),
+            ])
+            self.assertTrue(follower.behind)
+            self.assertEqual(follower.hash, chain[12])
+            self.assertEqual(events(follower), [("connect", 13, "0d")])
+            self.assertFalse(follower.behind)
+
+            async def run(rpc: AsyncHydraRPC):
+                async with rpc:
+                    follower_ = ChainFollower(rpc, 5, interval=0.01, verbosity=1)
+                    received = []
+
+                    async for event in follower_:
+                        received.append((event.kind, event.height))
+
+                        if event.height == 14:
+                            return received
+
+                        if event.height == 13:
+                            chain.append(f"{14:064x}")
+
+            self.assertEqual(asyncio.run(run(stub.async_rpc())), [("connect", height) for height in range(5, 15)])
+
+            with self.assertRaises(ChainFollower.ReorgError):
+                chain[:] = [f"e{height:063x}" for height in range(20)]
+                follower.poll()
+
+            with self.assertRaises(ValueError):
+                ChainFollower(stub.rpc(), verbosity=0)
+
+    def test_rpc_log_subscription(self):
+        logs = [{"blockNumber": 101, "transactionHash": tx, "contractAddress": "aa"} for tx in ("t1", "t2")]
+        state = {"stall": False, "drops": 0, "error": None}
+
+        def waitforlogs(from_block, to_block, filter_, minconf=None):
+            if state["drops"]:
+                state["drops"] -= 1
+                raise StubRPCServer.Drop()
+
+            if state["error"] is not None:
+                code = state["error"]
+
+                if code != -5:  # Server-side errors pass; a bad filter stays bad.
+                    state["error"] = None
+
+                raise StubRPCServer.Error(code, "error")
+
+            entries = [
+                entry for entry in logs
+                if entry["blockNumber"] >= from_block and entry["contractAddress"] in filter_["addresses"]
+            ]
+            next_block = max((entry["blockNumber"] + 1 for entry in entries), default=from_block)
+
+            return {"entries": entries, "count": len(entries), "nextblock": from_block if state["stall"] else next_block}
+
+        def txids(entries):
+            return [entry.transactionHash for entry in entries]
+
+        with StubRPCServer({"getblockcount": lambda: 100, "waitforlogs": waitforlogs}) as stub:
+            subscription = LogSubscription(stub.rpc(), address="aa")
+
+            self.assertEqual(txids(subscription.poll()), ["t1", "t2"])
+            self.assertEqual(subscription.next_block, 102)
+            self.assertIn(("waitforlogs", (101, None, {"addresses": ["aa"]})), stub.calls)
+
+            logs.append({"blockNumber": 103, "transactionHash": "t3", "contractAddress": "bb"})
+            logs.append({"blockNumber": 104, "transactionHash": "t4", "contractAddress": "aa"})
+            self.assertEqual(txids(subscription.poll()), ["t4"])
+            self.assertEqual(subscription.next_block, 105)
+
+            state["stall"] = True
+            resumed = LogSubscription(stub.rpc(), 101, address=["aa", "bb"])
+            self.assertEqual(txids(resumed.poll()), ["t1", "t2", "t3", "t4"])
+            self.assertEqual(resumed.poll(), [])
+
+            # Two events from one receipt, e.g. Transfer and Approval: both delivered, once.
+            logs.extend(
+                {"blockNumber": 106, "transactionHash": "t5", "contractAddress": "aa", "topics": [topic]}
+                for topic in ("transfer", "approval")
+            )
+            multi = LogSubscription(stub.rpc(), 106, address="aa")
+            self.assertEqual([entry.topics for entry in multi.poll()], [["transfer"], ["approval"]])
+            self.assertEqual(multi.poll(), [])
+            del logs[-2:]
+
+            async def run(rpc: AsyncHydraRPC):
+                async with rpc:
+                    received = []
+
+                    async for entry in LogSubscription(rpc, 101, address="aa", interval=0.01):
+                        received.append(entry.transactionHash)
+
+                        if len(received) == 3:
+                            return received
+
+            state["stall"], state["drops"] = False, 1
+            self.assertEqual(asyncio.run(run(stub.async_rpc())), ["t1", "t2", "t4"])
+            self.assertEqual(state["drops"], 0)
+
+            # Server-side errors are retried; errors about the request (e.g. a bad filter) are not.
+            state["error"] = -32603
+            entry = next(iter(LogSubscription(stub.rpc(), 101, address="aa", interval=0.01)))
+            self.assertEqual(entry.transactionHash, "t1")
+            self.assertIsNone(state["error"])
+
+            state["error"] = -5
+
+            with self.assertRaises(HydraRPC.Exception):
+                next(iter(LogSubscription(stub.rpc(), 101, address="aa", interval=0.01)))
+
+            with self.assertRaises(HydraRPC.Exception):
+                asyncio.run(run(stub.async_rpc()))
+
+    def test_rpc_pool(self):
+        with mock.patch.dict(os.environ, {"HY_RPC_POOL_SIZE": "3", "HY_RPC_POOL_BLOCK": "1"}):
+            rpc = HydraRPC(url=(True, "http://127.0.0.1:1"), keep_alive=False)
+
+        self.assertEqual((rpc.pool_size, rpc.pool_block, rpc.keep_alive), (3, True, False))
+        self.assertEqual(rpc.session.headers["Connection"], "close")
+
+        sessions = [rpc.session]
+        thread = threading.Thread(target=lambda: sessions.append(rpc.session))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(sessions[0], sessions[1])
+        self.assertIs(sessions[0].get_adapter("http://"), sessions[1].get_adapter("http://"))
+
+    def test_rpc_asyncc(self):
+        with StubRPCServer(stub_methods(), delay=0.01) as stub:
+            rpc = stub.rpc(pool_size=4, pool_block=True, async_limit=2)
+
+            self.assertEqual((rpc.asyncc.workers, rpc.asyncc.limit), (4, 2))
+            self.assertIs(rpc.asyncc.getblockhash, rpc.asyncc.getblockhash)
+
+            async def run():
+                return await asyncio.gather(*(rpc.asyncc.getblockhash(height) for height in range(20)))
+
+            self.assertEqual(asyncio.run(run()), [f"{height:064x}" for height in range(20)])
+            self.assertEqual(stub.active_max, 2)
+
+            rpc.close()
+
+    def test_rpc_stats(self):
+        async def run(rpc: AsyncHydraRPC):
+            async with rpc:
+                await rpc.call_batch(("getblockhash", height) for height in range(3))
+
+        with StubRPCServer(stub_methods(), delay=0.01) as stub:
+            samples = []
+            rpc = stub.rpc(stats=True)
+            rpc.stats.hooks.append(samples.append)
+
+            rpc.getblockcount()
+            rpc.getblockcount()
+            rpc.call_batch([("getblock", "good"), ("getblock", "bad")], raise_errors=False)
+            rpc.call_batch([("getblockcount",), ("getblockhash", 1)])
+
+            with self.assertRaises(HydraRPC.Exception):
+                rpc.getblock("bad")
+
+            summary = rpc.stats.summary()
+
+            self.assertEqual(list(summary)[0], "getblockcount")
+            self.assertEqual(summary["getblockcount"]["requests"], 2)
+            self.assertEqual(summary["getblockcount"]["errors"], 0)
+            self.assertGreaterEqual(summary["getblockcount"]["p50"], .01)
+            self.assertEqual((summary["batch:getblock"]["calls"], summary["batch:getblock"]["errors"]), (2, 1))
+            self.assertEqual(summary["batch"]["calls"], 2)
+            self.assertEqual(summary["getblock"]["errors"], 1)
+
+            self.assertEqual(len(samples), 5)
+            self.assertEqual(summary["getblockcount"]["sent"], samples[0].sent + samples[1].sent)
+            self.assertGreater(samples[0].received, 0)
+            self.assertGreater(samples[0].network, samples[0].decode)
+            self.assertIn("batch:getblock", rpc.stats.format())
+
+            async_rpc = stub.async_rpc(stats=rpc.stats)
+            asyncio.run(run(async_rpc))
+            self.assertEqual(rpc.stats.get("batch:getblockhash").calls, 3)
+            self.assertGreater(samples[-1].sent, 0)
+
+            rpc.stats.reset()
+            self.assertEqual(len(rpc.stats), 0)
+
+        with mock.patch.dict(os.environ, {"HY_RPC_STATS": "1"}):
+            self.assertIsNotNone(HydraRPC(url=(True, "http://127.0.0.1:1")).stats)
+
+        self.assertIsNone(HydraRPC(url=(True, "http://127.0.0.1:1")).stats)
+
+        with self.assertRaises(requests.ConnectionError):
+            rpc = HydraRPC(url=(True, "http://127.0.0.1:1"), stats=True)
+            rpc.getblockcount()
+
+        self.assertEqual(rpc.stats.get("getblockcount").errors, 1)
+
+    def test_rpc_disk_cache(self):
+        with tempfile.TemporaryDirectory() as tmp, StubRPCServer(stub_methods()) as stub:
+            rpc = stub.rpc(cache=DiskCache(os.path.join(tmp, "cache.db"), depth=10))
+
+            self.assertEqual(rpc.getblock("good").hash, "good")
+            self.assertEqual(rpc.getblock("good").hash, "good")
+            self.assertEqual(stub.posts, 1)
+
+            self.assertEqual(rpc.getblockhash(1), f"{1:064x}")  # Tip unknown: not cached.
+            rpc.getblockcount()
+
+            rpc.call_batch(("getblockhash", height) for height in range(5))
+            rpc.call_batch(("getblockhash", height) for height in range(5))
+            self.assertEqual(stub.posts, 4)
+
+            rpc.close()
+
+            rpc = stub.rpc(cache=DiskCache(os.path.join(tmp, "cache.db"), max_bytes=200))
+            self.assertEqual(rpc.getblock("good").tx, ["txgood"])
+            self.assertEqual(stub.posts, 4)
+
+            rpc.call_batch(("getblock", f"{n}") for n in range(20))
+            self.assertLessEqual(rpc.cache.size, 200)
+
+    def test_rpc_memory_cache(self):
+        with tempfile.TemporaryDirectory() as tmp, StubRPCServer(stub_methods()) as stub:
+            disk = DiskCache(os.path.join(tmp, "cache.db"), depth=10)
+            disk.put("getblock", ["good"], {"hash": "good", "confirmations": 10})
+
+            rpc = stub.rpc(cache=MemoryCache(max_bytes=400, depth=10, backing=disk))
+
+            rpc.getblock("good").hash = "mutated"
+            self.assertEqual(rpc.getblock("good").hash, "good")
+            self.assertEqual(stub.posts, 0)
+
+            rpc.call_batch(("getblock", f"{n}") for n in range(10))
+            rpc.call_batch(("getblock", f"{n}") for n in range(8, 10))
+
+            self.assertEqual(stub.posts, 1)
+            self.assertLessEqual(rpc.cache.size, 400)
+
+            stats = rpc.cache.stats
+            self.assertEqual(stats["MemoryCache"]["hits"], 3)
+            self.assertEqual(stats["MemoryCache"]["misses"], 11)
+            self.assertEqual(stats["DiskCache"]["hits"], 1)
+
 
 if __name__ == "__main__":
     Test.main()
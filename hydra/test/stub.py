@@ -0,0 +1,116 @@
+"""Stub JSON-RPC server for offline tests.
+"""
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict
+
+from hydra.rpc import HydraRPC, AsyncHydraRPC
+
+
+__all__ = "StubRPCServer",
+
+
+class StubRPCServer:
+    """Minimal hydrad-like JSON-RPC 2.0 server answering from a dict of methods.
+
+    Batch responses are returned in reverse order to exercise id-based demultiplexing.
+    """
+    methods: Dict[str, Callable]
+    posts: int
+
+    class Error(Exception):
+        def __init__(self, code: int, message: str):
+            super().__init__(message)
+            self.code = code
+            self.message = message
+
+    class Drop(Exception):
+        """Raised by a method to close the connection without responding, like a server-side timeout.
+        """
+
+    def __init__(self, methods: Dict[str, Callable] = None, *, delay: float = 0):
+        self.methods = dict(methods or {})
+        self.delay = delay
+        self.posts = 0
+        self.calls = []
+        self.active = 0
+        self.active_max = 0
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+                with stub.lock:
+                    stub.posts += 1
+                    stub.active += 1
+                    stub.active_max = max(stub.active, stub.active_max)
+
+                time.sleep(stub.delay)
+
+                with stub.lock:
+                    stub.active -= 1
+
+                request = json.loads(body)
+
+                try:
+                    if isinstance(request, list):
+                        response, status = list(reversed([stub.dispatch(item) for item in request])), 200
+                    else:
+                        response = stub.dispatch(request)
+                        status = 200 if response["error"] is None else 500
+
+                except StubRPCServer.Drop:
+                    self.close_connection = True
+                    return
+
+                content = json.dumps(response).encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def rpc(self, **kwds) -> HydraRPC:
+        return HydraRPC(url=(True, self.url), **kwds)
+
+    def async_rpc(self, **kwds) -> AsyncHydraRPC:
+        return AsyncHydraRPC(url=(True, self.url), **kwds)
+
+    def dispatch(self, request: dict) -> dict:
+        method = self.methods.get(request["method"])
+        self.calls.append((request["method"], tuple(request["params"])))
+
+        try:
+            if method is None:
+                raise StubRPCServer.Error(-32601, "Method not found")
+
+            return {"result": method(*request["params"]), "error": None, "id": request["id"]}
+
+        except StubRPCServer.Error as err:
+            return {"result": None, "error": {"code": err.code, "message": err.message}, "id": request["id"]}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server.shutdown()
+        self.server.server_close()
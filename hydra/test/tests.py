@@ -2,3 +2,7 @@
 from hydra.test.app import *
 # noinspection PyUnresolvedReferences
 import hydra.test.rpc
+# noinspection PyUnresolvedReferences
+import hydra.test.util
+# noinspection PyUnresolvedReferences
+import hydra.test.index
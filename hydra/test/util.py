@@ -0,0 +1,251 @@
+import gc
+import json
+import math
+import os
+import pstats
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from hydra.test import Test
+from hydra.util import abi, jsonc, rawtx
+from hydra.util.checkpoint import Checkpoint
+from hydra.util.profile import Profiler
+from hydra.util.ring import RingBuffer, sparkline
+
+GENESIS_TX = (
+    "01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff4d04ffff001d0104455468652054"
+    "696d65732030332f4a616e2f32303039204368616e63656c6c6f72206f6e206272696e6b206f66207365636f6e64206261696c6f7574"
+    "20666f722062616e6b73ffffffff0100f2052a01000000434104678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0ea"
+    "1f61deb649f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b8d578a4c702b6bf11d5fac00000000"
+)
+
+
+@Test.register()
+class HydraUtilTest(Test):
+
+    def test_jsonc_view(self):
+        data = json.dumps({
+            "hash": "00ff",
+            "tx": [{"txid": "aa", "vout": [{"scriptPubKey": {"addresses": ["H1"]}}]}],
+            "search-interval": 10,
+        })
+
+        block = jsonc.view(jsonc.loads(data.encode()))
+
+        self.assertIsInstance(block, dict)
+        self.assertEqual(block.hash, "00ff")
+        self.assertEqual(block["search-interval"], 10)
+        self.assertEqual(block.tx[0].vout[0].scriptPubKey.addresses, ["H1"])
+        self.assertEqual([tx.txid for tx in block.tx], ["aa"])
+        self.assertFalse(hasattr(block.tx[0], "missing"))
+        self.assertIsNone(block.get("missing"))
+
+        block.tx[0].txid = "bb"
+        block.weight = 5
+        del block.hash
+
+        self.assertEqual(json.loads(json.dumps(block)), {
+            "tx": [{"txid": "bb", "vout": [{"scriptPubKey": {"addresses": ["H1"]}}]}],
+            "search-interval": 10,
+            "weight": 5,
+        })
+        self.assertEqual(jsonc.loads(jsonc.dumps(block)), json.loads(json.dumps(block)))
+
+    def test_jsonc_loads(self):
+        self.assertEqual(jsonc.loads(b"[18446744073709551616]"), [2**64])
+
+        with self.assertRaises(jsonc.JSONDecodeError):
+            jsonc.loads(b"not json")
+
+    def test_rawtx_decode(self):
+        tx = rawtx.decode(GENESIS_TX)
+
+        self.assertEqual(tx.txid, "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b")
+        self.assertEqual(tx.hash, tx.txid)
+        self.assertEqual((tx.size, tx.vsize, tx.weight, tx.locktime), (204, 204, 816, 0))
+        self.assertIn("coinbase", tx.vin[0])
+        self.assertEqual(tx.vout[0].value, 50)
+        self.assertEqual(tx.vout[0].scriptPubKey.type, "pubkey")
+        self.assertEqual(tx.vout[0].scriptPubKey.addresses, ["HFY7mMZuUcohP3bgLAnQrLxuWxDqcXEydW"])
+
+        # Spend the genesis output into P2PKH and P2WPKH outputs, with witness data.
+        pkh = bytes(range(20))
+        p2pkh = b"\x76\xa9\x14" + pkh + b"\x88\xac"
+        p2wpkh = b"\x00\x14" + pkh
+        raw = (
+            b"\x02\x00\x00\x00" b"\x00\x01" b"\x01" + bytes.fromhex(tx.txid)[::-1] + b"\x00\x00\x00\x00"
+            b"\x00" b"\xfe\xff\xff\xff"
+            b"\x02" + (10**8).to_bytes(8, "little") + bytes((len(p2pkh),)) + p2pkh
+            + (5 * 10**7).to_bytes(8, "little") + bytes((len(p2wpkh),)) + p2wpkh
+            + b"\x02" b"\x01\xaa" b"\x02\xbb\xcc" b"\x10\x00\x00\x00"
+        )
+        spend = rawtx.decode(raw.hex())
+
+        self.assertNotEqual(spend.txid, spend.hash)
+        self.assertEqual(spend.txid, rawtx.sha256d(raw[:4] + raw[6:-10] + raw[-4:])[::-1].hex())
+        self.assertEqual(spend.weight, (len(raw) - 8) * 3 + len(raw))
+        self.assertEqual(spend.locktime, 16)
+        self.assertEqual((spend.vin[0].txid, spend.vin[0].vout), (tx.txid, 0))
+        self.assertEqual(spend.vin[0].txinwitness, ["aa", "bbcc"])
+        self.assertEqual(list(spend.vin[0])[-1], "sequence")
+        self.assertEqual(spend.vout[0].scriptPubKey.asm, "OP_DUP OP_HASH160 " + pkh.hex() + " OP_EQUALVERIFY OP_CHECKSIG")
+        self.assertEqual(spend.vout[0].scriptPubKey.addresses, [rawtx.base58check(b"\x28" + pkh)])
+        self.assertEqual(spend.vout[1].scriptPubKey.type, "witness_v0_keyhash")
+        self.assertEqual(spend.vout[1].value, 0.5)
+
+        with self.assertRaises(ValueError):
+            rawtx.decode(GENESIS_TX[:-2])
+
+        self.assertEqual([tx_.txid for tx_ in rawtx.decode_many([GENESIS_TX, raw], processes=2)], [tx.txid, spend.txid])
+
+    def test_rawtx_script(self):
+        self.assertEqual(rawtx.base58check(bytes(21)), "1111111111111111111114oLvT2")
+        self.assertEqual(
+            rawtx.segwit_address("bc", 0, bytes.fromhex("751e76e8199196d454941c45d1b3a323f1433bd6")),
+            "bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4"
+        )
+
+        contract = bytes(range(20))
+        call = b"\x01\x04\x03" + (250000).to_bytes(3, "little") + b"\x01\x28\x05" + bytes.fromhex("a9059cbb00") \
+            + b"\x14" + contract + b"\xc2"
+        script = rawtx.decode_script(call)
+
+        self.assertEqual(script["type"], "call")
+        self.assertEqual(script["asm"], f"4 250000 40 a9059cbb00 {contract.hex()} OP_CALL")
+        self.assertEqual(script["contract"], {
+            "version": 4, "gasLimit": 250000, "gasPrice": 40, "data": "a9059cbb00", "address": contract.hex()
+        })
+
+        sender = b"\x51\x14" + contract + b"\x01\x00\xc4"
+        self.assertEqual(rawtx.decode_script(sender + call)["type"], "call_sender")
+        self.assertEqual(rawtx.decode_script(call[:-22] + b"\xc1")["type"], "create")
+        self.assertEqual(rawtx.decode_script(b"\x6a\x02\xab\xcd")["type"], "nulldata")
+        self.assertEqual(rawtx.decode_script(b"\xa9\x14" + contract + b"\x87")["addresses"],
+                         [rawtx.base58check(bytes((rawtx.MAINNET.script_prefix,)) + contract)])
+        self.assertEqual(rawtx.script_asm(b"\x4c\x05abc"), "[error]")
+        self.assertEqual(rawtx.script_num(b"\x81"), -1)
+
+    def test_abi(self):
+        self.assertEqual(abi.selector("transfer(address to, uint amount) returns (bool)"), "a9059cbb")
+        self.assertIs(abi.parse_signature("balanceOf(address)(uint256)"), abi.parse_signature("balanceOf(address)(uint256)"))
+
+        # Example from the Solidity ABI specification.
+        data = abi.encode_call("f(uint,uint32[],bytes10,bytes)", 0x123, [0x456, 0x789], b"1234567890".hex(), b"Hello, world!")
+        self.assertEqual(data[:8], "8be65246")
+        self.assertEqual(len(data), 8 + 9 * 64)
+        self.assertEqual(data[-64:], b"Hello, world!".hex().ljust(64, "0"))
+        self.assertEqual(
+            abi.decode(("uint256", "uint32[]", "bytes10", "bytes"), data[8:]),
+            [0x123, [0x456, 0x789], b"1234567890".hex(), b"Hello, world!".hex()]
+        )
+
+        values = [[[1, "a"], [2, "bc"]], True, -5, "fedfe3fc79391cc8fe86cd78f0643875b2a8375a"]
+        types = ("(uint256,string)[]", "bool", "int8", "address")
+        self.assertEqual(abi.decode(types, abi.encode(types, values)), values)
+        self.assertEqual(abi.encode(["address"], ["HVknEFy1R2mfuegku1S7bMwpHLjoqVGJxF"]), values[3].rjust(64, "0"))
+        self.assertEqual(abi.encode(["uint8", "bool", "uint8[]"], ["0x10", "false", "[1]"]),
+                         abi.encode(["uint8", "bool", "uint8[]"], [16, False, [1]]))
+
+        with self.assertRaises(ValueError):
+            abi.encode(["uint8"], [256])
+
+        with self.assertRaises(ValueError):
+            abi.decode(["string"], "00" * 31)
+
+        self.assertEqual(abi.decode_output("name()(string)", abi.encode(["string"], ["Hydra"])), ["Hydra"])
+
+        transfer = "event Transfer(address indexed from, address indexed to, uint256 value)"
+        self.assertEqual(
+            abi.event_topic(transfer), "ddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+        )
+        self.assertEqual(
+            abi.decode_event(transfer, [abi.event_topic(transfer), "00" * 12 + "11" * 20, "00" * 12 + "22" * 20],
+                             abi.encode(["uint256"], [10**8])),
+            {"from": "11" * 20, "to": "22" * 20, "value": 10**8}
+        )
+
+    def test_ring_buffer(self):
+        buffer = RingBuffer(4, [1, 2])
+
+        self.assertEqual((len(buffer), buffer.values()), (2, [1.0, 2.0]))
+
+        for value in (3, None, 5, 6):
+            buffer.append(value)
+
+        self.assertEqual(len(buffer), 4)
+        self.assertTrue(math.isnan(buffer.values()[1]))
+        self.assertEqual(buffer.values(2), [5.0, 6.0])
+        self.assertEqual(buffer.mean(), 14 / 3)
+        self.assertEqual(buffer.rate(RingBuffer(4, [10, 20, 30, 40])), 3 / 30)
+        self.assertTrue(math.isnan(RingBuffer(2).mean()))
+        self.assertEqual(sparkline([0, 7, float("nan"), 3.5, 7]), "▁█ ▅█")
+        self.assertEqual(sparkline([2, 2]), "▁▁")
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "scan.db")
+
+            with Checkpoint(path) as checkpoint:
+                checkpoint.expect("scan", {"address": "A"})
+                self.assertTrue(checkpoint.add("A"))
+                self.assertFalse(checkpoint.add("A"))
+
+                checkpoint.found("A", ("A", "B", "C"), 1)
+                checkpoint.found("A", ("D",), 1, queue=False)
+                checkpoint.scanned("A")
+                checkpoint.put_txs((("t1", {"A", "B"}, {"C"}),))
+
+            with Checkpoint(path) as checkpoint:
+                checkpoint.expect("scan", {"address": "A"})
+
+                with self.assertRaises(ValueError):
+                    checkpoint.expect("scan", {"address": "B"})
+
+                self.assertEqual(checkpoint.addresses(), {"A", "B", "C", "D"})
+                self.assertEqual(checkpoint.pending(), (1, ["B", "C"]))
+                self.assertEqual(checkpoint.txs(("t1", "t2")), {"t1": ({"A", "B"}, {"C"})})
+
+                checkpoint.mark(("B", "C"), Checkpoint.SKIPPED)
+                self.assertEqual(checkpoint.pending(), (None, []))
+                self.assertEqual(checkpoint.count(1, Checkpoint.SKIPPED), 3)
+
+    def test_profiler(self):
+        def spin(seconds):
+            end = time.monotonic() + seconds
+            while time.monotonic() < end:
+                pass
+
+        gc.collect()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "app.folded")
+
+            with Profiler(path, interval=.001) as profiler:
+                self.assertEqual(profiler.interval, Profiler.MIN_INTERVAL)
+                thread = threading.Thread(target=spin, args=(.2,), name="spinner")
+                thread.start()
+                thread.join()
+
+            with open(path) as file:
+                lines = file.read().splitlines()
+
+            # other tests may leave threads running: only the spinner's samples are predictable
+            spinner = [line for line in lines if line.startswith("spinner;")]
+            self.assertEqual(sum(int(line.rsplit(" ", 1)[1]) for line in lines), sum(profiler.stacks.values()))
+            self.assertTrue(any("util.py:HydraUtilTest.test_profiler.<locals>.spin" in line for line in spinner))
+
+            path = os.path.join(tmp, "app.pstats")
+
+            with mock.patch("sys.stderr") as stderr, Profiler(path, memory=True):
+                spin(.01)
+                data = [bytearray(1024) for _ in range(100)]
+
+            del data
+            self.assertIn("spin", {func[2] for func in pstats.Stats(path).stats})
+            self.assertIn("peak", stderr.write.call_args_list[0].args[0])
+
+
+if __name__ == "__main__":
+    Test.main()
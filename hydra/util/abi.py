@@ -0,0 +1,459 @@
+"""Contract ABI encoder & decoder.
+
+Encodes function calls from human-readable signatures, and decodes `callcontract` outputs
+and event logs, following the Solidity contract ABI. Binary values (`bytesN`, `bytes`, call
+data, topics) are hex strings as used by the node's RPC; addresses are 40-digit hex, and can
+also be given as base58 Hydra addresses.
+
+Parsed signatures, types and selectors are memoized, so repeated calls with the same
+signature only hash and parse it once.
+
+    data = abi.encode_call("balanceOf(address)", "HVknEFy1R2mfuegku1S7bMwpHLjoqVGJxF")
+    balance, = abi.decode_output("balanceOf(address)(uint256)", rpc.callcontract(token, data).executionResult.output)
+"""
+from __future__ import annotations
+
+import functools
+import json
+import re
+from typing import NamedTuple, Iterable, Any
+
+from hydra.util import sha
+from hydra.util.rawtx import BASE58_ALPHABET, sha256d
+
+
+__all__ = "Param", "Signature", "parse_type", "parse_signature", "type_name", "selector", "event_topic", \
+    "encode", "decode", "encode_call", "decode_output", "decode_event"
+
+
+class Param(NamedTuple):
+    type: tuple
+    name: str = ""
+    indexed: bool = False
+
+
+class Signature(NamedTuple):
+    """A parsed function or event signature.
+
+    Outputs are given after the inputs, as `name(inputs)(outputs)` or `name(inputs) returns (outputs)`.
+    """
+    name: str
+    inputs: tuple
+    outputs: tuple
+
+    @property
+    def canonical(self) -> str:
+        """The signature as hashed for selectors and topics, e.g. `transfer(address,uint256)`.
+        """
+        return f"{self.name}({','.join(type_name(param.type) for param in self.inputs)})"
+
+
+# == Parsing ==
+
+_TYPE_ARRAY = re.compile(r"^(.*)\[(\d*)]$")
+_TYPE_SIZED = re.compile(r"^(uint|int|bytes)(\d*)$")
+
+
+def _split(text: str) -> list:
+    """Split on top-level commas.
+    """
+    parts, depth, start = [], 0, 0
+
+    for i, char in enumerate(text):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+
+    if depth != 0:
+        raise ValueError(f"unbalanced parentheses: {text!r}")
+
+    parts.append(text[start:].strip())
+    return parts if parts != [""] else []
+
+
+def _closing(text: str, start: int) -> int:
+    """Index of the parenthesis closing the one at `start`.
+    """
+    depth = 0
+
+    for i in range(start, len(text)):
+        depth += text[i] == "("
+        depth -= text[i] == ")"
+
+        if depth == 0:
+            return i
+
+    raise ValueError(f"unbalanced parentheses: {text!r}")
+
+
+@functools.lru_cache(maxsize=None)
+def parse_type(text: str) -> tuple:
+    """Parse a type into `("uint", 256)`, `("bytes", None)`, `("array", inner, length)`, `("tuple", inners)`, etc.
+    """
+    text = text.strip()
+
+    if text.startswith("tuple("):
+        text = text[5:]
+
+    match = _TYPE_ARRAY.match(text)
+
+    if match is not None:
+        return "array", parse_type(match.group(1)), int(match.group(2)) if match.group(2) else None
+
+    if text.startswith("(") and text.endswith(")"):
+        return "tuple", tuple(parse_type(part) for part in _split(text[1:-1]))
+
+    if text in ("address", "bool", "string"):
+        return text, None
+
+    match = _TYPE_SIZED.match(text)
+
+    if match is not None:
+        base, size = match.group(1), int(match.group(2)) if match.group(2) else None
+
+        if base == "bytes":
+            if size is not None and not 1 <= size <= 32:
+                raise ValueError(f"invalid type: {text!r}")
+
+            return base, size
+
+        size = size if size is not None else 256
+
+        if size % 8 or not 8 <= size <= 256:
+            raise ValueError(f"invalid type: {text!r}")
+
+        return base, size
+
+    raise ValueError(f"unsupported type: {text!r}")
+
+
+def type_name(typ: tuple) -> str:
+    """Canonical name of a parsed type.
+    """
+    if typ[0] == "array":
+        return f"{type_name(typ[1])}[{typ[2] if typ[2] is not None else ''}]"
+
+    if typ[0] == "tuple":
+        return f"({','.join(type_name(inner) for inner in typ[1])})"
+
+    return typ[0] + (str(typ[1]) if typ[1] is not None else "")
+
+
+def _param(text: str) -> Param:
+    if text.startswith("(") or text.startswith("tuple("):
+        end = _closing(text, text.index("("))
+        typ, rest = text[:end + 1], text[end + 1:]
+        suffix = re.match(r"^((?:\[\d*])*)", rest).group(1)
+        typ, words = typ + suffix, rest[len(suffix):].split()
+    else:
+        typ, *words = text.split()
+
+    indexed = "indexed" in words
+    words = [word for word in words if word not in ("indexed", "memory", "calldata", "storage")]
+
+    return Param(parse_type(typ), words[0] if len(words) else "", indexed)
+
+
+@functools.lru_cache(maxsize=None)
+def parse_signature(text: str) -> Signature:
+    """Parse a function or event signature, with optional parameter names, `indexed` flags and outputs.
+    """
+    text = text.strip()
+
+    if text.startswith("function ") or text.startswith("event "):
+        text = text.split(None, 1)[1]
+
+    start = text.index("(")
+    end = _closing(text, start)
+    rest = text[end + 1:].strip()
+
+    if rest.startswith("returns"):
+        rest = rest[7:].strip()
+
+    if len(rest) and not (rest.startswith("(") and _closing(rest, 0) == len(rest) - 1):
+        raise ValueError(f"invalid signature: {text!r}")
+
+    return Signature(
+        text[:start].strip(),
+        tuple(_param(part) for part in _split(text[start + 1:end])),
+        tuple(_param(part) for part in _split(rest[1:-1])) if len(rest) else (),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def selector(signature: str) -> str:
+    """The 4-byte function selector for `signature`, as hex.
+    """
+    return sha.sha3(parse_signature(signature).canonical)[:4].hex()
+
+
+@functools.lru_cache(maxsize=None)
+def event_topic(signature: str) -> str:
+    """The event topic (first log topic) for `signature`, as hex.
+    """
+    return sha.sha3(parse_signature(signature).canonical).hex()
+
+
+# == Encoding ==
+
+def _is_dynamic(typ: tuple) -> bool:
+    if typ[0] in ("string", "bytes"):
+        return typ[0] == "string" or typ[1] is None
+
+    if typ[0] == "array":
+        return typ[2] is None or _is_dynamic(typ[1])
+
+    if typ[0] == "tuple":
+        return any(_is_dynamic(inner) for inner in typ[1])
+
+    return False
+
+
+def _head_size(typ: tuple) -> int:
+    if _is_dynamic(typ):
+        return 32
+
+    if typ[0] == "array":
+        return typ[2] * _head_size(typ[1])
+
+    if typ[0] == "tuple":
+        return sum(_head_size(inner) for inner in typ[1])
+
+    return 32
+
+
+def _hex_bytes(value: [str, bytes]) -> bytes:
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+
+
+def _address(value: [str, bytes]) -> bytes:
+    if isinstance(value, str) and len(value) not in (40, 42):
+        if len(value) != 34 or any(char not in BASE58_ALPHABET for char in value):
+            raise ValueError(f"invalid address: {value!r}")
+
+        num = 0
+
+        for char in value:
+            num = num * 58 + BASE58_ALPHABET.index(char)
+
+        data = num.to_bytes(25, "big")
+
+        if sha256d(data[:21])[:4] != data[21:]:
+            raise ValueError(f"invalid address: {value!r}")
+
+        return data[1:21]
+
+    data = _hex_bytes(value)
+
+    if len(data) != 20:
+        raise ValueError(f"invalid address: {value!r}")
+
+    return data
+
+
+def _sequence(value) -> list:
+    """Accept JSON array text for list and tuple values, so they can be given on the command line.
+    """
+    return json.loads(value) if isinstance(value, str) else list(value)
+
+
+def _encode(typ: tuple, value) -> bytes:
+    base = typ[0]
+
+    if base in ("uint", "int"):
+        value = int(value, 0) if isinstance(value, str) else int(value)
+
+        if base == "uint" and not 0 <= value < 2 ** typ[1] or \
+                base == "int" and not -2 ** (typ[1] - 1) <= value < 2 ** (typ[1] - 1):
+            raise ValueError(f"{type_name(typ)}: value out of range: {value}")
+
+        return value.to_bytes(32, "big", signed=base == "int")
+
+    if base == "bool":
+        if isinstance(value, str):
+            value = value.lower() not in ("", "0", "false")
+
+        return int(bool(value)).to_bytes(32, "big")
+
+    if base == "address":
+        return _address(value).rjust(32, b"\0")
+
+    if base == "bytes" and typ[1] is not None:
+        data = _hex_bytes(value)
+
+        if len(data) > typ[1]:
+            raise ValueError(f"{type_name(typ)}: value too long: {len(data)} bytes")
+
+        return data.ljust(32, b"\0")
+
+    if base in ("bytes", "string"):
+        data = _hex_bytes(value) if base == "bytes" else value.encode()
+        return len(data).to_bytes(32, "big") + data.ljust((len(data) + 31) // 32 * 32, b"\0")
+
+    if base == "array":
+        values = _sequence(value)
+
+        if typ[2] is not None and len(values) != typ[2]:
+            raise ValueError(f"{type_name(typ)}: expected {typ[2]} values, got {len(values)}")
+
+        encoded = _encode_tuple((typ[1],) * len(values), values)
+        return encoded if typ[2] is not None else len(values).to_bytes(32, "big") + encoded
+
+    if base == "tuple":
+        return _encode_tuple(typ[1], _sequence(value))
+
+    raise ValueError(f"unsupported type: {type_name(typ)}")
+
+
+def _encode_tuple(types: Iterable[tuple], values: Iterable) -> bytes:
+    types, values = tuple(types), list(values)
+
+    if len(types) != len(values):
+        raise ValueError(f"expected {len(types)} values, got {len(values)}")
+
+    offset = sum(_head_size(typ) for typ in types)
+    heads, tails = [], []
+
+    for typ, value in zip(types, values):
+        encoded = _encode(typ, value)
+
+        if _is_dynamic(typ):
+            heads.append(offset.to_bytes(32, "big"))
+            tails.append(encoded)
+            offset += len(encoded)
+        else:
+            heads.append(encoded)
+
+    return b"".join(heads + tails)
+
+
+def encode(types: Iterable[str, tuple], values: Iterable) -> str:
+    """ABI-encode `values` of `types` (names or parsed types) as hex.
+    """
+    return _encode_tuple(
+        (parse_type(typ) if isinstance(typ, str) else typ for typ in types), values
+    ).hex()
+
+
+def encode_call(signature: str, *args) -> str:
+    """Call data for `signature` with `args`, as hex.
+    """
+    return selector(signature) + encode((param.type for param in parse_signature(signature).inputs), args)
+
+
+# == Decoding ==
+
+def _word(data: bytes, offset: int) -> bytes:
+    if offset + 32 > len(data):
+        raise ValueError(f"data too short: need {offset + 32} bytes, have {len(data)}")
+
+    return data[offset:offset + 32]
+
+
+def _decode(typ: tuple, data: bytes, offset: int) -> Any:
+    base = typ[0]
+
+    if base in ("uint", "int"):
+        return int.from_bytes(_word(data, offset), "big", signed=base == "int")
+
+    if base == "bool":
+        return int.from_bytes(_word(data, offset), "big") != 0
+
+    if base == "address":
+        return _word(data, offset)[12:].hex()
+
+    if base == "bytes" and typ[1] is not None:
+        return _word(data, offset)[:typ[1]].hex()
+
+    if base in ("bytes", "string"):
+        size = int.from_bytes(_word(data, offset), "big")
+
+        if offset + 32 + size > len(data):
+            raise ValueError(f"data too short for {size} byte {base}")
+
+        value = data[offset + 32:offset + 32 + size]
+        return value.hex() if base == "bytes" else value.decode(errors="replace")
+
+    if base == "array":
+        if typ[2] is not None:
+            return _decode_tuple((typ[1],) * typ[2], data, offset)
+
+        size = int.from_bytes(_word(data, offset), "big")
+
+        if size > len(data):
+            raise ValueError(f"invalid array length: {size}")
+
+        return _decode_tuple((typ[1],) * size, data, offset + 32)
+
+    if base == "tuple":
+        return _decode_tuple(typ[1], data, offset)
+
+    raise ValueError(f"unsupported type: {type_name(typ)}")
+
+
+def _decode_tuple(types: tuple, data: bytes, offset: int = 0) -> list:
+    values = []
+    head = offset
+
+    for typ in types:
+        if _is_dynamic(typ):
+            values.append(_decode(typ, data, offset + int.from_bytes(_word(data, head), "big")))
+        else:
+            values.append(_decode(typ, data, head))
+
+        head += _head_size(typ)
+
+    return values
+
+
+def decode(types: Iterable[str, tuple], data: [str, bytes]) -> list:
+    """Decode ABI-encoded `data` (hex or bytes) into a list of values of `types`.
+    """
+    return _decode_tuple(tuple(parse_type(typ) if isinstance(typ, str) else typ for typ in types), _hex_bytes(data))
+
+
+def decode_output(signature: str, data: [str, bytes]) -> list:
+    """Decode a call result with the outputs of `signature`, e.g. `decimals()(uint8)`.
+    """
+    return decode((param.type for param in parse_signature(signature).outputs), data)
+
+
+def decode_event(signature: str, topics: Iterable[str], data: [str, bytes], *, check: bool = True) -> dict:
+    """Decode an event log into a dict of its parameters by name (or position if unnamed).
+
+    Indexed parameters come from `topics` after the event topic; indexed dynamic values are only
+    stored as their hash, which is returned as hex. With `check`, the event topic must match.
+    """
+    sig = parse_signature(signature)
+    topics = list(topics)
+
+    if check and (not len(topics) or topics[0] != event_topic(signature)):
+        raise ValueError(f"log is not a {sig.canonical} event")
+
+    indexed = iter(topics[1:])
+    values = iter(decode((param.type for param in sig.inputs if not param.indexed), data))
+    result = {}
+
+    for i, param in enumerate(sig.inputs):
+        if param.indexed:
+            topic = next(indexed, None)
+
+            if topic is None:
+                raise ValueError(f"log is missing topics for {sig.canonical}")
+
+            value = topic if _is_dynamic(param.type) or param.type[0] in ("array", "tuple") else \
+                _decode(param.type, _hex_bytes(topic), 0)
+        else:
+            value = next(values)
+
+        result[param.name or str(i)] = value
+
+    return result
+
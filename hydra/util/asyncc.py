@@ -1,32 +1,84 @@
 """Provide async versions of instance methods automatically.
+
+Calls run on a dedicated thread pool of `workers` threads, with at most `limit`
+calls in flight per event loop.
 """
-from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 import asyncio
+import functools
 import inspect
+import threading
+import weakref
 
 
 class AsyncMethods:
     __instance: object
+    __executor: Optional[ThreadPoolExecutor] = None
+    __executor_lock: threading.Lock
+    __semaphores: weakref.WeakKeyDictionary
+    __wrappers: dict
+
+    workers: int
+    limit: int
 
-    def __init__(self, instance: object):
+    WORKERS = 16
+    LIMIT = 16
+
+    def __init__(self, instance: object, *, workers: int = None, limit: int = None):
         self.__instance = instance
+        self.__executor_lock = threading.Lock()
+        self.__semaphores = weakref.WeakKeyDictionary()
+        self.__wrappers = {}
+
+        self.workers = workers or AsyncMethods.WORKERS
+        self.limit = limit or self.workers
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self.__executor is None:
+            with self.__executor_lock:
+                if self.__executor is None:
+                    self.__executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hypy-async")
+
+        return self.__executor
+
+    def shutdown(self, wait: bool = True):
+        """Shut down the executor; it is recreated on next use.
+        """
+        with self.__executor_lock:
+            executor, self.__executor = self.__executor, None
 
-    @staticmethod
-    async def __run_in_executor(fn: Callable, args: tuple, kwds: dict):
-        return await asyncio.get_event_loop().run_in_executor(None, AsyncMethods.__executor_fn, fn, args, kwds)
+        if executor is not None:
+            executor.shutdown(wait=wait)
 
-    @staticmethod
-    def __executor_fn(fn: Callable, args: tuple, kwds: dict):
-        return fn(*args, **kwds)
+    def __semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self.__semaphores.get(loop)
 
-    @staticmethod
-    def __executor_callable(fn: Callable):
+        if semaphore is None:
+            semaphore = self.__semaphores[loop] = asyncio.Semaphore(self.limit)
+
+        return semaphore
+
+    async def __run_in_executor(self, fn: Callable, args: tuple, kwds: dict):
+        async with self.__semaphore():
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(fn, *args, **kwds)
+            )
+
+    def __executor_callable(self, fn: Callable):
+        @functools.wraps(fn)
         async def await_fn(*args, **kwds):
-            return await AsyncMethods.__run_in_executor(fn, args, kwds)
+            return await self.__run_in_executor(fn, args, kwds)
 
         return await_fn
 
     def __getattr__(self, attr: str):
+        wrapper = self.__wrappers.get(attr)
+
+        if wrapper is not None:
+            return wrapper
 
         obj_attr = getattr(self.__instance, attr)
 
@@ -34,6 +86,12 @@ class AsyncMethods:
             return obj_attr
 
         elif inspect.ismethod(obj_attr):
-            return AsyncMethods.__executor_callable(obj_attr)
+            wrapper = self.__executor_callable(obj_attr)
+
+            # Only methods defined by the class are stable enough to cache.
+            if inspect.isfunction(getattr(type(self.__instance), attr, None)):
+                self.__wrappers[attr] = wrapper
+
+            return wrapper
 
         return obj_attr
@@ -0,0 +1,181 @@
+"""Resumable scan state.
+
+A SQLite store for long-running scans: parameters, the address queue (found addresses with
+their level and whether they were scanned), and resolved per-transaction vin/vout addresses.
+Every update commits immediately, so an interrupted scan resumes where it stopped.
+"""
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+
+__all__ = "Checkpoint",
+
+
+class Checkpoint:
+    """Scan checkpoint store; `path=":memory:"` keeps the same state without persisting it.
+    """
+    path: str
+
+    __db: sqlite3.Connection
+    __lock: threading.Lock
+
+    PENDING = 0
+    SCANNED = 1
+    SKIPPED = 2
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = os.path.expanduser(path)
+        self.__lock = threading.Lock()
+
+        self.__db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS address (
+                address TEXT PRIMARY KEY, parent TEXT, level INTEGER NOT NULL, state INTEGER NOT NULL,
+                found INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS address_queue ON address (state, level);
+            CREATE TABLE IF NOT EXISTS tx (txid TEXT PRIMARY KEY, vin TEXT NOT NULL, vout TEXT NOT NULL);
+        """)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(path=\"{self.path}\")"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    @contextlib.contextmanager
+    def __transaction(self):
+        with self.__lock:
+            self.__db.execute("BEGIN")
+
+            try:
+                yield self.__db
+                self.__db.execute("COMMIT")
+
+            except BaseException:
+                self.__db.execute("ROLLBACK")
+                raise
+
+    # == Parameters ==
+
+    def get(self, key: str, default=None):
+        with self.__lock:
+            row = self.__db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+        return json.loads(row[0]) if row is not None else default
+
+    def set(self, key: str, value):
+        with self.__lock:
+            self.__db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def expect(self, key: str, value):
+        """Record `value` for a new scan, or raise ValueError if resuming a scan with a different one.
+        """
+        stored = self.get(key, ...)
+
+        if stored is ...:
+            self.set(key, value)
+
+        elif stored != value:
+            raise ValueError(f"{self.path}: checkpoint is for {key}={stored!r}, not {value!r}")
+
+    # == Address queue ==
+
+    def addresses(self) -> set:
+        """All addresses reported as found so far.
+        """
+        with self.__lock:
+            return {row[0] for row in self.__db.execute("SELECT address FROM address WHERE found = 1")}
+
+    def add(self, address: str, level: int = 0) -> bool:
+        """Queue an address to scan at `level`; returns False if it was already known.
+        """
+        with self.__lock:
+            return self.__db.execute(
+                "INSERT OR IGNORE INTO address (address, level, state) VALUES (?, ?, ?)",
+                (address, level, Checkpoint.PENDING)
+            ).rowcount > 0
+
+    def pending(self) -> (Optional[int], list):
+        """The lowest level with addresses left to scan, and those addresses in the order they were found.
+        """
+        with self.__lock:
+            row = self.__db.execute("SELECT MIN(level) FROM address WHERE state = ?", (Checkpoint.PENDING,)).fetchone()
+
+            if row[0] is None:
+                return None, []
+
+            return row[0], [
+                address for (address,) in self.__db.execute(
+                    "SELECT address FROM address WHERE state = ? AND level = ? ORDER BY rowid",
+                    (Checkpoint.PENDING, row[0])
+                )
+            ]
+
+    def count(self, level: int, state: int) -> int:
+        with self.__lock:
+            return self.__db.execute(
+                "SELECT COUNT(*) FROM address WHERE level = ? AND state = ?", (level, state)
+            ).fetchone()[0]
+
+    def mark(self, addresses: Iterable[str], state: int):
+        with self.__transaction() as db:
+            db.executemany("UPDATE address SET state = ? WHERE address = ?", ((state, addr) for addr in addresses))
+
+    def found(self, parent: str, addresses: Iterable[str], level: int, queue: bool = True):
+        """Record `addresses` as found from `parent`.
+
+        New addresses are queued to scan at `level` if `queue`, otherwise they are recorded as skipped.
+        """
+        addresses = list(addresses)
+
+        with self.__transaction() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO address (address, parent, level, state) VALUES (?, ?, ?, ?)",
+                ((addr, parent, level, Checkpoint.PENDING if queue else Checkpoint.SKIPPED) for addr in addresses)
+            )
+            db.executemany("UPDATE address SET found = 1 WHERE address = ?", ((addr,) for addr in addresses))
+
+    def scanned(self, address: str):
+        self.mark((address,), Checkpoint.SCANNED)
+
+    # == Transactions ==
+
+    def txs(self, txids: Iterable[str]) -> dict:
+        """Resolved `(addresses_vin, addresses_vout)` by txid, for those of `txids` already stored.
+        """
+        txids = list(txids)
+        results = {}
+
+        with self.__lock:
+            for offset in range(0, len(txids), 500):
+                chunk = txids[offset:offset + 500]
+
+                for txid, vin, vout in self.__db.execute(
+                        f"SELECT txid, vin, vout FROM tx WHERE txid IN ({','.join('?' * len(chunk))})", chunk):
+                    results[txid] = set(json.loads(vin)), set(json.loads(vout))
+
+        return results
+
+    def put_txs(self, txs: Iterable[tuple]):
+        """Store `(txid, addresses_vin, addresses_vout)` results.
+        """
+        with self.__transaction() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO tx (txid, vin, vout) VALUES (?, ?, ?)",
+                ((txid, json.dumps(sorted(vin)), json.dumps(sorted(vout))) for txid, vin, vout in txs)
+            )
@@ -0,0 +1,161 @@
+"""Fast JSON codec with lazy attribute access.
+
+Decoding uses the fastest available backend: `orjson`, then `simdjson`, then the stdlib `json`
+module. Override with `HYPY_JSON=orjson|simdjson|json`.
+
+Decoded objects stay plain dicts and lists until touched: `view()` wraps only the top level in an
+`AttrView`, and nested values are wrapped on access, so `result.field.sub` works without building an
+attribute dict for every object in a large response.
+"""
+import json
+import os
+import importlib
+from typing import Any, Callable, Optional
+
+__all__ = "AttrView", "ListView", "JSONDecodeError", "backend", "loads", "dumps", "view"
+
+JSONDecodeError = json.JSONDecodeError
+
+BACKENDS = "orjson", "simdjson", "json"
+
+
+def _load_backend(name: str) -> Optional[tuple]:
+    try:
+        mod = importlib.import_module(name)
+    except ImportError:
+        return None
+
+    if name == "orjson":
+        return name, mod.loads, lambda obj, default: mod.dumps(obj, default=default)
+
+    if name == "simdjson":
+        return name, mod.loads, lambda obj, default: json.dumps(obj, default=default).encode("utf-8")
+
+    return name, mod.loads, lambda obj, default: mod.dumps(obj, default=default).encode("utf-8")
+
+
+def _select_backend() -> tuple:
+    name = os.environ.get("HYPY_JSON", "")
+
+    if name:
+        selected = _load_backend(name) if name in BACKENDS else None
+
+        if selected is None:
+            raise ImportError(f"HYPY_JSON: json backend '{name}' is not available")
+
+        return selected
+
+    for name in BACKENDS:
+        selected = _load_backend(name)
+
+        if selected is not None:
+            return selected
+
+
+_backend, _loads, _dumps = _select_backend()
+
+
+def backend() -> str:
+    """Name of the JSON backend in use.
+    """
+    return _backend
+
+
+def loads(data: [bytes, str]) -> Any:
+    """Decode JSON into plain Python objects.
+    """
+    try:
+        return _loads(data)
+    except JSONDecodeError:
+        if _backend == "json":
+            raise
+    except ValueError as exc:
+        raise JSONDecodeError(str(exc), "", 0) from exc
+
+    # orjson rejects some valid documents, e.g. integers beyond 64 bits.
+    return json.loads(data)
+
+
+def dumps(obj: Any, default: Callable = None) -> bytes:
+    """Encode to UTF-8 JSON bytes.
+    """
+    return _dumps(obj, default)
+
+
+def view(obj: Any) -> Any:
+    """Wrap a decoded dict or list for lazy attribute access; other values are returned as-is.
+    """
+    if type(obj) is dict:
+        return AttrView(obj)
+
+    if type(obj) is list:
+        return ListView(obj)
+
+    return obj
+
+
+class AttrView(dict):
+    """Dict with attribute access to keys.
+
+    Nested dicts and lists are wrapped the first time they are accessed, and the wrapper replaces the
+    original value so that changes to it persist.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, key: str):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __setattr__(self, key: str, value):
+        self[key] = value
+
+    def __delattr__(self, key: str):
+        try:
+            del self[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+
+        if type(value) is dict or type(value) is list:
+            value = view(value)
+            dict.__setitem__(self, key, value)
+
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict.__repr__(self)})"
+
+
+class ListView(list):
+    """List whose dict and list items are wrapped on access; see `AttrView`.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        value = list.__getitem__(self, index)
+
+        if isinstance(index, slice):
+            return ListView(value)
+
+        if type(value) is dict or type(value) is list:
+            value = view(value)
+            list.__setitem__(self, index, value)
+
+        return value
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
@@ -0,0 +1,176 @@
+"""Application profiling.
+
+Run a block of code under cProfile, or under a sampling profiler that writes collapsed
+stacks for flame graphs, optionally tracing peak memory with tracemalloc.
+"""
+from __future__ import annotations
+
+import collections
+import cProfile
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Optional
+
+from hydra import log
+
+
+__all__ = "Profiler",
+
+
+class Profiler:
+    """Profile everything run inside the context, writing the result to `path` on exit.
+
+    `path` ending in `.folded` or `.collapsed` samples the stacks of all threads every `interval`
+    seconds (at least `MIN_INTERVAL`) and writes one `frame;frame;... count` line per distinct stack,
+    as read by flamegraph.pl and speedscope. Sampling costs little, so it suits long-running apps and
+    threaded RPC work; any other path gets a deterministic cProfile of the calling thread in `pstats` format.
+
+    With `memory`, allocations are traced and the peak and largest allocation sites are printed on exit.
+
+        with Profiler("scan.folded", memory=True):
+            app.run()
+    """
+    FOLDED = ".folded", ".collapsed"
+    INTERVAL = .01
+    MIN_INTERVAL = .005
+    JOIN_TIMEOUT = 1.
+    TOP = 10
+
+    path: Optional[str]
+    memory: bool
+    interval: float
+
+    __profile: Optional[cProfile.Profile] = None
+    __sampler: Optional[threading.Thread] = None
+    __stop: threading.Event
+    __stacks: collections.Counter
+    __lock: threading.Lock
+
+    def __init__(self, path: str = None, *, memory: bool = False, interval: float = None):
+        self.path = os.path.expanduser(path) if path else None
+        self.memory = memory
+        self.interval = max(interval or Profiler.INTERVAL, Profiler.MIN_INTERVAL)
+        self.__stop = threading.Event()
+        self.__stacks = collections.Counter()
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(path=\"{self.path}\", memory={self.memory})"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def sampling(self) -> bool:
+        return self.path is not None and self.path.endswith(Profiler.FOLDED)
+
+    @property
+    def stacks(self) -> collections.Counter:
+        """Sampled stack counts, keyed by `;`-joined frames from the thread down.
+        """
+        with self.__lock:
+            return collections.Counter(self.__stacks)
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start()
+
+        if self.sampling:
+            self.__stop.clear()
+            self.__sampler = threading.Thread(target=self.__sample, name="hypy-profile", daemon=True)
+            self.__sampler.start()
+
+        elif self.path is not None:
+            self.__profile = cProfile.Profile()
+            self.__profile.enable()
+
+    def stop(self):
+        if self.__profile is not None:
+            self.__profile.disable()
+            self.__profile.dump_stats(self.path)
+            self.__profile = None
+            log.info(f"profile: wrote {self.path}")
+
+        if self.__sampler is not None:
+            self.__stop.set()
+            self.__sampler.join(Profiler.JOIN_TIMEOUT)
+
+            if self.__sampler.is_alive():
+                log.warning(f"profile: sampler did not stop within {Profiler.JOIN_TIMEOUT}s")
+
+            self.__sampler = None
+            stacks = self.stacks
+
+            with open(self.path, "w") as file:
+                file.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+            log.info(f"profile: wrote {sum(stacks.values())} samples to {self.path}")
+
+        if self.memory and tracemalloc.is_tracing():
+            print(self.memory_report(), file=sys.stderr)
+            tracemalloc.stop()
+
+    def memory_report(self) -> str:
+        """Current and peak traced memory, and the `TOP` lines holding the most of it.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"memory: current {current / 2**20:.1f}MB, peak {peak / 2**20:.1f}MB"]
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, __file__),))
+
+        for stat in snapshot.statistics("lineno")[:Profiler.TOP]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size / 2**10:>10.1f}KB {stat.count:>8} {frame.filename}:{frame.lineno}")
+
+        return "\n".join(lines)
+
+    def __sample(self):
+        ident = threading.get_ident()
+        names = {}
+
+        while not self.__stop.wait(self.interval):
+            # A collection run from this thread while it holds other threads' frames can finalize
+            # objects those threads are still using; take and collapse the sample with GC held off.
+            enabled = gc.isenabled()
+            gc.disable()
+
+            try:
+                frames = sys._current_frames()
+                frames.pop(ident, None)
+
+                if not frames.keys() <= names.keys():
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+                sample = [Profiler.collapse(frame, names.get(thread_id, str(thread_id)))
+                          for thread_id, frame in frames.items()]
+                del frames
+
+            finally:
+                if enabled:
+                    gc.enable()
+
+            with self.__lock:
+                self.__stacks.update(sample)
+
+    @staticmethod
+    def collapse(frame, root: str = None) -> str:
+        """The stack ending at `frame` as `;`-joined `file:function` frames, outermost first, under `root` if given.
+        """
+        frames = []
+
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}")
+            frame = frame.f_back
+
+        if root is not None:
+            frames.append(root)
+
+        return ";".join(reversed(frames))
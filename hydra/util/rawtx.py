@@ -0,0 +1,468 @@
+"""Local raw transaction & script decoder.
+
+Decodes serialized Hydra transactions (including witness data) into the same structure as
+the node's `decoderawtransaction`, without a round-trip to the node. Contract outputs
+(OP_CREATE / OP_CALL, with or without OP_SENDER) are recognized and their fields are added
+under `scriptPubKey.contract`.
+
+Large sets of transactions can be decoded on a process pool with `decode_many()`.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional
+
+from hydra.util import jsonc
+
+
+__all__ = "Network", "MAINNET", "TESTNET", "decode", "decode_dict", "decode_many", "decode_script", "script_asm"
+
+
+class Network:
+    """Address encoding parameters.
+    """
+    __slots__ = "pubkey_prefix", "script_prefix", "bech32_hrp"
+
+    def __init__(self, pubkey_prefix: int, script_prefix: int, bech32_hrp: str):
+        self.pubkey_prefix = pubkey_prefix
+        self.script_prefix = script_prefix
+        self.bech32_hrp = bech32_hrp
+
+
+MAINNET = Network(pubkey_prefix=40, script_prefix=63, bech32_hrp="hc")
+TESTNET = Network(pubkey_prefix=66, script_prefix=128, bech32_hrp="th")
+
+
+OP_0 = 0x00
+OP_PUSHDATA1 = 0x4c
+OP_PUSHDATA2 = 0x4d
+OP_PUSHDATA4 = 0x4e
+OP_1NEGATE = 0x4f
+OP_1 = 0x51
+OP_16 = 0x60
+OP_RETURN = 0x6a
+OP_DUP = 0x76
+OP_EQUAL = 0x87
+OP_EQUALVERIFY = 0x88
+OP_HASH160 = 0xa9
+OP_CHECKSIG = 0xac
+OP_CHECKMULTISIG = 0xae
+OP_CREATE = 0xc1
+OP_CALL = 0xc2
+OP_SPEND = 0xc3
+OP_SENDER = 0xc4
+
+OP_NAMES = {
+    0x61: "OP_NOP", 0x62: "OP_VER", 0x63: "OP_IF", 0x64: "OP_NOTIF", 0x65: "OP_VERIF", 0x66: "OP_VERNOTIF",
+    0x67: "OP_ELSE", 0x68: "OP_ENDIF", 0x69: "OP_VERIFY", 0x6a: "OP_RETURN", 0x6b: "OP_TOALTSTACK",
+    0x6c: "OP_FROMALTSTACK", 0x6d: "OP_2DROP", 0x6e: "OP_2DUP", 0x6f: "OP_3DUP", 0x70: "OP_2OVER",
+    0x71: "OP_2ROT", 0x72: "OP_2SWAP", 0x73: "OP_IFDUP", 0x74: "OP_DEPTH", 0x75: "OP_DROP", 0x76: "OP_DUP",
+    0x77: "OP_NIP", 0x78: "OP_OVER", 0x79: "OP_PICK", 0x7a: "OP_ROLL", 0x7b: "OP_ROT", 0x7c: "OP_SWAP",
+    0x7d: "OP_TUCK", 0x7e: "OP_CAT", 0x7f: "OP_SUBSTR", 0x80: "OP_LEFT", 0x81: "OP_RIGHT", 0x82: "OP_SIZE",
+    0x83: "OP_INVERT", 0x84: "OP_AND", 0x85: "OP_OR", 0x86: "OP_XOR", 0x87: "OP_EQUAL", 0x88: "OP_EQUALVERIFY",
+    0x89: "OP_RESERVED1", 0x8a: "OP_RESERVED2", 0x8b: "OP_1ADD", 0x8c: "OP_1SUB", 0x8d: "OP_2MUL",
+    0x8e: "OP_2DIV", 0x8f: "OP_NEGATE", 0x90: "OP_ABS", 0x91: "OP_NOT", 0x92: "OP_0NOTEQUAL", 0x93: "OP_ADD",
+    0x94: "OP_SUB", 0x95: "OP_MUL", 0x96: "OP_DIV", 0x97: "OP_MOD", 0x98: "OP_LSHIFT", 0x99: "OP_RSHIFT",
+    0x9a: "OP_BOOLAND", 0x9b: "OP_BOOLOR", 0x9c: "OP_NUMEQUAL", 0x9d: "OP_NUMEQUALVERIFY",
+    0x9e: "OP_NUMNOTEQUAL", 0x9f: "OP_LESSTHAN", 0xa0: "OP_GREATERTHAN", 0xa1: "OP_LESSTHANOREQUAL",
+    0xa2: "OP_GREATERTHANOREQUAL", 0xa3: "OP_MIN", 0xa4: "OP_MAX", 0xa5: "OP_WITHIN", 0xa6: "OP_RIPEMD160",
+    0xa7: "OP_SHA1", 0xa8: "OP_SHA256", 0xa9: "OP_HASH160", 0xaa: "OP_HASH256", 0xab: "OP_CODESEPARATOR",
+    0xac: "OP_CHECKSIG", 0xad: "OP_CHECKSIGVERIFY", 0xae: "OP_CHECKMULTISIG", 0xaf: "OP_CHECKMULTISIGVERIFY",
+    0xb0: "OP_NOP1", 0xb1: "OP_CHECKLOCKTIMEVERIFY", 0xb2: "OP_CHECKSEQUENCEVERIFY", 0xb3: "OP_NOP4",
+    0xb4: "OP_NOP5", 0xb5: "OP_NOP6", 0xb6: "OP_NOP7", 0xb7: "OP_NOP8", 0xb8: "OP_NOP9", 0xb9: "OP_NOP10",
+    0x50: "OP_RESERVED", 0xc1: "OP_CREATE", 0xc2: "OP_CALL", 0xc3: "OP_SPEND", 0xc4: "OP_SENDER",
+}
+
+SIGHASH_TYPES = {0x01: "ALL", 0x81: "ALL|ANYONECANPAY", 0x02: "NONE", 0x82: "NONE|ANYONECANPAY",
+                 0x03: "SINGLE", 0x83: "SINGLE|ANYONECANPAY"}
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BECH32_ALPHABET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+
+# == Encoding ==
+
+def sha256d(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def hash160(data: bytes) -> bytes:
+    return hashlib.new("ripemd160", hashlib.sha256(data).digest()).digest()
+
+
+def base58check(payload: bytes) -> str:
+    data = payload + sha256d(payload)[:4]
+    num = int.from_bytes(data, "big")
+    encoded = ""
+
+    while num:
+        num, rem = divmod(num, 58)
+        encoded = BASE58_ALPHABET[rem] + encoded
+
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + encoded
+
+
+def _bech32_polymod(values: Iterable[int]) -> int:
+    generator = (0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3)
+    chk = 1
+
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+
+        for i in range(5):
+            chk ^= generator[i] if ((top >> i) & 1) else 0
+
+    return chk
+
+
+def segwit_address(hrp: str, version: int, program: bytes) -> str:
+    """Encode a witness program as bech32 (v0) or bech32m (v1+).
+    """
+    data, acc, bits = [version], 0, 0
+
+    for byte in program:
+        acc = (acc << 8) | byte
+        bits += 8
+
+        while bits >= 5:
+            bits -= 5
+            data.append((acc >> bits) & 31)
+
+    if bits:
+        data.append((acc << (5 - bits)) & 31)
+
+    const = 1 if version == 0 else 0x2bc830a3
+    hrp_expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+    polymod = _bech32_polymod(hrp_expanded + data + [0] * 6) ^ const
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+
+    return hrp + "1" + "".join(BECH32_ALPHABET[d] for d in data + checksum)
+
+
+# == Scripts ==
+
+def script_ops(script: bytes) -> list:
+    """Parse a script into `(opcode, data)` tuples; `data` is None for non-push opcodes.
+
+    A truncated push ends parsing with an `(opcode, None)` entry marked invalid by `script_asm`.
+    """
+    ops = []
+    i, end = 0, len(script)
+
+    while i < end:
+        opcode = script[i]
+        i += 1
+
+        if opcode <= OP_PUSHDATA4:
+            if opcode < OP_PUSHDATA1:
+                size = opcode
+            elif opcode == OP_PUSHDATA1:
+                size, i = (script[i] if i < end else end), i + 1
+            elif opcode == OP_PUSHDATA2:
+                size, i = int.from_bytes(script[i:i + 2], "little"), i + 2
+            else:
+                size, i = int.from_bytes(script[i:i + 4], "little"), i + 4
+
+            if i + size > end:
+                ops.append((-1, None))
+                break
+
+            ops.append((opcode, script[i:i + size]))
+            i += size
+        else:
+            ops.append((opcode, None))
+
+    return ops
+
+
+def script_num(data: bytes) -> int:
+    """Decode a minimally-encoded script number (little-endian, sign bit in the last byte).
+    """
+    if not len(data):
+        return 0
+
+    value = int.from_bytes(data, "little")
+
+    if data[-1] & 0x80:
+        return -(value & ~(0x80 << (8 * (len(data) - 1))))
+
+    return value
+
+
+def _op_name(opcode: int) -> str:
+    if opcode == OP_0:
+        return "0"
+    if opcode == OP_1NEGATE:
+        return "-1"
+    if OP_1 <= opcode <= OP_16:
+        return str(opcode - OP_1 + 1)
+
+    return OP_NAMES.get(opcode, "OP_UNKNOWN")
+
+
+def _is_der_signature(sig: bytes) -> bool:
+    # BIP66 strict DER encoding, including the trailing sighash type byte.
+    if not 9 <= len(sig) <= 73 or sig[0] != 0x30 or sig[1] != len(sig) - 3:
+        return False
+
+    len_r = sig[3]
+
+    if 5 + len_r >= len(sig):
+        return False
+
+    len_s = sig[5 + len_r]
+
+    if len_r + len_s + 7 != len(sig):
+        return False
+
+    return sig[2] == 0x02 and len_r > 0 and not sig[4] & 0x80 and sig[len_r + 4] == 0x02 and len_s > 0 \
+        and not sig[len_r + 6] & 0x80
+
+
+def script_asm(script: bytes, sighash_decode: bool = False) -> str:
+    """Render a script like the node's `asm` fields.
+    """
+    parts = []
+    unspendable = len(script) > 0 and script[0] == OP_RETURN
+
+    for opcode, data in script_ops(script):
+        if opcode == -1:
+            parts.append("[error]")
+        elif data is None:
+            parts.append(_op_name(opcode))
+        elif len(data) <= 4:
+            parts.append(str(script_num(data)))
+        elif sighash_decode and not unspendable and _is_der_signature(data) and data[-1] in SIGHASH_TYPES:
+            parts.append(data[:-1].hex() + f"[{SIGHASH_TYPES[data[-1]]}]")
+        else:
+            parts.append(data.hex())
+
+    return " ".join(parts)
+
+
+def decode_script(script: bytes, network: Network = MAINNET) -> dict:
+    """Decode an output script into a `scriptPubKey` dict (asm, hex, type, and reqSigs/addresses if any).
+    """
+    result = {"asm": script_asm(script), "hex": script.hex()}
+    ops = script_ops(script)
+    opcodes = [op for op, _ in ops]
+    addresses = None
+    req_sigs = 1
+
+    if opcodes == [OP_DUP, OP_HASH160, 20, OP_EQUALVERIFY, OP_CHECKSIG]:
+        result["type"] = "pubkeyhash"
+        addresses = [base58check(bytes((network.pubkey_prefix,)) + ops[2][1])]
+
+    elif opcodes == [OP_HASH160, 20, OP_EQUAL]:
+        result["type"] = "scripthash"
+        addresses = [base58check(bytes((network.script_prefix,)) + ops[1][1])]
+
+    elif len(ops) == 2 and opcodes[1] == OP_CHECKSIG and ops[0][1] is not None and len(ops[0][1]) in (33, 65):
+        result["type"] = "pubkey"
+        addresses = [base58check(bytes((network.pubkey_prefix,)) + hash160(ops[0][1]))]
+
+    elif len(ops) == 2 and (opcodes[0] == OP_0 or OP_1 <= opcodes[0] <= OP_16) \
+            and ops[1][1] is not None and 2 <= len(ops[1][1]) <= 40 and len(script) == len(ops[1][1]) + 2:
+        version = 0 if opcodes[0] == OP_0 else opcodes[0] - OP_1 + 1
+        program = ops[1][1]
+
+        if version == 0 and len(program) == 20:
+            result["type"] = "witness_v0_keyhash"
+        elif version == 0 and len(program) == 32:
+            result["type"] = "witness_v0_scripthash"
+        elif version == 1 and len(program) == 32:
+            result["type"] = "witness_v1_taproot"
+        else:
+            result["type"] = "witness_unknown"
+
+        if version != 0 or len(program) in (20, 32):
+            addresses = [segwit_address(network.bech32_hrp, version, program)]
+
+    elif len(ops) >= 4 and opcodes[-1] == OP_CHECKMULTISIG and OP_1 <= opcodes[0] <= OP_16 \
+            and OP_1 <= opcodes[-2] <= OP_16 and opcodes[-2] - OP_1 + 1 == len(ops) - 3 \
+            and all(data is not None and len(data) in (33, 65) for _, data in ops[1:-2]):
+        result["type"] = "multisig"
+        req_sigs = opcodes[0] - OP_1 + 1
+        addresses = [base58check(bytes((network.pubkey_prefix,)) + hash160(data)) for _, data in ops[1:-2]]
+
+    elif len(opcodes) and opcodes[0] == OP_RETURN:
+        result["type"] = "nulldata"
+
+    elif len(opcodes) and opcodes[-1] in (OP_CREATE, OP_CALL) and (contract := _decode_contract(ops)) is not None:
+        result["type"] = ("create" if opcodes[-1] == OP_CREATE else "call") + ("_sender" if OP_SENDER in opcodes else "")
+        result["contract"] = contract
+
+    else:
+        result["type"] = "nonstandard"
+
+    if addresses is not None:
+        result["reqSigs"] = req_sigs
+        result["addresses"] = addresses
+
+    return result
+
+
+def _decode_contract(ops: list) -> Optional[dict]:
+    # [<address version> <pubkeyhash> <signature> OP_SENDER] <version> <gas limit> <gas price> <data> [<contract>] OP_CREATE|OP_CALL
+    opcodes = [op for op, _ in ops]
+
+    if OP_SENDER in opcodes:
+        sender_at = opcodes.index(OP_SENDER)
+
+        if sender_at != 3:
+            return None
+
+        ops = ops[4:]
+
+    is_call = ops[-1][0] == OP_CALL
+    fields = ops[:-1]
+
+    if len(fields) != (5 if is_call else 4) or any(data is None and op != OP_0 and not OP_1 <= op <= OP_16
+                                                   for op, data in fields):
+        return None
+
+    def num(field):
+        op, data = field
+        return script_num(data) if data is not None else (0 if op == OP_0 else op - OP_1 + 1)
+
+    contract = {
+        "version": num(fields[0]),
+        "gasLimit": num(fields[1]),
+        "gasPrice": num(fields[2]),
+        "data": (fields[3][1] or b"").hex(),
+    }
+
+    if is_call:
+        if fields[4][1] is None or len(fields[4][1]) != 20:
+            return None
+
+        contract["address"] = fields[4][1].hex()
+
+    return contract
+
+
+# == Transactions ==
+
+class _Reader:
+    __slots__ = "data", "pos"
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def read(self, size: int) -> bytes:
+        if self.pos + size > len(self.data):
+            raise ValueError("raw transaction is truncated")
+
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def uint(self, size: int) -> int:
+        return int.from_bytes(self.read(size), "little")
+
+    def varint(self) -> int:
+        size = self.uint(1)
+
+        if size < 0xfd:
+            return size
+
+        return self.uint(2 if size == 0xfd else 4 if size == 0xfe else 8)
+
+    def varbytes(self) -> bytes:
+        return self.read(self.varint())
+
+
+def decode_dict(raw: [str, bytes], network: Network = MAINNET) -> dict:
+    """Decode a raw transaction into plain dicts & lists, as returned by `decoderawtransaction`.
+    """
+    data = bytes.fromhex(raw) if isinstance(raw, str) else bytes(raw)
+    reader = _Reader(data)
+
+    version = reader.uint(4)
+    segwit = data[4:6] == b"\x00\x01"
+
+    if segwit:
+        reader.read(2)
+
+    body_start = reader.pos
+    vin = []
+
+    for _ in range(reader.varint()):
+        prev_txid = reader.read(32)
+        prev_vout = reader.uint(4)
+        script_sig = reader.varbytes()
+        sequence = reader.uint(4)
+
+        if prev_txid == b"\0" * 32 and prev_vout == 0xffffffff:
+            vin.append({"coinbase": script_sig.hex(), "sequence": sequence})
+        else:
+            vin.append({
+                "txid": prev_txid[::-1].hex(),
+                "vout": prev_vout,
+                "scriptSig": {"asm": script_asm(script_sig, sighash_decode=True), "hex": script_sig.hex()},
+                "sequence": sequence,
+            })
+
+    vout = []
+
+    for n in range(reader.varint()):
+        value = reader.uint(8)
+        script = reader.varbytes()
+
+        vout.append({"value": value / 10**8, "n": n, "scriptPubKey": decode_script(script, network)})
+
+    body_end = reader.pos
+
+    if segwit:
+        for item in vin:
+            witness = [reader.varbytes().hex() for _ in range(reader.varint())]
+
+            if len(witness):
+                # Keep the node's field order: txinwitness precedes sequence.
+                sequence = item.pop("sequence")
+                item["txinwitness"] = witness
+                item["sequence"] = sequence
+
+    locktime = reader.uint(4)
+
+    if reader.pos != len(data):
+        raise ValueError("raw transaction has trailing data")
+
+    stripped = data[:4] + data[body_start:body_end] + data[-4:]
+    weight = len(stripped) * 3 + len(data)
+
+    return {
+        "txid": sha256d(stripped)[::-1].hex(),
+        "hash": sha256d(data)[::-1].hex(),
+        "version": version,
+        "size": len(data),
+        "vsize": (weight + 3) // 4,
+        "weight": weight,
+        "locktime": locktime,
+        "vin": vin,
+        "vout": vout,
+    }
+
+
+def decode(raw: [str, bytes], network: Network = MAINNET) -> jsonc.AttrView:
+    """Decode a raw transaction with attribute access; see `decode_dict()`.
+    """
+    return jsonc.view(decode_dict(raw, network))
+
+
+def decode_many(raws: Iterable[str, bytes], network: Network = MAINNET, *, processes: int = None,
+                chunksize: int = 64) -> list:
+    """Decode many raw transactions, on a pool of `processes` worker processes if more than one.
+    """
+    if processes is None or processes <= 1:
+        return [decode(raw, network) for raw in raws]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return [
+            jsonc.view(tx)
+            for tx in executor.map(functools.partial(decode_dict, network=network), raws, chunksize=chunksize)
+        ]
@@ -0,0 +1,94 @@
+"""Fixed-size numeric ring buffer.
+"""
+import math
+from array import array
+from typing import Iterable
+
+
+__all__ = "RingBuffer", "sparkline"
+
+
+SPARKS = "▁▂▃▄▅▆▇█"
+
+
+class RingBuffer:
+    """The last `size` floats, stored in a preallocated `array` so memory stays fixed however long it runs.
+
+    Missing samples are stored as NaN and skipped by the statistics.
+    """
+    size: int
+
+    __data: array
+    __next: int
+    __count: int
+
+    def __init__(self, size: int, values: Iterable[float] = ()):
+        if size <= 0:
+            raise ValueError("size must be positive")
+
+        self.size = size
+        self.__data = array("d", bytes(8 * size))
+        self.__next = 0
+        self.__count = 0
+
+        for value in values:
+            self.append(value)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(size={self.size}, count={self.__count})"
+
+    def __len__(self):
+        return self.__count
+
+    def append(self, value: float = None):
+        self.__data[self.__next] = value if value is not None else math.nan
+        self.__next = (self.__next + 1) % self.size
+        self.__count = min(self.__count + 1, self.size)
+
+    def values(self, last: int = None) -> list:
+        """Stored values, oldest first; only the `last` ones if given.
+        """
+        count = self.__count if last is None else min(last, self.__count)
+        start = (self.__next - count) % self.size
+
+        if start + count <= self.size:
+            return self.__data[start:start + count].tolist()
+
+        return self.__data[start:].tolist() + self.__data[:self.__next].tolist()
+
+    def mean(self, last: int = None) -> float:
+        """Moving average of the `last` values (default: all), or NaN if there are none.
+        """
+        values = [value for value in self.values(last) if not math.isnan(value)]
+        return math.fsum(values) / len(values) if len(values) else math.nan
+
+    def rate(self, times: "RingBuffer", last: int = None) -> float:
+        """Change per unit of `times` (a parallel buffer of timestamps) over the `last` samples, or NaN.
+        """
+        pairs = [
+            (time, value) for time, value in zip(times.values(last), self.values(last))
+            if not math.isnan(value) and not math.isnan(time)
+        ]
+
+        if len(pairs) < 2 or pairs[-1][0] == pairs[0][0]:
+            return math.nan
+
+        return (pairs[-1][1] - pairs[0][1]) / (pairs[-1][0] - pairs[0][0])
+
+
+def sparkline(values: Iterable[float]) -> str:
+    """Render values as a line of block characters scaled to their range; NaN shows as a space.
+    """
+    values = list(values)
+    numbers = [value for value in values if not math.isnan(value)]
+
+    if not len(numbers):
+        return " " * len(values)
+
+    low, high = min(numbers), max(numbers)
+    scale = (len(SPARKS) - 1) / (high - low) if high > low else 0
+
+    return "".join(
+        " " if math.isnan(value) else SPARKS[round((value - low) * scale)]
+        for value in values
+    )